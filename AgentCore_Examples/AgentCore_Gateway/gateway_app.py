@@ -32,11 +32,16 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import parse_qs, unquote, urlparse
 
 import boto3
-import requests
 import streamlit as st
 
+from mcp_gateway_client import CognitoTokenProvider, GatewayClient, ToolListCache, pooled_session
+
 COGNITO_TOKEN_URL = f"{COGNITO_HOSTED_URL}/oauth2/token"
 MCP_VERSION = "2025-11-25"  # MCP protocol version — unlikely to need changing
+TOOLS_CACHE_TTL = 300   # Seconds a tools/list result is reused
+MULTI_SEARCH_WORKERS = 4  # Searches run concurrently by the Multi-search tab
+SEARCH_TOOL = "github-copilot-mcp___search_repositories"
+SEARCH_CACHE_TTL = 300  # Seconds a search result is reused for the same query and arguments
 
 # ---------------------------------------------------------------------------
 # Page config
@@ -47,6 +52,20 @@ st.set_page_config(
     layout="wide",
 )
 
+# ---------------------------------------------------------------------------
+# Gateway client — pooled connections, cached token and tools/list
+# ---------------------------------------------------------------------------
+@st.cache_resource
+def get_gateway_client() -> GatewayClient:
+    """
+    One gateway client per Streamlit server process. Its pooled session keeps
+    the TLS connections to Cognito and the gateway open across reruns.
+    """
+    session = pooled_session()
+    tokens = CognitoTokenProvider(COGNITO_TOKEN_URL, COGNITO_CLIENT_ID, COGNITO_CLIENT_SECRET, session)
+    return GatewayClient(GATEWAY_URL, MCP_VERSION, tokens, ToolListCache(TOOLS_CACHE_TTL), session=session)
+
+
 # ---------------------------------------------------------------------------
 # Sidebar – status / cache controls
 # ---------------------------------------------------------------------------
@@ -62,8 +81,8 @@ GATEWAY_URL           = {GATEWAY_URL}
     st.caption("Edit the constants at the top of gateway_app.py to change these.")
     st.divider()
     if st.button("🗑️ Clear session cache"):
-        for key in ["cognito_token", "cognito_token_expiry"]:
-            st.session_state.pop(key, None)
+        get_gateway_client().tokens.clear()
+        get_gateway_client().tools.invalidate()
         st.success("Cache cleared")
 
 # use the module-level constants directly
@@ -80,40 +99,12 @@ mcp_version         = MCP_VERSION
 
 def get_cognito_token() -> str:
     """Return a valid Cognito access token, refreshing when within 60s of expiry."""
-    now = time.time()
-    if (
-        "cognito_token" in st.session_state
-        and st.session_state.get("cognito_token_expiry", 0) - now > 60
-    ):
-        return st.session_state["cognito_token"]
-
-    resp = requests.post(
-        cognito_token_url,
-        data={"grant_type": "client_credentials", "scope": "gateway/invoke"},
-        auth=(cognito_client_id, cognito_client_secret),
-        timeout=10,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    st.session_state["cognito_token"] = data["access_token"]
-    st.session_state["cognito_token_expiry"] = now + data.get("expires_in", 3600)
-    return data["access_token"]
+    return get_gateway_client().tokens.get()
 
 
 def call_gateway(method: str, params: dict) -> dict:
     """Send a JSON-RPC request to the gateway and return the parsed response."""
-    token = get_cognito_token()
-    resp = requests.post(
-        gateway_url,
-        headers={
-            "Authorization": f"Bearer {token}",
-            "MCP-Protocol-Version": mcp_version,
-            "Content-Type": "application/json",
-        },
-        json={"jsonrpc": "2.0", "id": "1", "method": method, "params": params},
-        timeout=30,
-    )
-    return resp.json()
+    return get_gateway_client().call(method, params)
 
 
 def extract_elicitation_url(response: dict) -> str | None:
@@ -124,6 +115,98 @@ def extract_elicitation_url(response: dict) -> str | None:
         return None
 
 
+class GatewayCallError(Exception):
+    """A JSON-RPC error response; raised inside cached functions so errors are never cached."""
+
+    def __init__(self, response: dict):
+        super().__init__(response.get("error", {}).get("message", "Gateway error"))
+        self.response = response
+
+
+def parse_search_result(result: dict) -> dict:
+    """
+    Flatten a search_repositories tools/call result into table rows.
+
+    Returns {"rows": [...], "extra": [...]} where extra holds content items
+    that are not repository lists (rendered as before).
+    """
+    rows, extra = [], []
+    for item in result.get("result", {}).get("content", []):
+        if item.get("type") != "text":
+            extra.append({"json": item})
+            continue
+        text = item["text"]
+        try:
+            parsed = json.loads(text)
+        except (json.JSONDecodeError, TypeError):
+            extra.append({"markdown": text})
+            continue
+        repos = parsed if isinstance(parsed, list) else parsed.get("items") or parsed.get("repositories") or parsed
+        if not isinstance(repos, list):
+            extra.append({"json": parsed})
+            continue
+        for repo in repos:
+            stars = repo.get("stargazers_count", repo.get("stars"))
+            rows.append({
+                "name": repo.get("full_name") or repo.get("name", ""),
+                "stars": stars if isinstance(stars, int) else None,
+                "language": repo.get("language") or "",
+                "description": repo.get("description") or "",
+                "url": repo.get("html_url", ""),
+            })
+    return {"rows": rows, "extra": extra}
+
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner=False, max_entries=200)
+def search_repositories(args_json: str) -> dict:
+    """Run one search and return its parsed rows, cached per query and argument set."""
+    result = call_gateway("tools/call", {"name": SEARCH_TOOL, "arguments": json.loads(args_json)})
+    if "error" in result or "result" not in result:
+        raise GatewayCallError(result)
+    return parse_search_result(result)
+
+
+def render_gateway_error(result: dict):
+    auth_url = extract_elicitation_url(result)
+    st.error(f"Gateway error: {result['error'].get('message', result['error'])}")
+    if auth_url:
+        st.session_state["pending_auth_url"] = auth_url
+        st.session_state["pending_cognito_token"] = get_cognito_token()
+        st.warning("GitHub authorization required — go to the **GitHub Auth** tab.")
+
+
+def render_search_rows(parsed: dict):
+    """One virtualized table instead of a row of widgets per repository."""
+    if parsed["rows"]:
+        st.dataframe(
+            parsed["rows"],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "name": st.column_config.TextColumn("Repository"),
+                "stars": st.column_config.NumberColumn("⭐ Stars", format="%d"),
+                "language": st.column_config.TextColumn("Language"),
+                "description": st.column_config.TextColumn("Description", width="large"),
+                "url": st.column_config.LinkColumn("Link", display_text="Open"),
+            },
+        )
+    for item in parsed["extra"]:
+        if "markdown" in item:
+            st.markdown(item["markdown"])
+        else:
+            st.json(item["json"])
+
+
+def render_search_result(result: dict):
+    """Render a search_repositories tools/call response, or the gateway error it carries."""
+    if "error" in result:
+        render_gateway_error(result)
+    elif "result" in result:
+        render_search_rows(parse_search_result(result))
+    else:
+        st.json(result)
+
+
 @st.cache_data(ttl=30)
 def get_fresh_auth_url() -> str:
     """
@@ -172,18 +255,25 @@ def get_fresh_auth_url() -> str:
 # ---------------------------------------------------------------------------
 
 CALLBACK_PORT = 8080
+CALLBACK_TIMEOUT = 120      # Seconds to wait for the GitHub redirect
+AUTH_STATUS_REFRESH = 2     # Seconds between auth status checks in the UI
+STARTUP_CHECK_TTL = 300     # Seconds the startup control-plane check is reused
 _listener_lock = threading.Lock()
 
-# IPC between the background thread and the Streamlit poll loop via a temp
-# file. In-memory state (threading.Event, module-level dicts) gets wiped
-# whenever Streamlit's file watcher reloads the module, so a file is used
-# instead — it survives reloads and process boundaries.
+# Hand-off between the callback server and the Streamlit UI via a temp file.
+# In-memory state (threading.Event, module-level dicts) gets wiped whenever
+# Streamlit's file watcher reloads the module, so a file is used instead —
+# it survives reloads and process boundaries. The callback itself completes
+# the flow, so nothing waits on this file in the background.
 _RESULT_FILE = os.path.join(tempfile.gettempdir(), "agentcore_auth_result.json")
 
 
 def _write_result(data: dict):
-    with open(_RESULT_FILE, "w") as f:
+    # Write then rename so the UI never reads a half-written file
+    tmp_path = f"{_RESULT_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(data, f)
+    os.replace(tmp_path, _RESULT_FILE)
 
 
 def _read_result() -> dict:
@@ -201,6 +291,35 @@ def _clear_result():
         pass
 
 
+def _complete_auth(user_token: str, session_id: str) -> dict:
+    try:
+        client = boto3.client("bedrock-agentcore", region_name=region)
+        response = client.complete_resource_token_auth(
+            userIdentifier={"userToken": user_token},
+            sessionUri=unquote(session_id),
+        )
+        return {"success": True, "response": str(response)}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class _CallbackServer(HTTPServer):
+    """Serves the single GitHub redirect for one authorization attempt."""
+
+    def __init__(self, user_token: str):
+        super().__init__(("localhost", CALLBACK_PORT), _CallbackHandler)
+        self.user_token = user_token
+        self.finished = threading.Event()
+
+    def finish(self, result: dict):
+        """Record the outcome once and stop serving."""
+        if self.finished.is_set():
+            return
+        self.finished.set()
+        _write_result(result)
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+
 class _CallbackHandler(BaseHTTPRequestHandler):
     def log_message(self, format, *args):  # suppress default request logging
         pass
@@ -211,71 +330,72 @@ class _CallbackHandler(BaseHTTPRequestHandler):
         session_id = params.get("session_id", [None])[0]
 
         if session_id:
-            self.send_response(200)
+            result = _complete_auth(self.server.user_token, session_id)
+            self.send_response(200 if result.get("success") else 500)
             self.send_header("Content-Type", "text/html")
             self.end_headers()
-            self.wfile.write(b"<html><body><h2>Authorization complete! You can close this tab.</h2></body></html>")
-            _write_result({"session_id": session_id})
+            if result.get("success"):
+                self.wfile.write(b"<html><body><h2>Authorization complete! You can close this tab.</h2></body></html>")
+            else:
+                self.wfile.write(b"<html><body><h2>Authorization failed. Return to the app for details.</h2></body></html>")
         else:
             self.send_response(400)
             self.send_header("Content-Type", "text/html")
             self.end_headers()
             self.wfile.write(b"<html><body><h2>Missing session_id. Please try again.</h2></body></html>")
-            _write_result({"error": "Missing session_id in callback"})
+            result = {"error": "Missing session_id in callback"}
 
-        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        self.server.finish(result)
 
 
 def start_callback_listener(user_token: str, auth_url: str):
     """
     Open the auth URL in the browser and start a local HTTP server on
-    port 8080 to catch the redirect. Writes outcome to a temp file so it
-    survives Streamlit module reloads. Does NOT touch st.session_state.
+    port 8080 to catch the redirect. The request handler completes the
+    flow and writes the outcome to a temp file so it survives Streamlit
+    module reloads; a timer ends the wait after CALLBACK_TIMEOUT seconds.
+    Does NOT touch st.session_state.
     """
     _clear_result()
 
-    with _listener_lock:
-        server = None
-        try:
-            server = HTTPServer(("localhost", CALLBACK_PORT), _CallbackHandler)
-            server_thread = threading.Thread(target=server.serve_forever, daemon=True)
-            server_thread.start()
-            webbrowser.open(auth_url)
-
-            # Poll the result file for up to 120s
-            deadline = time.time() + 120
-            while time.time() < deadline:
-                result = _read_result()
-                if result:
-                    break
-                time.sleep(1)
-            else:
-                _write_result({"error": "Timed out waiting for GitHub callback."})
-                return
-
-            session_id = result.get("session_id")
-            if not session_id:
-                return
-
-            client = boto3.client("bedrock-agentcore", region_name=region)
-            response = client.complete_resource_token_auth(
-                userIdentifier={"userToken": user_token},
-                sessionUri=unquote(session_id),
-            )
-            _write_result({"success": True, "response": str(response)})
-        except Exception as e:
-            _write_result({"error": str(e)})
-        finally:
-            if server:
-                try:
-                    server.server_close()
-                except Exception:
-                    pass
+    if not _listener_lock.acquire(blocking=False):
+        _write_result({"error": "An authorization is already in progress."})
+        return
+    server = None
+    try:
+        server = _CallbackServer(user_token)
+        timer = threading.Timer(
+            CALLBACK_TIMEOUT,
+            server.finish,
+            args=({"error": "Timed out waiting for GitHub callback."},),
+        )
+        timer.daemon = True
+        timer.start()
+        webbrowser.open(auth_url)
+        # Blocks in select() until the handler or the timer shuts the server down
+        server.serve_forever()
+        timer.cancel()
+    except Exception as e:
+        _write_result({"error": str(e)})
+    finally:
+        if server:
+            try:
+                server.server_close()
+            except Exception:
+                pass
+        _listener_lock.release()
 
 # ---------------------------------------------------------------------------
-# Startup check — surface pending auth without needing a gateway request
+# Startup check — surface pending auth without needing a gateway request.
+# Cached separately from get_fresh_auth_url so reruns don't repeat the
+# signed control-plane calls.
 # ---------------------------------------------------------------------------
-if get_fresh_auth_url():
+@st.cache_data(ttl=STARTUP_CHECK_TTL, show_spinner=False)
+def target_pending_auth() -> bool:
+    return bool(get_fresh_auth_url())
+
+
+if target_pending_auth():
     st.session_state["target_pending_auth"] = True
 else:
     st.session_state.pop("target_pending_auth", None)
@@ -296,8 +416,8 @@ if st.session_state.get("target_pending_auth"):
         icon="🔑",
     )
 
-tab_tools, tab_search, tab_auth = st.tabs(
-    ["🛠️ List Tools", "🔍 Search Repos", "🔑 GitHub Auth"]
+tab_tools, tab_search, tab_multi, tab_auth = st.tabs(
+    ["🛠️ List Tools", "🔍 Search Repos", "🔎 Multi-search", "🔑 GitHub Auth"]
 )
 
 # ---------------------------------------------------------------------------
@@ -305,10 +425,16 @@ tab_tools, tab_search, tab_auth = st.tabs(
 # ---------------------------------------------------------------------------
 with tab_tools:
     st.subheader("Available MCP Tools")
-    if st.button("Fetch tools", key="btn_list_tools"):
+    col_fetch, col_refresh = st.columns([1, 5])
+    fetch = col_fetch.button("Fetch tools", key="btn_list_tools")
+    refresh = col_refresh.button("Refresh from gateway", key="btn_refresh_tools")
+    if fetch or refresh:
         with st.spinner("Calling gateway…"):
             try:
-                result = call_gateway("tools/list", {})
+                result = get_gateway_client().list_tools(force=refresh)
+                cache_age = get_gateway_client().tools.age()
+                if cache_age and cache_age > 1:
+                    st.caption(f"Cached {cache_age:.0f}s ago")
                 if "error" in result:
                     auth_url = extract_elicitation_url(result)
                     st.error(f"Gateway error: {result['error'].get('message', result['error'])}")
@@ -359,48 +485,50 @@ with tab_search:
 
             with st.spinner("Searching…"):
                 try:
-                    result = call_gateway(
-                        "tools/call",
-                        {"name": "github-copilot-mcp___search_repositories", "arguments": args},
-                    )
-
-                    if "error" in result:
-                        auth_url = extract_elicitation_url(result)
-                        st.error(f"Gateway error: {result['error'].get('message', result['error'])}")
-                        if auth_url:
-                            st.session_state["pending_auth_url"] = auth_url
-                            st.session_state["pending_cognito_token"] = get_cognito_token()
-                            st.warning("GitHub authorization required — go to the **GitHub Auth** tab.")
-                    elif "result" in result:
-                        content = result["result"].get("content", [])
-                        for item in content:
-                            if item.get("type") == "text":
-                                text = item["text"]
-                                try:
-                                    parsed = json.loads(text)
-                                    repos = parsed if isinstance(parsed, list) else parsed.get("items") or parsed.get("repositories") or parsed
-                                    if isinstance(repos, list):
-                                        for repo in repos:
-                                            name = repo.get("full_name") or repo.get("name", "")
-                                            desc = repo.get("description") or "_No description_"
-                                            stars = repo.get("stargazers_count", repo.get("stars", ""))
-                                            url = repo.get("html_url", "")
-                                            lang = repo.get("language") or ""
-                                            cols = st.columns([3, 1, 1])
-                                            cols[0].markdown(f"**[{name}]({url})**  \n{desc}")
-                                            cols[1].markdown(f"⭐ {stars:,}" if isinstance(stars, int) else f"⭐ {stars}")
-                                            cols[2].markdown(f"`{lang}`" if lang else "")
-                                    else:
-                                        st.json(parsed)
-                                except (json.JSONDecodeError, TypeError):
-                                    st.markdown(text)
-                            else:
-                                st.json(item)
+                    parsed = search_repositories(json.dumps(args, sort_keys=True))
+                    st.caption(f"{len(parsed['rows'])} repositories")
+                    render_search_rows(parsed)
+                except GatewayCallError as e:
+                    if "error" in e.response:
+                        render_gateway_error(e.response)
                     else:
-                        st.json(result)
+                        st.json(e.response)
                 except Exception as e:
                     st.error(f"Request failed: {e}")
 
+# ---------------------------------------------------------------------------
+# Tab: Multi-search — several queries in parallel
+# ---------------------------------------------------------------------------
+with tab_multi:
+    st.subheader("Search Several Queries at Once")
+
+    with st.form("multi_search_form"):
+        queries_text = st.text_area("Queries (one per line)", placeholder="nonprofit\nvolunteer management\ndonation tracking")
+        col1, col2 = st.columns(2)
+        with col1:
+            multi_per_page = st.number_input("Results per query", min_value=1, max_value=100, value=5)
+        with col2:
+            multi_timeout = st.number_input("Timeout per query (s)", min_value=5, max_value=120, value=30)
+        multi_submitted = st.form_submit_button("Search all")
+
+    if multi_submitted:
+        queries = list(dict.fromkeys(q.strip() for q in queries_text.splitlines() if q.strip()))
+        if not queries:
+            st.warning("Enter at least one query.")
+        else:
+            calls = [
+                ("tools/call", {"name": SEARCH_TOOL, "arguments": {"query": q, "minimal_output": True, "perPage": multi_per_page}})
+                for q in queries
+            ]
+            with st.spinner(f"Running {len(queries)} searches…"):
+                started = time.time()
+                results = get_gateway_client().call_many(calls, max_workers=MULTI_SEARCH_WORKERS, timeout=multi_timeout)
+            failed = sum(1 for r in results if "error" in r)
+            st.caption(f"{len(queries) - failed}/{len(queries)} succeeded in {time.time() - started:.1f}s")
+            for q, result in zip(queries, results):
+                with st.expander(f"**{q}**" + (" — failed" if "error" in result else ""), expanded=len(queries) == 1):
+                    render_search_result(result)
+
 # ---------------------------------------------------------------------------
 # Tab: GitHub Auth (outbound 3LO)
 # ---------------------------------------------------------------------------
@@ -456,16 +584,23 @@ with tab_auth:
             st.session_state["auth_in_progress"] = True
             st.rerun()
 
-    if st.session_state.get("auth_in_progress"):
+    # Only tick while a flow is pending; each tick re-runs just this fragment
+    @st.fragment(run_every=AUTH_STATUS_REFRESH if st.session_state.get("auth_in_progress") else None)
+    def auth_status():
+        """Show the pending flow; the rest of the page only reruns once it completes."""
+        if not st.session_state.get("auth_in_progress"):
+            return
         _result = _read_result()
-        if _result:
-            st.session_state.pop("auth_in_progress", None)
-            st.session_state["auth_result"] = _result
-            if _result.get("success"):
-                st.session_state.pop("pending_cognito_token", None)
-                st.session_state.pop("target_pending_auth", None)
-                get_fresh_auth_url.clear()
-            st.rerun()
-        else:
-            st.rerun()
-
+        if not _result:
+            st.info("Waiting for GitHub authorization in your browser…", icon="⏳")
+            return
+        st.session_state.pop("auth_in_progress", None)
+        st.session_state["auth_result"] = _result
+        if _result.get("success"):
+            st.session_state.pop("pending_cognito_token", None)
+            st.session_state.pop("target_pending_auth", None)
+            get_fresh_auth_url.clear()
+            target_pending_auth.clear()
+        st.rerun()
+
+    auth_status()
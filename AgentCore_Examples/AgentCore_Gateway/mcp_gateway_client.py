@@ -0,0 +1,437 @@
+"""
+MCP gateway client used by gateway_app.py.
+
+Keeps one pooled HTTP session per process for both the Cognito token
+endpoint and the gateway, caches the Cognito token and the tools/list
+result, and offers a synchronous client (requests) and an asynchronous
+one (httpx, optional: pip install httpx). Responses may be plain JSON or
+a streamable-HTTP SSE stream; SSE messages are handled as they arrive.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # only needed for AsyncGatewayClient
+    httpx = None
+
+TOOLS_LIST_CHANGED = "notifications/tools/list_changed"
+DEFAULT_MAX_WORKERS = 4
+
+
+def error_response(request_id, message: str, code: int = -32000) -> dict:
+    """A JSON-RPC error object for failures that happen on the client side (timeouts, transport errors)."""
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class SSEParser:
+    """Incremental text/event-stream parser: feed lines, get back complete JSON-RPC messages."""
+
+    def __init__(self):
+        self._data = []
+
+    def feed(self, line: str) -> dict | None:
+        line = line.rstrip("\r")
+        if not line:
+            if not self._data:
+                return None
+            data, self._data = "\n".join(self._data), []
+            return json.loads(data)
+        if line.startswith("data:"):
+            self._data.append(line[5:].lstrip(" "))
+        # event:, id:, retry: and ":" comments carry nothing we use
+        return None
+
+    def flush(self) -> dict | None:
+        return self.feed("")
+
+
+def iter_sse_messages(lines):
+    parser = SSEParser()
+    for line in lines:
+        message = parser.feed(line)
+        if message is not None:
+            yield message
+    message = parser.flush()
+    if message is not None:
+        yield message
+
+
+def _is_event_stream(content_type: str | None) -> bool:
+    return (content_type or "").startswith("text/event-stream")
+
+
+def _is_jsonrpc(body) -> bool:
+    messages = body if isinstance(body, list) else [body]
+    return bool(messages) and all(isinstance(message, dict) and "jsonrpc" in message for message in messages)
+
+
+class CognitoTokenProvider:
+    """Cognito client_credentials token shared by every Streamlit session, refreshed within 60s of expiry."""
+
+    def __init__(self, token_url: str, client_id: str, client_secret: str, session: requests.Session):
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session = session
+        self._token = None
+        self._expiry = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        with self._lock:
+            now = time.time()
+            if self._token and self._expiry - now > 60:
+                return self._token
+            resp = self.session.post(
+                self.token_url,
+                data={"grant_type": "client_credentials", "scope": "gateway/invoke"},
+                auth=(self.client_id, self.client_secret),
+                timeout=10,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            self._token = data["access_token"]
+            self._expiry = now + data.get("expires_in", 3600)
+            return self._token
+
+    def clear(self):
+        with self._lock:
+            self._token = None
+            self._expiry = 0.0
+
+
+class ToolListCache:
+    """The last successful tools/list response, kept for ttl seconds or until the server says it changed."""
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._response = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> dict | None:
+        with self._lock:
+            if self._response is not None and time.time() - self._fetched_at < self.ttl:
+                return self._response
+            return None
+
+    def put(self, response: dict):
+        with self._lock:
+            self._response = response
+            self._fetched_at = time.time()
+
+    def age(self) -> float | None:
+        with self._lock:
+            return time.time() - self._fetched_at if self._response is not None else None
+
+    def invalidate(self):
+        with self._lock:
+            self._response = None
+
+
+class _GatewayBase:
+    def __init__(self, gateway_url: str, mcp_version: str, tokens: CognitoTokenProvider,
+                 tools: ToolListCache | None = None, timeout: float = 30):
+        self.gateway_url = gateway_url
+        self.mcp_version = mcp_version
+        self.tokens = tokens
+        self.tools = tools or ToolListCache()
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._id_lock = threading.Lock()
+
+    def _next_id(self) -> str:
+        with self._id_lock:
+            return str(next(self._ids))
+
+    def _headers(self, token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {token}",
+            "MCP-Protocol-Version": self.mcp_version,
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream",
+        }
+
+    def _request(self, method: str, params: dict, on_notification=None) -> dict:
+        request_id = self._next_id()
+        if on_notification is not None:
+            # Ask the server for notifications/progress tied to this request
+            params = dict(params, _meta={**params.get("_meta", {}), "progressToken": request_id})
+        return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+
+    def _collector(self, request_ids: list[str], on_notification=None) -> "_ResponseCollector":
+        return _ResponseCollector(self, request_ids, on_notification)
+
+    def _handle_messages(self, messages, request_ids: list[str], on_notification=None) -> list[dict]:
+        """Apply server notifications and return the responses in request_ids order."""
+        collector = self._collector(request_ids, on_notification)
+        for message in [messages] if isinstance(messages, dict) else messages:
+            if collector.feed(message):
+                break
+        return collector.results()
+
+    def _http_error(self, status_code: int, body: str, request_ids: list[str], on_notification=None) -> list[dict]:
+        """Responses for a non-2xx reply: the JSON-RPC messages it carries, else one HTTP error per request."""
+        try:
+            messages = json.loads(body)
+        except ValueError:
+            messages = None
+        if _is_jsonrpc(messages):
+            return self._handle_messages(messages, request_ids, on_notification)
+        # Gateways and load balancers answer with HTML or plain text here; keep the start of it
+        detail = " ".join(body.split())[:200] or "empty response"
+        return [error_response(request_id, f"HTTP {status_code}: {detail}") for request_id in request_ids]
+
+
+class _ResponseCollector:
+    """Matches incoming messages to outstanding request ids; notifications are applied on the way."""
+
+    def __init__(self, client: _GatewayBase, request_ids: list[str], on_notification=None):
+        self.client = client
+        self.request_ids = request_ids
+        self.on_notification = on_notification
+        self.pending = set(request_ids)
+        self.responses = {}
+        self.unmatched_error = None
+        self.timed_out_after = None
+
+    def feed(self, message: dict) -> bool:
+        """Handle one message; True once every request has its response."""
+        if message.get("method"):
+            if message["method"] == TOOLS_LIST_CHANGED:
+                self.client.tools.invalidate()
+            if self.on_notification is not None:
+                self.on_notification(message)
+        elif message.get("id") is not None:
+            self.responses[str(message["id"])] = message
+            self.pending.discard(str(message["id"]))
+        elif "error" in message:
+            self.unmatched_error = message["error"]
+        return not self.pending
+
+    def results(self) -> list[dict]:
+        if len(self.request_ids) > 1 and not self.responses and self.unmatched_error:
+            # A server without batch support answers the whole batch with one error
+            raise BatchNotSupported(self.unmatched_error.get("message", "Batch rejected"))
+        if self.timed_out_after is not None:
+            missing = {"code": -32000, "message": f"Timed out after {self.timed_out_after:.0f}s"}
+        else:
+            missing = self.unmatched_error or {"code": -32603, "message": "No response for request in gateway reply"}
+        return [self.responses.get(request_id) or error_response(request_id, missing["message"], missing["code"])
+                for request_id in self.request_ids]
+
+
+class BatchNotSupported(Exception):
+    """The gateway rejected a JSON-RPC batch; send the calls individually instead."""
+
+
+class GatewayClient(_GatewayBase):
+    """Synchronous JSON-RPC client over a pooled requests.Session."""
+
+    def __init__(self, gateway_url: str, mcp_version: str, tokens: CognitoTokenProvider,
+                 tools: ToolListCache | None = None, timeout: float = 30, session: requests.Session | None = None):
+        super().__init__(gateway_url, mcp_version, tokens, tools, timeout)
+        self.session = session or pooled_session()
+
+    def _post(self, payload, timeout: float | None, on_notification=None) -> list[dict]:
+        request_ids = [request["id"] for request in (payload if isinstance(payload, list) else [payload])]
+        timeout = timeout or self.timeout
+        # requests only bounds each read, so the stream as a whole is checked against a deadline
+        deadline = time.monotonic() + timeout
+        with self.session.post(
+            self.gateway_url,
+            headers=self._headers(self.tokens.get()),
+            json=payload,
+            timeout=timeout,
+            stream=True,
+        ) as resp:
+            if not _is_event_stream(resp.headers.get("Content-Type")):
+                if not resp.ok:
+                    return self._http_error(resp.status_code, resp.text, request_ids, on_notification)
+                return self._handle_messages(resp.json(), request_ids, on_notification)
+            resp.encoding = resp.encoding or "utf-8"
+            collector = self._collector(request_ids, on_notification)
+            parser = SSEParser()
+            # chunk_size=None yields each chunk as it arrives instead of waiting for 512 bytes
+            for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                message = parser.feed(line)
+                if message is not None and collector.feed(message):
+                    break
+                if time.monotonic() > deadline:
+                    collector.timed_out_after = timeout
+                    break
+            else:
+                message = parser.flush()
+                if message is not None:
+                    collector.feed(message)
+            return collector.results()
+
+    def call(self, method: str, params: dict, timeout: float | None = None, on_notification=None) -> dict:
+        """
+        Send one JSON-RPC request and return the parsed response.
+
+        on_notification, if given, is called with each server notification
+        (e.g. notifications/progress) received while the call is running.
+        """
+        request = self._request(method, params, on_notification)
+        return self._post(request, timeout, on_notification)[0]
+
+    def batch(self, calls: list[tuple[str, dict]], timeout: float | None = None) -> list[dict]:
+        """
+        Send several requests as one JSON-RPC batch and return the responses in call order.
+
+        Raises BatchNotSupported when the gateway rejects batches (MCP
+        2025-06-18 and later dropped them from the spec).
+        """
+        return self._post([self._request(method, params) for method, params in calls], timeout)
+
+    def call_many(self, calls: list[tuple[str, dict]], max_workers: int = DEFAULT_MAX_WORKERS,
+                  timeout: float | None = None) -> list[dict]:
+        """
+        Run independent calls concurrently on a bounded pool and return the responses in call order.
+
+        Each call gets its own timeout, which bounds the whole reply, SSE
+        stream included. The deadline is checked as lines arrive, so a
+        single stalled read can overrun it by at most one more timeout. A
+        call that fails or times out yields a JSON-RPC error object in its
+        slot; the other results are kept.
+        """
+        timeout = timeout or self.timeout
+        workers = max(1, min(max_workers, len(calls)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(self.call, method, params, timeout) for method, params in calls]
+        # Queued calls start late, so allow for the pool draining in rounds
+        rounds = -(-len(calls) // workers)
+        wait(futures, timeout=timeout * rounds + 1)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        for future in futures:
+            if not future.done():
+                results.append(error_response(None, f"Timed out after {timeout:.0f}s"))
+            elif future.exception() is not None:
+                results.append(error_response(None, f"{type(future.exception()).__name__}: {future.exception()}"))
+            else:
+                results.append(future.result())
+        return results
+
+    def list_tools(self, force: bool = False) -> dict:
+        """tools/list, served from the cache unless forced, expired or invalidated."""
+        cached = None if force else self.tools.get()
+        if cached is not None:
+            return cached
+        response = self.call("tools/list", {})
+        if "result" in response:
+            self.tools.put(response)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncGatewayClient(_GatewayBase):
+    """Asynchronous JSON-RPC client over a pooled httpx.AsyncClient."""
+
+    def __init__(self, gateway_url: str, mcp_version: str, tokens: CognitoTokenProvider,
+                 tools: ToolListCache | None = None, timeout: float = 30, max_connections: int = 10):
+        if httpx is None:
+            raise ImportError("AsyncGatewayClient requires httpx: pip install httpx")
+        super().__init__(gateway_url, mcp_version, tokens, tools, timeout)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def _post(self, payload, timeout: float | None, on_notification=None) -> list[dict]:
+        request_ids = [request["id"] for request in (payload if isinstance(payload, list) else [payload])]
+        timeout = timeout or self.timeout
+        # httpx timeouts are per operation too, so the stream is checked against a deadline
+        deadline = time.monotonic() + timeout
+        # The token provider is synchronous; only a refresh actually blocks
+        token = await asyncio.to_thread(self.tokens.get)
+        async with self.client.stream(
+            "POST",
+            self.gateway_url,
+            headers=self._headers(token),
+            json=payload,
+            timeout=timeout,
+        ) as resp:
+            if not _is_event_stream(resp.headers.get("Content-Type")):
+                body = await resp.aread()
+                if not resp.is_success:
+                    return self._http_error(resp.status_code, resp.text, request_ids, on_notification)
+                return self._handle_messages(json.loads(body), request_ids, on_notification)
+            collector = self._collector(request_ids, on_notification)
+            parser = SSEParser()
+            async for line in resp.aiter_lines():
+                message = parser.feed(line)
+                if message is not None and collector.feed(message):
+                    break
+                if time.monotonic() > deadline:
+                    collector.timed_out_after = timeout
+                    break
+            else:
+                message = parser.flush()
+                if message is not None:
+                    collector.feed(message)
+            return collector.results()
+
+    async def call(self, method: str, params: dict, timeout: float | None = None, on_notification=None) -> dict:
+        request = self._request(method, params, on_notification)
+        return (await self._post(request, timeout, on_notification))[0]
+
+    async def batch(self, calls: list[tuple[str, dict]], timeout: float | None = None) -> list[dict]:
+        return await self._post([self._request(method, params) for method, params in calls], timeout)
+
+    async def call_many(self, calls: list[tuple[str, dict]], max_workers: int = DEFAULT_MAX_WORKERS,
+                        timeout: float | None = None) -> list[dict]:
+        """Async counterpart of GatewayClient.call_many: at most max_workers calls in flight."""
+        timeout = timeout or self.timeout
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def bounded(method, params):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self.call(method, params, timeout), timeout)
+                except asyncio.TimeoutError:
+                    return error_response(None, f"Timed out after {timeout:.0f}s")
+                except Exception as e:
+                    return error_response(None, f"{type(e).__name__}: {e}")
+
+        return await asyncio.gather(*(bounded(method, params) for method, params in calls))
+
+    async def list_tools(self, force: bool = False) -> dict:
+        cached = None if force else self.tools.get()
+        if cached is not None:
+            return cached
+        response = await self.call("tools/list", {})
+        if "result" in response:
+            self.tools.put(response)
+        return response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+
+def pooled_session(pool_size: int = 10) -> requests.Session:
+    """A requests.Session that keeps up to pool_size connections per host alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -2,10 +2,14 @@
 # including controls for authentication, data protection, and prompt injection in any production workloads. Please reference 
 # the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any
 from datetime import datetime, timezone
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager, contextmanager
 from strands import Agent, tool
 from mcp.client.streamable_http import streamablehttp_client
 from strands.tools.mcp import MCPClient
@@ -13,10 +17,16 @@ from strands.session.s3_session_manager import S3SessionManager
 from strands.models import BedrockModel
 from strands_tools import use_aws
 import logging
+import json
 from pathlib import Path
 import uvicorn
 import os
+import asyncio
+import threading
+import time
 import boto3.session
+from discovery import discover_workload, InventoryCache
+from rules import evaluate
 
 class InvocationRequest(BaseModel): input: Dict[str, Any]
 class InvocationResponse(BaseModel): output: Dict[str, Any]
@@ -33,13 +43,20 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-app = FastAPI(title="Resilience Advisor", version="1.0.0")
-
 # Set configs from environment variables or defaults
 aws_profile = os.getenv("AWS_PROFILE", "default")
 aws_region = os.getenv("AWS_REGION", "us-east-1")
 llm_model_id = os.getenv("LLM_MODEL_ID", "us.anthropic.claude-sonnet-4-5-20250929-v1:0")
 bucket_name = os.getenv("S3_BUCKET", "YOUR-S3-BUCKET-GOES-HERE")
+mcp_tools_ttl = int(os.getenv("MCP_TOOLS_TTL", "3600"))  # Seconds between MCP tool list refreshes
+agent_pool_size = int(os.getenv("AGENT_POOL_SIZE", "32"))  # Sessions kept in memory
+agent_idle_seconds = int(os.getenv("AGENT_IDLE_SECONDS", "1800"))  # Idle sessions are dropped after this
+max_concurrent_invocations = int(os.getenv("MAX_CONCURRENT_INVOCATIONS", "4"))  # Agent runs executing at once
+max_queued_invocations = int(os.getenv("MAX_QUEUED_INVOCATIONS", "8"))  # Runs waiting for a worker before 429
+discovery_regions = [region.strip() for region in os.getenv("DISCOVERY_REGIONS", aws_region).split(",") if region.strip()]
+discovery_cache_ttl = int(os.getenv("DISCOVERY_CACHE_TTL", "900"))  # Seconds a session reuses a discovered inventory
+discovery_workers = int(os.getenv("DISCOVERY_WORKERS", "8"))  # Concurrent AWS calls during discovery
+sse_keepalive_seconds = 15  # Comment lines sent while the agent is quiet so proxies keep the stream open
 
 # Configure boto3 to use the specified profile for all AWS calls
 aws_session = boto3.session.Session(profile_name=aws_profile, region_name=aws_region)
@@ -61,6 +78,225 @@ bedrock_model = BedrockModel(
 #Use the AWS Documentation MCP server
 aws_doc_mcp_client = MCPClient(lambda: streamablehttp_client("https://knowledge-mcp.global.api.aws"))
 
+class McpToolCache:
+    """
+    Keeps the MCP client connected for the life of the process and caches its tool list.
+
+    The list is re-fetched every `ttl` seconds. `generation` changes whenever the
+    tool names change or the client reconnects, so agents built with an older
+    tool list get rebuilt.
+    """
+
+    def __init__(self, client: MCPClient, ttl: int):
+        self.client = client
+        self.ttl = ttl
+        self.tools = []
+        self.names = ()
+        self.generation = 0
+        self.fetched_at = 0.0
+        self.connected = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._connect()
+
+    def stop(self):
+        with self._lock:
+            self._disconnect()
+
+    def get(self):
+        """Return (tools, generation), refreshing the list when it is older than the TTL."""
+        with self._lock:
+            if time.monotonic() - self.fetched_at > self.ttl:
+                if self.connected:
+                    try:
+                        self._refresh()
+                    except Exception as e:
+                        logging.warning(f"MCP tool refresh failed, reconnecting: {e}")
+                        self._disconnect()
+                if not self.connected:
+                    self._connect()
+            return self.tools, self.generation
+
+    def _connect(self):
+        try:
+            self.client.start()
+            self.connected = True
+            # Tools from a previous connection are bound to the old session
+            self.generation += 1
+            self._refresh()
+        except Exception as e:
+            # Run without the documentation tools and retry in a minute
+            logging.warning(f"MCP client unavailable: {e}")
+            self._disconnect()
+            self.tools, self.names = [], ()
+            self.fetched_at = time.monotonic() - self.ttl + 60
+
+    def _disconnect(self):
+        if self.connected:
+            try:
+                self.client.stop(None, None, None)
+            except Exception as e:
+                logging.info(f"MCP client stop: {e}")
+        self.connected = False
+
+    def _refresh(self):
+        tools = self.client.list_tools_sync()
+        names = tuple(sorted(t.tool_name for t in tools))
+        if names != self.names:
+            logging.info(f"MCP tool list changed: {len(names)} tools")
+            self.generation += 1
+        self.tools, self.names, self.fetched_at = tools, names, time.monotonic()
+
+
+class PooledAgent:
+    def __init__(self, agent: Agent, generation: int):
+        self.agent = agent
+        self.generation = generation
+        self.last_used = time.monotonic()
+
+
+class SessionLock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0  # Requests holding or waiting for the lock
+
+
+class AgentPool:
+    """
+    Size-bounded LRU of agents keyed by session id.
+
+    S3SessionManager writes every message to S3 as it happens, so dropping an
+    agent loses nothing: the next request for that session rebuilds it from S3.
+    The per-session locks live apart from the agents, so an agent that is
+    rebuilt or evicted never runs alongside its replacement, and sessions in
+    use are never evicted.
+    """
+
+    def __init__(self, tool_cache: McpToolCache, max_size: int, idle_seconds: int):
+        self.tool_cache = tool_cache
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self._agents = OrderedDict()
+        # Only sessions with a request running or waiting have an entry
+        self._sessions: Dict[str, SessionLock] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, session_id: str):
+        """Run one turn: hold the session's lock and yield its agent."""
+        with self._lock:
+            session_lock = self._sessions.setdefault(session_id, SessionLock())
+            session_lock.users += 1
+        try:
+            with session_lock.lock:
+                yield self._get(session_id).agent
+        finally:
+            with self._lock:
+                session_lock.users -= 1
+                if not session_lock.users:
+                    del self._sessions[session_id]
+
+    def _get(self, session_id: str) -> PooledAgent:
+        # Called with the session's lock held, so no other agent for it can be built or running
+        mcp_tools, generation = self.tool_cache.get()
+        with self._lock:
+            entry = self._agents.get(session_id)
+            if entry is not None and entry.generation == generation:
+                self._agents.move_to_end(session_id)
+                entry.last_used = time.monotonic()
+                self._evict()
+                return entry
+
+        # Building the agent loads the session from S3, so do it outside the pool lock
+        session_manager = S3SessionManager(
+            session_id=session_id,
+            bucket=bucket_name,
+            prefix="prod"
+        )
+        agent = Agent(model=bedrock_model,
+                        system_prompt=SYSTEM_PROMPT,
+                        tools=[use_aws, calculate_letter_grade, make_discovery_tool(), *mcp_tools],
+                        session_manager=session_manager)
+        with self._lock:
+            entry = PooledAgent(agent, generation)
+            self._agents[session_id] = entry
+            self._evict()
+            return entry
+
+    def _evict(self):
+        # Sessions in use are skipped; the pool may briefly exceed max_size while they run
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [sid for sid, entry in self._agents.items() if entry.last_used < cutoff and sid not in self._sessions]
+        for session_id in idle:
+            del self._agents[session_id]
+            logging.info(f"Evicted idle agent for session {session_id}")
+        excess = len(self._agents) - self.max_size
+        for session_id in [sid for sid in self._agents if sid not in self._sessions][:max(0, excess)]:
+            del self._agents[session_id]
+            logging.info(f"Evicted agent for session {session_id}")
+
+    def clear(self):
+        with self._lock:
+            self._agents.clear()
+
+
+class InvocationLimiter:
+    """
+    Admission control for agent runs.
+
+    Up to `max_running` runs execute at once on the agent executor and up to
+    `max_queued` more wait for a worker. Anything beyond that gets a 429 so
+    callers back off instead of piling up behind long assessments. Only used
+    from the event loop, so a plain counter is enough.
+    """
+
+    def __init__(self, max_running: int, max_queued: int):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.admitted = 0
+
+    @property
+    def running(self) -> int:
+        return min(self.admitted, self.max_running)
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.admitted - self.max_running)
+
+    def acquire(self):
+        if self.admitted >= self.max_running + self.max_queued:
+            raise HTTPException(
+                status_code=429,
+                detail=f"The agent is busy ({self.running} running, {self.queued} queued). Please retry later.",
+                headers={"Retry-After": "30"}
+            )
+        self.admitted += 1
+
+    def release(self):
+        self.admitted -= 1
+
+
+mcp_tool_cache = McpToolCache(aws_doc_mcp_client, mcp_tools_ttl)
+agent_pool = AgentPool(mcp_tool_cache, agent_pool_size, agent_idle_seconds)
+invocation_limiter = InvocationLimiter(max_concurrent_invocations, max_queued_invocations)
+# Agent runs are synchronous and take minutes; they run here so the event loop keeps serving /ping
+agent_executor = ThreadPoolExecutor(max_workers=max_concurrent_invocations, thread_name_prefix="agent")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect to the MCP server once per process instead of once per request
+    mcp_tool_cache.start()
+    yield
+    agent_executor.shutdown(wait=False, cancel_futures=True)
+    agent_pool.clear()
+    mcp_tool_cache.stop()
+
+
+app = FastAPI(title="Resilience Advisor", version="1.0.0", lifespan=lifespan)
+
 @tool 
 def calculate_letter_grade(critical_vulns: int, high_vulns: int, medium_vulns: int, low_vulns: int) -> str:
     """Calculates a letter grade based on the number of resilience issues in the workload. A workload with a low RTO/RPO will have more resilience issues than the same workload with a high RTO/RPO.
@@ -81,8 +317,133 @@ def calculate_letter_grade(critical_vulns: int, high_vulns: int, medium_vulns: i
     else:
         return "A"
 
+def make_discovery_tool():
+    # One inventory cache per session: the tool is created with each pooled agent
+    inventory_cache = InventoryCache(discovery_cache_ttl)
+
+    @tool
+    def discover_workload_resources(tag_name: str, tag_value: str, refresh: bool = False) -> str:
+        """
+        Discover every AWS resource tagged tag_name=tag_value, with its resilience-relevant attributes:
+        Multi-AZ and read replicas for RDS, instance Availability Zones, Auto Scaling group sizes and AZ spread,
+        S3 versioning and replication, DynamoDB point-in-time recovery and global table replicas, load balancer
+        AZs and AWS Backup protection. Returns a JSON inventory grouped by resource type, with a "prescan" of
+        findings from deterministic resilience rules and their baseline severities.
+
+        Call this first when assessing a workload, instead of many individual describe/list calls. Results are
+        cached for the session; set refresh to True to discover again after the workload has changed.
+        """
+        inventory = inventory_cache.get(
+            tag_name, tag_value,
+            lambda key, value: discover_workload(aws_session, key, value, discovery_regions, discovery_workers),
+            refresh=refresh
+        )
+        return json.dumps(dict(inventory, prescan=evaluate(inventory)), separators=(",", ":"), default=str)
+
+    return discover_workload_resources
+
+def run_agent(session_id: str, prompt: str):
+    # Get or create agent instance for this session
+    with agent_pool.session(session_id) as agent:
+        return agent(prompt)
+
+async def run_agent_in_executor(session_id: str, prompt: str):
+    invocation_limiter.acquire()
+    loop = asyncio.get_running_loop()
+    future = agent_executor.submit(run_agent, session_id, prompt)
+    # Release when the run actually ends, even if the client has gone away
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(invocation_limiter.release))
+    return await asyncio.wrap_future(future)
+
+def response_output(result) -> Dict[str, Any]:
+    return {
+        "message": result.message,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "model": "strands-agent",
+    }
+
+def stream_events(agent_event: Dict[str, Any]):
+    """
+    Translate one stream_async event into (event, data) pairs for the client:
+    text deltas, tool calls and their results, findings (the assistant's text
+    before it calls more tools) and the final result.
+    """
+    if "data" in agent_event:
+        yield "text", {"text": agent_event["data"]}
+    elif "message" in agent_event:
+        message = agent_event["message"]
+        content = message.get("content", [])
+        tool_uses = [block["toolUse"] for block in content if "toolUse" in block]
+        if message.get("role") == "assistant" and tool_uses:
+            text = "".join(block.get("text", "") for block in content).strip()
+            if text:
+                yield "finding", {"text": text}
+            for tool_use in tool_uses:
+                yield "tool_call", {"tool_use_id": tool_use.get("toolUseId"), "name": tool_use.get("name"), "input": tool_use.get("input")}
+        for block in content:
+            if "toolResult" in block:
+                yield "tool_result", {"tool_use_id": block["toolResult"].get("toolUseId"), "status": block["toolResult"].get("status")}
+    elif "result" in agent_event:
+        yield "result", response_output(agent_event["result"])
+
+def stream_agent(session_id: str, prompt: str, emit, cancelled: threading.Event):
+    with agent_pool.session(session_id) as agent:
+        async def consume():
+            async with aclosing(agent.stream_async(prompt)) as agent_events:
+                async for agent_event in agent_events:
+                    if cancelled.is_set():
+                        break
+                    for event, data in stream_events(agent_event):
+                        emit(event, data)
+        # The worker thread has no event loop of its own
+        asyncio.run(consume())
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def start_agent_stream(session_id: str, prompt: str):
+    """
+    Start a streaming run on the agent executor and return an async generator of
+    Server-Sent Events. The run is admitted (or rejected with 429) before any
+    response is sent.
+    """
+    invocation_limiter.acquire()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    future = agent_executor.submit(stream_agent, session_id, prompt, emit, cancelled)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(invocation_limiter.release))
+    # Scheduled after every emit, so it marks the end of the stream
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+
+    async def events():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=sse_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield sse_event(*item)
+            # A run still queued at shutdown is cancelled, and exception() would raise
+            if future.cancelled():
+                yield sse_event("error", {"detail": "Agent processing was cancelled"})
+            elif future.exception() is not None:
+                yield sse_event("error", {"detail": f"Agent processing failed: {str(future.exception())}"})
+        finally:
+            # Stop the agent at its next event if the client went away
+            cancelled.set()
+
+    return events()
+
 @app.post("/invocations", response_model=InvocationResponse)
-async def invoke_agent(request: InvocationRequest):
+async def invoke_agent(request: InvocationRequest, http_request: Request):
 
     prompt = {}
     response = {}
@@ -91,6 +452,10 @@ async def invoke_agent(request: InvocationRequest):
     #   {
     #       "input": { "tag-name": "value" , "tag-value", "value", "RTO": "value", "RPO": "value" }
     #   }
+    #
+    # Sending "stream": true in the input, or an Accept header of text/event-stream,
+    # returns Server-Sent Events (text, tool_call, tool_result, finding, result, error)
+    # instead of a single JSON response.
 
     try:
         #Pull out the tag value: 
@@ -119,35 +484,31 @@ async def invoke_agent(request: InvocationRequest):
                 detail="No session-id found in input. Please provide a 'session-id' key in the input."
             )
         logging.info(f"SessionId: {session_id}")
-        session_manager = S3SessionManager(
-            session_id=session_id, 
-            bucket=bucket_name, 
-            prefix="prod"
-        )
 
-        with aws_doc_mcp_client:
-            aws_doc_tools = aws_doc_mcp_client.list_tools_sync()
-            # Get or create agent instance for this session
-            agent = Agent(model=bedrock_model,
-                            system_prompt=SYSTEM_PROMPT,
-                            tools=[use_aws, calculate_letter_grade, aws_doc_tools],
-                            session_manager=session_manager)
-
-            result = agent(prompt)
-            response = {
-                "message": result.message,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "model": "strands-agent",
-            }
+        if request.input.get("stream") or "text/event-stream" in http_request.headers.get("accept", ""):
+            return StreamingResponse(
+                start_agent_stream(session_id, prompt),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+        result = await run_agent_in_executor(session_id, prompt)
+        response = response_output(result)
 
         return InvocationResponse(output=response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent processing failed: {str(e)}")
 
 @app.get("/ping")
 async def ping():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "running": invocation_limiter.running,
+        "queued": invocation_limiter.queued,
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -0,0 +1,294 @@
+# This code provides a sample solution for demonstration purposes. Organizations should implement security best practices,
+# including controls for authentication, data protection, and prompt injection in any production workloads. Please reference
+# the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
+
+# Discovers the resources of a tag-scoped workload and their resilience-relevant attributes
+# in one pass, so the agent does not need a model round trip per describe/list call.
+# Only uses boto3, so it can be exercised against moto without the agent.
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+def parse_arn(arn: str):
+    """Return (service, resource_type, resource_id, region) for an ARN."""
+    parts = arn.split(":", 5)
+    service, region, resource = parts[2], parts[3], parts[5]
+    separators = [i for i in (resource.find("/"), resource.find(":")) if i >= 0]
+    if not separators:
+        # S3 bucket ARNs are just the bucket name
+        return service, "bucket" if service == "s3" else resource, resource, region
+    split_at = min(separators)
+    return service, resource[:split_at], resource[split_at + 1:], region
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _name_tag(tags):
+    return next((tag["Value"] for tag in tags or [] if tag.get("Key") == "Name"), None)
+
+class ClientFactory:
+    """One boto3 client per (service, region). boto3 sessions are not thread safe, clients are."""
+
+    def __init__(self, session, max_pool_connections: int = 10):
+        self.session = session
+        self.config = Config(max_pool_connections=max_pool_connections, retries={"max_attempts": 5, "mode": "adaptive"})
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, service: str, region: str):
+        with self._lock:
+            key = (service, region)
+            if key not in self._clients:
+                self._clients[key] = self.session.client(service, region_name=region, config=self.config)
+            return self._clients[key]
+
+# Attribute fetchers. Each takes (clients, region, keys) and returns {key: attributes}, where the
+# key is the resource id or ARN as declared in FETCHERS.
+
+def _rds_instances(clients, region, ids):
+    rds = clients("rds", region)
+    attributes = {}
+    for chunk in _chunks(ids, 100):
+        for page in rds.get_paginator("describe_db_instances").paginate(Filters=[{"Name": "db-instance-id", "Values": chunk}]):
+            for db in page["DBInstances"]:
+                attributes[db["DBInstanceIdentifier"]] = {
+                    "engine": db.get("Engine"),
+                    "multi_az": db.get("MultiAZ", False),
+                    "availability_zone": db.get("AvailabilityZone"),
+                    "backup_retention_days": db.get("BackupRetentionPeriod", 0),
+                    "read_replicas": len(db.get("ReadReplicaDBInstanceIdentifiers", [])),
+                    "replication_source": db.get("ReadReplicaSourceDBInstanceIdentifier"),
+                    "cluster": db.get("DBClusterIdentifier"),
+                }
+    return attributes
+
+def _rds_clusters(clients, region, ids):
+    rds = clients("rds", region)
+    attributes = {}
+    for chunk in _chunks(ids, 100):
+        for page in rds.get_paginator("describe_db_clusters").paginate(Filters=[{"Name": "db-cluster-id", "Values": chunk}]):
+            for cluster in page["DBClusters"]:
+                attributes[cluster["DBClusterIdentifier"]] = {
+                    "engine": cluster.get("Engine"),
+                    "multi_az": cluster.get("MultiAZ", False),
+                    "availability_zones": len(cluster.get("AvailabilityZones", [])),
+                    "members": len(cluster.get("DBClusterMembers", [])),
+                    "backup_retention_days": cluster.get("BackupRetentionPeriod", 0),
+                    "read_replicas": len(cluster.get("ReadReplicaIdentifiers", [])),
+                    "replication_source": cluster.get("ReplicationSourceIdentifier"),
+                }
+    return attributes
+
+def _ec2_instances(clients, region, ids):
+    ec2 = clients("ec2", region)
+    attributes = {}
+    for chunk in _chunks(ids, 1000):
+        for page in ec2.get_paginator("describe_instances").paginate(InstanceIds=chunk):
+            for reservation in page["Reservations"]:
+                for instance in reservation["Instances"]:
+                    tags = {tag["Key"]: tag["Value"] for tag in instance.get("Tags", [])}
+                    attributes[instance["InstanceId"]] = {
+                        "instance_type": instance.get("InstanceType"),
+                        "state": instance.get("State", {}).get("Name"),
+                        "availability_zone": instance.get("Placement", {}).get("AvailabilityZone"),
+                        "auto_scaling_group": tags.get("aws:autoscaling:groupName"),
+                    }
+    return attributes
+
+def _s3_buckets(clients, region, ids):
+    s3 = clients("s3", region)
+    attributes = {}
+    for bucket in ids:
+        versioning = s3.get_bucket_versioning(Bucket=bucket).get("Status", "Disabled")
+        try:
+            replication_rules = len(s3.get_bucket_replication(Bucket=bucket)["ReplicationConfiguration"].get("Rules", []))
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ReplicationConfigurationNotFoundError":
+                raise
+            replication_rules = 0
+        attributes[bucket] = {"versioning": versioning, "replication_rules": replication_rules}
+    return attributes
+
+def _dynamodb_tables(clients, region, ids):
+    dynamodb = clients("dynamodb", region)
+    attributes = {}
+    for table_name in ids:
+        table = dynamodb.describe_table(TableName=table_name)["Table"]
+        backups = dynamodb.describe_continuous_backups(TableName=table_name)["ContinuousBackupsDescription"]
+        attributes[table_name] = {
+            "billing_mode": table.get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED"),
+            "replica_regions": [replica["RegionName"] for replica in table.get("Replicas", [])],
+            "point_in_time_recovery": backups.get("PointInTimeRecoveryDescription", {}).get("PointInTimeRecoveryStatus") == "ENABLED",
+        }
+    return attributes
+
+def _load_balancers(clients, region, arns):
+    elbv2 = clients("elbv2", region)
+    attributes = {}
+    for chunk in _chunks(arns, 20):
+        for load_balancer in elbv2.describe_load_balancers(LoadBalancerArns=chunk)["LoadBalancers"]:
+            attributes[load_balancer["LoadBalancerArn"]] = {
+                "name": load_balancer.get("LoadBalancerName"),
+                "load_balancer_type": load_balancer.get("Type"),
+                "scheme": load_balancer.get("Scheme"),
+                "availability_zones": len(load_balancer.get("AvailabilityZones", [])),
+            }
+    return attributes
+
+# Resource type (service:type from the ARN) -> (attribute fetcher, record field it is keyed by)
+FETCHERS = {
+    "rds:db": (_rds_instances, "id"),
+    "rds:cluster": (_rds_clusters, "id"),
+    "ec2:instance": (_ec2_instances, "id"),
+    "s3:bucket": (_s3_buckets, "id"),
+    "dynamodb:table": (_dynamodb_tables, "id"),
+    "elasticloadbalancing:loadbalancer": (_load_balancers, "arn"),
+}
+
+def _tagged_resources(clients, region, tag_key, tag_value):
+    tagging = clients("resourcegroupstaggingapi", region)
+    resources = []
+    for page in tagging.get_paginator("get_resources").paginate(TagFilters=[{"Key": tag_key, "Values": [tag_value]}]):
+        resources.extend(page["ResourceTagMappingList"])
+    return resources
+
+def _auto_scaling_groups(clients, region, tag_key, tag_value):
+    # The tagging API does not return Auto Scaling groups, so query them by tag directly
+    autoscaling = clients("autoscaling", region)
+    groups = {}
+    paginator = autoscaling.get_paginator("describe_auto_scaling_groups")
+    for page in paginator.paginate(Filters=[{"Name": f"tag:{tag_key}", "Values": [tag_value]}]):
+        for group in page["AutoScalingGroups"]:
+            instance_zones = {instance.get("AvailabilityZone") for instance in group.get("Instances", [])}
+            groups[group["AutoScalingGroupARN"]] = {
+                "id": group["AutoScalingGroupName"],
+                "region": region,
+                "min_size": group.get("MinSize"),
+                "max_size": group.get("MaxSize"),
+                "desired_capacity": group.get("DesiredCapacity"),
+                "instances": len(group.get("Instances", [])),
+                "availability_zones": len(group.get("AvailabilityZones", [])),
+                "instance_availability_zones": len(instance_zones),
+                "health_check_type": group.get("HealthCheckType"),
+            }
+    return groups
+
+def _protected_resources(clients, region):
+    """ARNs protected by AWS Backup in the region, with their last backup time."""
+    backup = clients("backup", region)
+    protected = {}
+    for page in backup.get_paginator("list_protected_resources").paginate():
+        for resource in page["Results"]:
+            protected[resource["ResourceArn"]] = resource.get("LastBackupTime")
+    return protected
+
+def discover_workload(session, tag_key: str, tag_value: str, regions, max_workers: int = 8):
+    """
+    Build a compact inventory of the resources tagged tag_key=tag_value.
+
+    The tagging API, Auto Scaling and AWS Backup are queried per region in
+    parallel, then attributes are fetched in parallel per resource type and
+    region. Failed calls are listed under "errors" instead of failing the
+    whole discovery, and attributes that could not be read are left out.
+    """
+    started = time.monotonic()
+    clients = ClientFactory(session, max_pool_connections=max_workers)
+    errors = []
+
+    def attempt(what, region, fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            logger.warning(f"Discovery of {what} in {region} failed: {e}")
+            errors.append({"call": what, "region": region, "error": str(e)})
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tagged = {region: executor.submit(attempt, "tagged resources", region, _tagged_resources, clients, region, tag_key, tag_value)
+                  for region in regions}
+        groups = {region: executor.submit(attempt, "auto scaling groups", region, _auto_scaling_groups, clients, region, tag_key, tag_value)
+                  for region in regions}
+        protected = {region: executor.submit(attempt, "backup protected resources", region, _protected_resources, clients, region)
+                     for region in regions}
+
+        # resource type -> list of records, and the records waiting for attributes
+        resources = {}
+        pending = {}
+        for region, future in tagged.items():
+            for mapping in future.result() or []:
+                arn = mapping["ResourceARN"]
+                service, resource_type, resource_id, arn_region = parse_arn(arn)
+                type_key = f"{service}:{resource_type}"
+                if type_key == "autoscaling:autoScalingGroup":
+                    continue
+                record = {"id": resource_id, "region": arn_region or region, "arn": arn}
+                name = _name_tag(mapping.get("Tags"))
+                if name:
+                    record["name"] = name
+                resources.setdefault(type_key, []).append(record)
+                if type_key in FETCHERS:
+                    pending.setdefault((type_key, record["region"]), []).append(record)
+
+        fetches = {}
+        for (type_key, region), records in pending.items():
+            fetcher, key = FETCHERS[type_key]
+            fetches[(type_key, region)] = executor.submit(attempt, type_key, region, fetcher, clients, region,
+                                                          [record[key] for record in records])
+
+        for (type_key, region), future in fetches.items():
+            attributes = future.result() or {}
+            key = FETCHERS[type_key][1]
+            for record in pending[(type_key, region)]:
+                record.update(attributes.get(record[key], {}))
+
+        for region, future in groups.items():
+            for arn, group in (future.result() or {}).items():
+                resources.setdefault("autoscaling:autoScalingGroup", []).append(dict(group, arn=arn))
+
+        backup_known = {region: future.result() for region, future in protected.items()}
+
+    for records in resources.values():
+        for record in records:
+            # No aws_backup field when AWS Backup could not be queried for the region
+            protected_in_region = backup_known.get(record["region"])
+            if protected_in_region is not None:
+                record["aws_backup"] = record["arn"] in protected_in_region
+            record.pop("arn")
+            # Keep the inventory compact; a missing attribute means it is unknown or not set
+            for field in [field for field, value in record.items() if value is None]:
+                del record[field]
+
+    return {
+        "tag": {"key": tag_key, "value": tag_value},
+        "regions": list(regions),
+        "resource_count": sum(len(records) for records in resources.values()),
+        "resources": resources,
+        "errors": errors,
+        "duration_ms": round((time.monotonic() - started) * 1000),
+    }
+
+class InventoryCache:
+    """Inventories by (tag key, tag value), reused for ttl seconds."""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._inventories = {}
+        self._lock = threading.Lock()
+
+    def get(self, tag_key: str, tag_value: str, discover, refresh: bool = False):
+        key = (tag_key, tag_value)
+        with self._lock:
+            cached = self._inventories.get(key)
+        if cached and not refresh and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        inventory = discover(tag_key, tag_value)
+        with self._lock:
+            self._inventories[key] = (time.monotonic(), inventory)
+        return inventory
@@ -7,6 +7,7 @@ import uuid
 from rich.console import Console 
 from rich.markdown import Markdown
 from colorama import Fore
+from stream_renderer import render_stream, message_text
 
 # Function to clear the screen
 def clear_scren():
@@ -61,19 +62,25 @@ def main():
                     continue
             
                     
-            response = requests.post(
+            # Stream the answer; the read timeout applies between events, and the server sends keep-alives
+            with requests.post(
                 "http://localhost:8080/invocations",
                 json=payload,
-                timeout=300
-            )
+                headers={"Accept": "text/event-stream"},
+                stream=True,
+                timeout=(10, 300)
+            ) as response:
 
-            if response.status_code == 200:
-                result = response.json()
-                clear_scren()
-                markdown = Markdown(result['output']['message']['content'][0]['text'])
-                console.print(markdown)
-            else:
-                print(Fore.RED + f"\nError: {response.status_code} - {response.text}\n")
+                if response.status_code != 200:
+                    print(Fore.RED + f"\nError: {response.status_code} - {response.text}\n")
+                elif response.headers.get("content-type", "").startswith("text/event-stream"):
+                    clear_scren()
+                    render_stream(response.iter_lines(decode_unicode=True), console)
+                else:
+                    result = response.json()
+                    clear_scren()
+                    markdown = Markdown(message_text(result['output']['message']))
+                    console.print(markdown)
                     
         except KeyboardInterrupt:
             print("\n\nGoodbye!")
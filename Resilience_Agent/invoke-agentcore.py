@@ -10,6 +10,7 @@ import uuid
 from rich.console import Console 
 from rich.markdown import Markdown
 from colorama import Fore
+from stream_renderer import render_stream, message_text
 
 # Modify these 3 lines
 AGENT_RUNTIME_ARN = "arn:aws:bedrock-agentcore:YOUR-REGION:YOUR-ACCOUNT-ID:runtime/YOUR-AGENT-RUNTIME-ID"
@@ -18,16 +19,22 @@ AWS_PROFILE = "default"
 
 client = boto3.client('bedrock-agentcore', profile_name=AWS_PROFILE, region_name=REGION)
 
-def invoke_agent(payload, session_id):
+def invoke_agent(payload, session_id, console):
     response = client.invoke_agent_runtime(
         agentRuntimeArn=AGENT_RUNTIME_ARN,
         runtimeSessionId=session_id,  # Must be 33+ chars
-        payload=payload
+        payload=payload,
+        accept="text/event-stream"
     )
-    response_body = response['response'].read()
-    response_data = json.loads(response_body)
 
-    return response_data
+    clear_scren()
+    if response.get('contentType', '').startswith("text/event-stream"):
+        # Render tool progress and the answer as the runtime streams them
+        return render_stream(response['response'].iter_lines(), console)
+
+    response_data = json.loads(response['response'].read())
+    console.print(Markdown(message_text(response_data['output']['message'])))
+    return response_data['output']
 
 
 # Function to clear the screen
@@ -83,11 +90,7 @@ def main():
                     continue
             
                     
-            result = invoke_agent(json.dumps(payload), session_id)
-
-            clear_scren()
-            markdown = Markdown(result['output']['message']['content'][0]['text'])
-            console.print(markdown)
+            invoke_agent(json.dumps(payload), session_id, console)
                     
         except KeyboardInterrupt:
             print("\n\nGoodbye!")
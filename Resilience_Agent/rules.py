@@ -0,0 +1,129 @@
+# This code provides a sample solution for demonstration purposes. Organizations should implement security best practices,
+# including controls for authentication, data protection, and prompt injection in any production workloads. Please reference
+# the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
+
+# Deterministic resilience checks over a discovered inventory (see discovery.py).
+# The well-known gaps are classified here in plain Python, so the model only has to
+# explain and prioritize them against the RTO/RPO. No AWS or model calls: run it offline with
+#   python rules.py inventory.json
+
+import json
+import sys
+
+SEVERITIES = ("critical", "high", "medium", "low")
+
+class Rule:
+    """
+    One check over all resources of a type.
+
+    `check` receives the type's attributes as columns ({field: [value per resource]})
+    and returns one boolean per resource, True where the resource fails the check.
+    Missing attributes are None, and checks treat None as unknown rather than failing.
+    """
+
+    def __init__(self, rule_id, resource_type, severity, area, title, recommendation, fields, check):
+        self.rule_id = rule_id
+        self.resource_type = resource_type
+        self.severity = severity
+        self.area = area
+        self.title = title
+        self.recommendation = recommendation
+        self.fields = fields
+        self.check = check
+
+def _is(column, value):
+    return [v == value for v in column]
+
+def _below(column, limit):
+    return [v is not None and v < limit for v in column]
+
+def _and(*masks):
+    return [all(values) for values in zip(*masks)]
+
+def _not_set(column):
+    return [v is None for v in column]
+
+RULES = [
+    Rule("RDS-001", "rds:db", "high", "Redundancy", "RDS instance is single-AZ",
+         "Enable Multi-AZ so the instance fails over to a standby in another Availability Zone.",
+         ("multi_az", "cluster"), lambda c: _and(_is(c["multi_az"], False), _not_set(c["cluster"]))),
+    Rule("RDS-002", "rds:db", "critical", "Correct Output", "RDS instance has automated backups disabled",
+         "Set a backup retention period so the database can be restored to a point in time.",
+         ("backup_retention_days", "cluster"), lambda c: _and(_is(c["backup_retention_days"], 0), _not_set(c["cluster"]))),
+    Rule("RDS-003", "rds:cluster", "high", "Redundancy", "Database cluster has no failover target",
+         "Add a reader instance in another Availability Zone so the cluster can fail over.",
+         ("members", "multi_az"), lambda c: _and(_below(c["members"], 2), [v is not True for v in c["multi_az"]])),
+    Rule("ASG-001", "autoscaling:autoScalingGroup", "high", "Redundancy", "Auto Scaling group runs a single instance",
+         "Raise the minimum and desired capacity to at least two instances.",
+         ("max_size", "desired_capacity"), lambda c: [m is not None and (m <= 1 or (d or 0) <= 1)
+                                                      for m, d in zip(c["max_size"], c["desired_capacity"])]),
+    Rule("ASG-002", "autoscaling:autoScalingGroup", "high", "Fault Isolation", "Auto Scaling group spans a single Availability Zone",
+         "Configure the group with subnets in at least two Availability Zones.",
+         ("availability_zones",), lambda c: _below(c["availability_zones"], 2)),
+    Rule("EC2-001", "ec2:instance", "medium", "Redundancy", "EC2 instance is not in an Auto Scaling group",
+         "Run the instance in an Auto Scaling group, or use EC2 auto recovery, so it is replaced when it fails.",
+         ("auto_scaling_group", "state"), lambda c: _and(_not_set(c["auto_scaling_group"]), _is(c["state"], "running"))),
+    Rule("S3-001", "s3:bucket", "medium", "Correct Output", "S3 bucket versioning is not enabled",
+         "Enable versioning so overwritten or deleted objects can be recovered.",
+         ("versioning",), lambda c: [v is not None and v != "Enabled" for v in c["versioning"]]),
+    Rule("S3-002", "s3:bucket", "low", "Fault Isolation", "S3 bucket is not replicated",
+         "Add a replication rule to another Region if the data must survive a Regional event.",
+         ("replication_rules",), lambda c: _is(c["replication_rules"], 0)),
+    Rule("DDB-001", "dynamodb:table", "high", "Correct Output", "DynamoDB point-in-time recovery is disabled",
+         "Enable point-in-time recovery to restore the table to any second in the last 35 days.",
+         ("point_in_time_recovery",), lambda c: _is(c["point_in_time_recovery"], False)),
+    Rule("DDB-002", "dynamodb:table", "low", "Fault Isolation", "DynamoDB table has no replicas in other Regions",
+         "Use a global table if the workload needs to keep running through a Regional event.",
+         ("replica_regions",), lambda c: _is(c["replica_regions"], [])),
+    Rule("ELB-001", "elasticloadbalancing:loadbalancer", "high", "Fault Isolation", "Load balancer spans a single Availability Zone",
+         "Enable at least two Availability Zones on the load balancer.",
+         ("availability_zones",), lambda c: _below(c["availability_zones"], 2)),
+] + [
+    Rule(f"BAK-{index:03d}", resource_type, "medium", "Correct Output", "Resource is not protected by AWS Backup",
+         "Add the resource to an AWS Backup plan with a schedule and retention matching the RPO.",
+         ("aws_backup",), lambda c: _is(c["aws_backup"], False))
+    for index, resource_type in enumerate(("rds:db", "rds:cluster", "dynamodb:table", "ec2:instance"), start=1)
+]
+
+def _columns(records, fields):
+    return {field: [record.get(field) for record in records] for field in fields}
+
+def evaluate(inventory, rules=RULES):
+    """
+    Run the rules over an inventory and return the findings grouped by rule, most severe first.
+
+    `summary` counts affected resources per severity, matching the arguments of
+    calculate_letter_grade.
+    """
+    resources = inventory.get("resources", {})
+    findings = []
+    for rule in rules:
+        records = resources.get(rule.resource_type) or []
+        if not records:
+            continue
+        failed = rule.check(_columns(records, rule.fields))
+        affected = [f"{record['id']} ({record['region']})" for record, fails in zip(records, failed) if fails]
+        if affected:
+            findings.append({
+                "rule": rule.rule_id,
+                "severity": rule.severity,
+                "area": rule.area,
+                "title": rule.title,
+                "recommendation": rule.recommendation,
+                "resources": affected,
+            })
+    findings.sort(key=lambda finding: SEVERITIES.index(finding["severity"]))
+
+    summary = dict.fromkeys(SEVERITIES, 0)
+    for finding in findings:
+        summary[finding["severity"]] += len(finding["resources"])
+    return {
+        "findings": findings,
+        "summary": summary,
+        "rules_evaluated": sum(1 for rule in rules if resources.get(rule.resource_type)),
+        "resources_evaluated": sum(len(records) for records in resources.values()),
+    }
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as inventory_file:
+        print(json.dumps(evaluate(json.load(inventory_file)), indent=2))
@@ -0,0 +1,71 @@
+# This code provides a sample solution for demonstration purposes. Organizations should implement security best practices,
+# including controls for authentication, data protection, and prompt injection in any production workloads. Please reference
+# the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
+
+# Renders the agent's Server-Sent Events stream in the terminal as it arrives.
+# Used by interactive.py and invoke-agentcore.py.
+
+import json
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+
+def iter_sse(lines):
+    """Yield (event, data) pairs from an iterable of SSE lines (str or bytes). data is parsed JSON."""
+    event, data = "message", []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip(" "))
+    if data:
+        yield event, json.loads("\n".join(data))
+
+def message_text(message):
+    return "".join(block.get("text", "") for block in message.get("content", []))
+
+def describe_tool_call(tool_call):
+    tool_input = tool_call.get("input") or {}
+    if tool_call.get("name") == "use_aws" and isinstance(tool_input, dict):
+        return f"use_aws {tool_input.get('service_name', '')}.{tool_input.get('operation_name', '')}"
+    summary = json.dumps(tool_input, default=str)
+    return f"{tool_call.get('name')} {summary[:80]}{'…' if len(summary) > 80 else ''}"
+
+def render_stream(lines, console: Console):
+    """
+    Print tool calls and findings as they happen and the answer as live markdown.
+    Returns the final output ({"message", "timestamp", "model"}) or None if the stream ended early.
+    """
+    text = ""
+    output = None
+    tool_names = {}
+    with Live(Markdown(""), console=console, refresh_per_second=8, vertical_overflow="visible") as live:
+        for event, data in iter_sse(lines):
+            if event == "text":
+                text += data["text"]
+                live.update(Markdown(text))
+            elif event == "finding":
+                # The streamed text so far was commentary ahead of more tool calls
+                text = ""
+                live.update(Markdown(""))
+                console.print(Markdown(data["text"]), style="dim")
+            elif event == "tool_call":
+                tool_names[data.get("tool_use_id")] = data.get("name")
+                console.print(f"🔧 {describe_tool_call(data)}", style="cyan")
+            elif event == "tool_result" and data.get("status") == "error":
+                console.print(f"   ⚠️  {tool_names.get(data.get('tool_use_id'), 'tool')} failed", style="red")
+            elif event == "result":
+                output = data
+                live.update(Markdown(message_text(data["message"])))
+            elif event == "error":
+                raise RuntimeError(data.get("detail"))
+    return output
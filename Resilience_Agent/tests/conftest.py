@@ -0,0 +1,9 @@
+# This code provides a sample solution for demonstration purposes. Organizations should implement security best practices,
+# including controls for authentication, data protection, and prompt injection in any production workloads. Please reference
+# the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
+
+import os
+import sys
+
+# The agent modules live in the folder above, not in an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,158 @@
+# This code provides a sample solution for demonstration purposes. Organizations should implement security best practices,
+# including controls for authentication, data protection, and prompt injection in any production workloads. Please reference
+# the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import discovery
+
+REGION = "us-east-1"
+TAGS = [{"Key": "app", "Value": "shop"}]
+
+
+@pytest.fixture
+def session():
+    with mock_aws():
+        yield boto3.session.Session(region_name=REGION, aws_access_key_id="testing", aws_secret_access_key="testing")
+
+
+def _create_db(session, identifier, tags, **kwargs):
+    session.client("rds").create_db_instance(
+        DBInstanceIdentifier=identifier, DBInstanceClass="db.t3.micro", Engine="postgres",
+        MasterUsername="admin", MasterUserPassword="password1", AllocatedStorage=20, Tags=tags, **kwargs
+    )
+
+
+def _create_table(session, name, tags):
+    session.client("dynamodb").create_table(
+        TableName=name, KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST", Tags=tags
+    )
+
+
+@pytest.fixture
+def workload(session):
+    """A small tagged workload, plus one database belonging to another workload."""
+    _create_db(session, "orders-db", TAGS, MultiAZ=False, BackupRetentionPeriod=0)
+    _create_db(session, "other-db", [{"Key": "app", "Value": "other"}], MultiAZ=True)
+
+    s3 = session.client("s3")
+    s3.create_bucket(Bucket="shop-assets")
+    s3.put_bucket_tagging(Bucket="shop-assets", Tagging={"TagSet": TAGS})
+    s3.create_bucket(Bucket="shop-logs")
+    s3.put_bucket_tagging(Bucket="shop-logs", Tagging={"TagSet": TAGS})
+    s3.put_bucket_versioning(Bucket="shop-logs", VersioningConfiguration={"Status": "Enabled"})
+
+    _create_table(session, "carts", TAGS)
+    _create_table(session, "sessions", TAGS)
+    session.client("dynamodb").update_continuous_backups(
+        TableName="sessions", PointInTimeRecoverySpecification={"PointInTimeRecoveryEnabled": True}
+    )
+
+    ec2 = session.client("ec2")
+    image_id = ec2.describe_images()["Images"][0]["ImageId"]
+    instance = ec2.run_instances(
+        ImageId=image_id, MinCount=1, MaxCount=1, InstanceType="t3.micro",
+        TagSpecifications=[{"ResourceType": "instance", "Tags": TAGS + [{"Key": "Name", "Value": "web"}]}]
+    )["Instances"][0]
+    return {"instance_id": instance["InstanceId"]}
+
+
+def _by_id(inventory, resource_type):
+    return {record["id"]: record for record in inventory["resources"].get(resource_type, [])}
+
+
+def test_discovers_only_tagged_resources(session, workload):
+    inventory = discovery.discover_workload(session, "app", "shop", [REGION])
+
+    assert inventory["tag"] == {"key": "app", "value": "shop"}
+    assert inventory["regions"] == [REGION]
+    assert set(_by_id(inventory, "rds:db")) == {"orders-db"}
+    assert set(_by_id(inventory, "s3:bucket")) == {"shop-assets", "shop-logs"}
+    assert set(_by_id(inventory, "dynamodb:table")) == {"carts", "sessions"}
+    assert set(_by_id(inventory, "ec2:instance")) == {workload["instance_id"]}
+    assert inventory["resource_count"] == 6
+
+
+def test_records_carry_resilience_attributes(session, workload):
+    inventory = discovery.discover_workload(session, "app", "shop", [REGION])
+
+    database = _by_id(inventory, "rds:db")["orders-db"]
+    assert database["region"] == REGION
+    assert database["engine"] == "postgres"
+    assert database["multi_az"] is False
+    assert database["backup_retention_days"] == 0
+
+    buckets = _by_id(inventory, "s3:bucket")
+    assert buckets["shop-assets"]["versioning"] == "Disabled"
+    assert buckets["shop-logs"]["versioning"] == "Enabled"
+    assert buckets["shop-assets"]["replication_rules"] == 0
+
+    tables = _by_id(inventory, "dynamodb:table")
+    assert tables["carts"]["point_in_time_recovery"] is False
+    assert tables["sessions"]["point_in_time_recovery"] is True
+    assert tables["carts"]["replica_regions"] == []
+
+    instance = _by_id(inventory, "ec2:instance")[workload["instance_id"]]
+    assert instance["name"] == "web"
+    assert instance["state"] == "running"
+    assert instance["instance_type"] == "t3.micro"
+
+
+def test_unknown_attributes_are_left_out(session, workload):
+    inventory = discovery.discover_workload(session, "app", "shop", [REGION])
+
+    for records in inventory["resources"].values():
+        for record in records:
+            assert "arn" not in record
+            assert None not in record.values()
+    # Not in a cluster or an Auto Scaling group, so the fields are absent rather than None
+    assert "cluster" not in _by_id(inventory, "rds:db")["orders-db"]
+    assert "auto_scaling_group" not in _by_id(inventory, "ec2:instance")[workload["instance_id"]]
+
+
+def test_failed_calls_are_reported_instead_of_raised(session, workload, monkeypatch):
+    def fail(clients, region):
+        raise RuntimeError("backup unavailable")
+
+    monkeypatch.setattr(discovery, "_protected_resources", fail)
+    inventory = discovery.discover_workload(session, "app", "shop", [REGION])
+
+    assert {"call": "backup protected resources", "region": REGION, "error": "backup unavailable"} in inventory["errors"]
+    # Backup protection is unknown, not False, when AWS Backup could not be queried
+    assert all("aws_backup" not in record for records in inventory["resources"].values() for record in records)
+    assert "orders-db" in _by_id(inventory, "rds:db")
+
+
+def test_backup_protection_is_matched_by_arn(session, workload, monkeypatch):
+    database_arn = session.client("rds").describe_db_instances(DBInstanceIdentifier="orders-db")["DBInstances"][0]["DBInstanceArn"]
+    monkeypatch.setattr(discovery, "_protected_resources", lambda clients, region: {database_arn: None})
+    inventory = discovery.discover_workload(session, "app", "shop", [REGION])
+
+    assert inventory["errors"] == []
+    assert _by_id(inventory, "rds:db")["orders-db"]["aws_backup"] is True
+    assert _by_id(inventory, "dynamodb:table")["carts"]["aws_backup"] is False
+
+
+def test_no_tagged_resources(session):
+    inventory = discovery.discover_workload(session, "app", "missing", [REGION])
+
+    assert inventory["resources"] == {}
+    assert inventory["resource_count"] == 0
+
+
+def test_inventory_cache_reuses_until_refresh():
+    calls = []
+
+    def discover(tag_key, tag_value):
+        calls.append((tag_key, tag_value))
+        return {"resources": {}, "call": len(calls)}
+
+    cache = discovery.InventoryCache(ttl=60)
+    assert cache.get("app", "shop", discover)["call"] == 1
+    assert cache.get("app", "shop", discover)["call"] == 1
+    assert cache.get("app", "shop", discover, refresh=True)["call"] == 2
+    assert cache.get("app", "other", discover)["call"] == 3
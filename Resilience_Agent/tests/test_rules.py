@@ -0,0 +1,121 @@
+# This code provides a sample solution for demonstration purposes. Organizations should implement security best practices,
+# including controls for authentication, data protection, and prompt injection in any production workloads. Please reference
+# the security pillar of the AWS Well-Architected Framework and Amazon Bedrock documentation for more information.
+
+import json
+from pathlib import Path
+
+import pytest
+
+from rules import RULES, SEVERITIES, Rule, _not_set, evaluate
+
+FIXTURE = Path(__file__).parent / "fixtures" / "inventory.json"
+
+# Rule -> resources in the fixture that fail it; every other resource of the type passes
+EXPECTED = {
+    "RDS-001": ["single-az-db (us-east-1)"],
+    "RDS-002": ["no-backups-db (us-east-1)"],
+    "RDS-003": ["single-member-cluster (us-east-1)"],
+    "ASG-001": ["single-instance-asg (us-east-1)", "one-desired-asg (us-east-1)"],
+    "ASG-002": ["single-az-asg (us-east-1)"],
+    "EC2-001": ["i-standalone (us-east-1)"],
+    "S3-001": ["unversioned-bucket (us-east-1)", "suspended-bucket (us-east-1)"],
+    "S3-002": ["unreplicated-bucket (us-east-1)"],
+    "DDB-001": ["no-pitr-table (us-east-1)"],
+    "DDB-002": ["single-region-table (us-east-1)"],
+    "ELB-001": ["app/single-az-lb/1 (us-east-1)"],
+    "BAK-001": ["unprotected-db (us-west-2)"],
+    "BAK-002": ["replicated-cluster (us-east-1)"],
+    "BAK-003": ["unprotected-table (us-east-1)"],
+    "BAK-004": ["i-in-asg (us-east-1)"],
+}
+
+
+@pytest.fixture(scope="module")
+def inventory():
+    with open(FIXTURE) as inventory_file:
+        return json.load(inventory_file)
+
+
+@pytest.fixture(scope="module")
+def findings(inventory):
+    return {finding["rule"]: finding for finding in evaluate(inventory)["findings"]}
+
+
+def test_every_rule_is_covered_by_the_fixture():
+    assert set(EXPECTED) == {rule.rule_id for rule in RULES}
+
+
+@pytest.mark.parametrize("rule_id", sorted(EXPECTED))
+def test_rule_flags_exactly_the_failing_resources(findings, rule_id):
+    assert findings[rule_id]["resources"] == EXPECTED[rule_id]
+
+
+def test_aurora_cluster_members_are_left_to_the_cluster_rule(findings):
+    # aurora-writer is single-AZ with no retention of its own, but both belong to its cluster
+    assert not any("aurora-writer" in resource for resource in findings["RDS-001"]["resources"])
+    assert not any("aurora-writer" in resource for resource in findings["RDS-002"]["resources"])
+    assert findings["RDS-003"]["resources"] == ["single-member-cluster (us-east-1)"]
+
+
+def test_missing_attributes_are_unknown_not_failures(findings):
+    flagged = {resource for finding in findings.values() for resource in finding["resources"]}
+    for resource_id in ("unknown-db", "unknown-cluster", "unknown-asg", "unknown-bucket", "alerts"):
+        assert f"{resource_id} (us-east-1)" not in flagged
+
+
+def test_backup_rules_need_the_backup_attribute(inventory):
+    # Discovery leaves aws_backup out when AWS Backup could not be queried
+    without_backup = {
+        resource_type: [{field: value for field, value in record.items() if field != "aws_backup"} for record in records]
+        for resource_type, records in inventory["resources"].items()
+    }
+    result = evaluate({"resources": without_backup})
+
+    assert not [finding for finding in result["findings"] if finding["rule"].startswith("BAK-")]
+    assert {finding["rule"] for finding in result["findings"]} == {rule_id for rule_id in EXPECTED if not rule_id.startswith("BAK-")}
+
+
+def test_not_set_treats_only_none_as_missing():
+    assert _not_set([None, "", 0, False, "cluster"]) == [True, False, False, False, False]
+
+
+def test_findings_are_sorted_by_severity_with_rule_details(inventory):
+    findings = evaluate(inventory)["findings"]
+
+    ranks = [SEVERITIES.index(finding["severity"]) for finding in findings]
+    assert ranks == sorted(ranks)
+    assert findings[0]["rule"] == "RDS-002"
+    rule = next(rule for rule in RULES if rule.rule_id == "RDS-002")
+    assert {key: findings[0][key] for key in ("severity", "area", "title", "recommendation")} == {
+        "severity": rule.severity, "area": rule.area, "title": rule.title, "recommendation": rule.recommendation
+    }
+
+
+def test_summary_counts_affected_resources(inventory):
+    result = evaluate(inventory)
+
+    assert result["summary"] == {"critical": 1, "high": 7, "medium": 7, "low": 2}
+    assert result["rules_evaluated"] == len(RULES)
+    assert result["resources_evaluated"] == inventory["resource_count"]
+
+
+def test_empty_inventory():
+    result = evaluate({"resources": {}})
+
+    assert result == {"findings": [], "summary": dict.fromkeys(SEVERITIES, 0), "rules_evaluated": 0, "resources_evaluated": 0}
+
+
+def test_custom_rules_receive_columns():
+    seen = {}
+
+    def check(columns):
+        seen.update(columns)
+        return [value == "b" for value in columns["name"]]
+
+    rule = Rule("TST-001", "test:thing", "low", "Redundancy", "Named b", "Rename it.", ("name", "size"), check)
+    inventory = {"resources": {"test:thing": [{"id": "1", "region": "r", "name": "a"}, {"id": "2", "region": "r", "name": "b"}]}}
+    result = evaluate(inventory, rules=[rule])
+
+    assert seen == {"name": ["a", "b"], "size": [None, None]}
+    assert result["findings"][0]["resources"] == ["2 (r)"]
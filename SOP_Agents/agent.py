@@ -3,11 +3,26 @@
 
 This agent loads the donor-thank-you SOP and interactively gathers required
 parameters before generating a personalized thank-you letter.
+
+One agent is kept for the whole session and only the new user message is sent
+each turn; the agent's own message history carries the conversation. History
+is summarized once it grows past a token budget, and the finished letter is
+returned through the submit_thank_you_letter tool rather than detected in the
+response text.
 """
 
+import json
 import os
 import sys
-from strands import Agent
+import time
+from strands import Agent, tool
+from strands.agent.conversation_manager import SummarizingConversationManager
+
+
+# Estimated conversation size (in tokens) above which older turns are summarized
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "8000"))
+# Most recent messages kept verbatim when the history is summarized
+PRESERVE_RECENT_MESSAGES = 4
 
 
 def load_sop(filepath):
@@ -24,8 +39,45 @@ def load_sop(filepath):
     return content
 
 
-def create_agent_with_sop(sop_content, model_id="us.anthropic.claude-sonnet-4-5-20250929-v1:0"):
-    """Create a Strands agent with SOP guidance."""
+def estimate_tokens(messages):
+    """Rough token count of the agent's message history (about 4 characters per token)."""
+    return len(json.dumps(messages, default=str)) // 4
+
+
+def create_letter_tool(outcome):
+    """Create the tool the agent calls with the finished letter; it records the letter in outcome."""
+
+    @tool
+    def submit_thank_you_letter(donor_name: str, donation_amount: str, donation_date: str,
+                                program_name: str, organization_name: str, letter: str) -> str:
+        """Submit the finished thank-you letter.
+
+        Call this only once all required SOP parameters have been provided by the user
+        and the letter is complete. Do not call it to ask questions.
+
+        Args:
+            donor_name: Full name of the donor
+            donation_amount: Dollar amount donated
+            donation_date: Date the donation was received
+            program_name: Program or project the donation supports
+            organization_name: Name of the nonprofit organization
+            letter: The complete letter text, ready to send
+        """
+        outcome.update(
+            donor_name=donor_name,
+            donation_amount=donation_amount,
+            donation_date=donation_date,
+            program_name=program_name,
+            organization_name=organization_name,
+            letter=letter,
+        )
+        return "Letter received. Reply with one short sentence; do not repeat the letter."
+
+    return submit_thank_you_letter
+
+
+def create_agent_with_sop(sop_content, outcome, model_id="us.anthropic.claude-sonnet-4-5-20250929-v1:0"):
+    """Create a Strands agent with SOP guidance that submits its letter into outcome."""
     system_prompt = f"""You are a helpful assistant for a nonprofit organization helping with donor communications.
 
 You must follow these Standard Operating Procedures:
@@ -40,7 +92,7 @@ CRITICAL INSTRUCTIONS FOR PARAMETER GATHERING:
 - The SOP defines required parameters that you need to complete the task
 - If you are missing ANY required parameters, you MUST ask the user for them
 - You MUST ask for ALL missing parameters in a single prompt (don't ask one at a time)
-- Once you have all required parameters, proceed to generate the thank-you letter
+- Once you have all required parameters, write the thank-you letter and submit it by calling the submit_thank_you_letter tool
 - Do NOT make up or assume parameter values - always ask the user
 
 When asking for parameters, format your request clearly:
@@ -51,7 +103,15 @@ When asking for parameters, format your request clearly:
 """
     
     try:
-        return Agent(model=model_id, system_prompt=system_prompt)
+        return Agent(
+            model=model_id,
+            system_prompt=system_prompt,
+            tools=[create_letter_tool(outcome)],
+            # Older turns are summarized instead of being resent in full
+            conversation_manager=SummarizingConversationManager(preserve_recent_messages=PRESERVE_RECENT_MESSAGES),
+            # Don't print the streamed response; the loop prints it
+            callback_handler=None,
+        )
     except Exception as e:
         error_str = str(e)
         if "AccessDeniedException" in error_str or "access denied" in error_str.lower():
@@ -82,7 +142,8 @@ def run_agentic_loop():
     # Create agent
     try:
         print("🤖 Creating agent with SOP guidance...")
-        agent = create_agent_with_sop(sop_content)
+        outcome = {}
+        agent = create_agent_with_sop(sop_content, outcome)
         print("✓ Agent created\n")
     except Exception as e:
         print(f"❌ Error creating agent: {e}\n")
@@ -106,7 +167,6 @@ def run_agentic_loop():
         sys.exit(0)
     
     # Agentic loop
-    conversation_history = []
     max_turns = 10  # Prevent infinite loops
     turn = 0
     
@@ -117,97 +177,49 @@ def run_agentic_loop():
         print(f"Turn {turn}")
         print(f"{'─' * 80}\n")
         
-        # Build conversation context
-        if conversation_history:
-            context = "\n\n".join([
-                f"{'User' if i % 2 == 0 else 'Assistant'}: {msg}" 
-                for i, msg in enumerate(conversation_history)
-            ])
-            full_prompt = f"{context}\n\nUser: {user_input}"
-        else:
-            full_prompt = user_input
-        
-        # Get agent response
+        # Get agent response; the agent already holds the earlier turns
         try:
             print("🤖 Agent is thinking...\n")
-            
-            # Suppress Strands SDK output
-            import io
-            import contextlib
-            
-            # Capture stdout to suppress automatic printing
-            f = io.StringIO()
-            with contextlib.redirect_stdout(f):
-                result = agent(full_prompt)
+            started = time.monotonic()
+            result = agent(user_input)
             
             # Extract text from AgentResult
-            response = str(result)
+            response = str(result).strip()
         except Exception as e:
             print(f"❌ Error getting agent response: {e}\n")
             sys.exit(1)
         
-        # Add to conversation history
-        conversation_history.append(user_input)
-        conversation_history.append(response)
+        # Keep the history within budget before the next turn
+        context_tokens = estimate_tokens(agent.messages)
+        if context_tokens > CONTEXT_TOKEN_BUDGET and len(agent.messages) > PRESERVE_RECENT_MESSAGES:
+            try:
+                agent.conversation_manager.reduce_context(agent)
+                print(f"🗜️  Summarized earlier turns (~{context_tokens} → ~{estimate_tokens(agent.messages)} tokens)")
+            except Exception as e:
+                print(f"⚠️  Could not summarize history: {e}")
+        print(f"⏱️  Turn took {time.monotonic() - started:.1f}s, context ~{estimate_tokens(agent.messages)} tokens\n")
         
-        # Check if the agent is asking for more information
-        # Simple heuristic: if response contains a question mark or asks for information
-        response_lower = response.lower()
-        asking_for_info = (
-            "?" in response or
-            "need" in response_lower or
-            "provide" in response_lower or
-            "missing" in response_lower or
-            "information" in response_lower
-        )
-        
-        # Check if response looks like a complete letter
-        # Simple heuristic: contains "Dear" and is reasonably long
-        looks_complete = (
-            "Dear" in response and
-            len(response) > 200 and
-            ("Sincerely" in response or "gratitude" in response_lower or "With" in response or "Happy reading" in response)
-        )
-        
-        if looks_complete:
+        if "letter" in outcome:
             # Display the final letter cleanly
             print("\n" + "=" * 80)
             print("✅ THANK-YOU LETTER GENERATED")
             print("=" * 80)
-            print(f"\n{response}\n")
+            print(f"\nTo: {outcome['donor_name']} | {outcome['donation_amount']} on {outcome['donation_date']} | "
+                  f"{outcome['program_name']}, {outcome['organization_name']}")
+            print(f"\n{outcome['letter']}\n")
             print("=" * 80)
             print("\nThe letter is complete and ready to use!")
             print("=" * 80 + "\n")
             break
-        else:
-            # Show intermediate response
-            print(f"Agent: {response}\n")
         
+        # Not submitted yet: the agent is asking for information or checking something with the user
+        print(f"Agent: {response}\n")
+        print("─" * 80)
+        user_input = input("You (or 'exit'): ").strip()
         
-        if asking_for_info:
-            # Agent needs more information
-            print("─" * 80)
-            user_input = input("You: ").strip()
-            
-            if not user_input:
-                print("\n❌ No input provided. Exiting.\n")
-                break
-        else:
-            # Agent provided a response but it's not clear if it's done
-            print("─" * 80)
-            print("Would you like to:")
-            print("  1. Provide more information")
-            print("  2. Exit")
-            choice = input("\nChoice (1/2): ").strip()
-            
-            if choice == "1":
-                user_input = input("\nYou: ").strip()
-                if not user_input:
-                    print("\n❌ No input provided. Exiting.\n")
-                    break
-            else:
-                print("\n✅ Exiting agent loop.\n")
-                break
+        if not user_input or user_input.lower() in ("exit", "quit", "q"):
+            print("\n✅ Exiting agent loop.\n")
+            break
     
     if turn >= max_turns:
         print(f"\n⚠️  Reached maximum turns ({max_turns}). Exiting.\n")
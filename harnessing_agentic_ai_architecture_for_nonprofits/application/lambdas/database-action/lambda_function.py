@@ -2,17 +2,93 @@ import json
 import os
 import psycopg2
 import logging
-import boto3
-import uuid
-from decimal import Decimal
 import time
-from datetime import datetime
-from botocore.exceptions import ConnectTimeoutError, BotoCoreError, ClientError
+from result_stream import (
+    RESULT_MODE_ROWS,
+    RESULT_MODE_SUMMARY,
+    open_server_side_cursor,
+    stream_columnar,
+    stream_summary,
+)
+from query_correction import (
+    CORRECTION_DEADLINE_SECONDS,
+    ERROR_PERMANENT,
+    ERROR_TRANSIENT,
+    MAX_TRANSIENT_RETRIES,
+    Deadline,
+    QueryCorrector,
+    classify_error,
+    correction_stats,
+)
+from sql_guard import QueryRejectedError, apply_cost_gate, classify_statement
+from result_cache import result_cache
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Fetch PostgreSQL connection details from environment variables
+rds_host = os.environ.get('DB_HOST', 'agentic-architecture-stack-rdsclusterinstance-t2gcpgf8o4x4.coguq9fhaevt.us-east-1.rds.amazonaws.com')
+rds_db = os.environ.get('DB_NAME', 'donations')
+rds_port = os.environ.get('DB_PORT', '5432')
+rds_username = os.environ.get('DB_USER', 'postgres')
+rds_password = os.environ.get('DB_PASSWORD', 'donationsmaster')
+
+def execute_query(sql_query, result_mode):
+    """Run the SQL query on a fresh connection and return the serialized result body."""
+    info = classify_statement(sql_query)
+
+    # Repeated reads are served from the result cache without touching the database
+    cache_key = None
+    if info.is_read and result_cache is not None:
+        cache_key = result_cache.key(sql_query, result_mode, info.tables)
+        cached_body = result_cache.get(cache_key) if cache_key else None
+        if cached_body is not None:
+            return cached_body
+
+    # Establish the connection to the PostgreSQL RDS database
+    connection = psycopg2.connect(
+        host=rds_host,
+        port=rds_port,
+        database=rds_db,
+        user=rds_username,
+        password=rds_password
+    )
+    try:
+        if info.is_read:
+            # Reads run in a read-only transaction and must pass the planner cost gate
+            connection.set_session(readonly=True)
+            sql_query = apply_cost_gate(connection, sql_query, info)
+        # Reads go through a named server-side cursor so rows are streamed in batches
+        cursor = open_server_side_cursor(connection) if info.is_read else connection.cursor()
+        
+        logger.info("Executing SQL query: %s", sql_query)
+        # Execute the SQL query
+        cursor.execute(sql_query)
+        
+        # Commit the transaction if it's an INSERT, UPDATE, or DELETE statement
+        if info.is_write:
+            connection.commit()
+            if result_cache is not None:
+                result_cache.invalidate(info.tables)
+        
+        # Serialize results if it's a read statement
+        if info.is_read:
+            if result_mode == RESULT_MODE_SUMMARY:
+                result_body = stream_summary(cursor)
+            else:
+                result_body = stream_columnar(cursor)
+        else:
+            result_body = json.dumps({"message": "Query executed successfully"})
+        
+        logger.info("SQL result size: %d bytes", len(result_body))
+        cursor.close()
+        if cache_key:
+            result_cache.put(cache_key, result_body)
+        return result_body
+    finally:
+        connection.close()
+
 def lambda_handler(event, context):
     logger.info("Received event: %s", json.dumps(event))
     
@@ -53,138 +129,73 @@ def lambda_handler(event, context):
             "statusCode": 400,
             "body": json.dumps({"error": "No User question found in parameters"})
         }
-    
-    # Fetch PostgreSQL connection details from environment variables
-    rds_host = os.environ.get('DB_HOST', 'agentic-architecture-stack-rdsclusterinstance-t2gcpgf8o4x4.coguq9fhaevt.us-east-1.rds.amazonaws.com')
-    rds_db = os.environ.get('DB_NAME', 'donations')
-    rds_port = os.environ.get('DB_PORT', '5432')
-    rds_username = os.environ.get('DB_USER', 'postgres')
-    rds_password = os.environ.get('DB_PASSWORD', 'donationsmaster')
 
-    # Fetch Query Correction AgentID from environment variables
-    query_correction_agent_id = os.environ.get('QUERY_CORRECTION_AGENT_ID', 'ETR2JS9ZBI')
-
-    # Initialize Bedrock Agent Runtime client
-    # bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
-    bedrock_agent_runtime_client=boto3.client(
-            service_name="bedrock-agent-runtime", region_name='us-east-1'
-        )
-    logger.info("bedrock_agent_runtime_client: %s", bedrock_agent_runtime_client)
-
-    # Define maximum number of retries to prevent infinite loops
-    MAX_RETRIES = 10
-    retries = 0
+    # Optional result mode: raw rows (default) or per-column aggregates
+    result_mode = next((param['value'] for param in parameters if param['name'] == 'result_mode'), RESULT_MODE_ROWS)
+    if result_mode not in (RESULT_MODE_ROWS, RESULT_MODE_SUMMARY):
+        logger.info("Unknown result mode %s, defaulting to %s", result_mode, RESULT_MODE_ROWS)
+        result_mode = RESULT_MODE_ROWS
+    
+    deadline = Deadline(CORRECTION_DEADLINE_SECONDS, context)
+    corrector = QueryCorrector(user_question, deadline)
+    transient_retries = 0
 
-    while retries < MAX_RETRIES:
+    while True:
         try:
-            # Establish the connection to the PostgreSQL RDS database
-            connection = psycopg2.connect(
-                host=rds_host,
-                port=rds_port,
-                database=rds_db,
-                user=rds_username,
-                password=rds_password
-            )
-            cursor = connection.cursor()
-            
-            logger.info("Executing SQL query: %s", sql_query)
-            # Execute the SQL query
-            cursor.execute(sql_query)
-            
-            # Commit the transaction if it's an INSERT, UPDATE, or DELETE statement
-            if sql_query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
-                connection.commit()
-            
-            # Fetch results if it's a SELECT statement
-            if sql_query.strip().upper().startswith("SELECT"):
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
-                result = [dict(zip(columns, row)) for row in rows]
-            else:
-                result = {"message": "Query executed successfully"}
-            
-            logger.info("SQL result: %s", result)
-            
-            # Close the cursor and connection
-            cursor.close()
-            connection.close()
-            
+            result_body = execute_query(sql_query, result_mode)
             response_body = {
                 'TEXT': {
-                    'body': json.dumps(result, cls=DateTimeEncoder)
+                    'body': result_body
                 }
             }
-            
-            # If execution is successful, break out of the loop
+            corrector.record_outcome(succeeded=True)
             break
-        
-        except Exception as e:
-            logger.error("Error executing query: %s", e, exc_info=True)
-            
-            # Create the inputText JSON object
-            correctionInputText = {
-                "SQL Statement": sql_query,
-                "User question": user_question,
-                "Error Message": str(e)
+
+        except QueryRejectedError as e:
+            # Rejections are policy decisions, so they go back to the calling agent uncorrected
+            logger.warning("Query rejected: %s", e)
+            response_body = {
+                'TEXT': {
+                    'body': json.dumps({"error": str(e)})
+                }
             }
-            # formattedInputString = ', '.join([f"{key}={value}" for key, value in correctionInputText.items()])
-            logger.info("correctionInputText: %s", correctionInputText)
-            
-            try:
-                # Wait for 2 seconds
-                # time.sleep(2)
-                session_id = uuid.uuid4().hex
-                logger.info("Generated session_id: %s", session_id)
-                
-                # Define additional parameters for the agent invocation
-                enable_trace = True  # Set as needed
-                end_session = True    # Set as needed
+            break
+
+        except Exception as e:
+            error_kind = classify_error(e)
+            logger.error("Error executing query (%s): %s", error_kind, e, exc_info=True)
+
+            # Connection and availability errors are retried locally without asking the agent
+            if error_kind == ERROR_TRANSIENT and transient_retries < MAX_TRANSIENT_RETRIES and not deadline.expired():
+                transient_retries += 1
+                correction_stats.incr('transient_retries')
+                delay = min(2 ** (transient_retries - 1), deadline.remaining())
+                logger.info("Transient error, reconnecting in %.1f seconds (%d/%d)...",
+                            delay, transient_retries, MAX_TRANSIENT_RETRIES)
+                time.sleep(delay)
+                continue
 
-                # add query_correction_agent_id in the logger:
-                logger.info("Invoke the Bedrock Query correctoin Agent to get a corrected SQL query, agent id is : %s", query_correction_agent_id)
-                ###$
-                # Invoke the Bedrock Agent to get a corrected SQL query
-                agent_response = bedrock_agent_runtime_client.invoke_agent(
-                    sessionId=session_id,
-                    inputText=json.dumps(correctionInputText),
-                    # inputText=correctionInputText,
-                    agentId=query_correction_agent_id,
-                    agentAliasId='LRLCWPMGGF'
-                )
-                
-                logger.info("Agent response: %s", agent_response)
-                
-                completion = ""
-                for event in agent_response.get("completion"):
-                    chunk = event["chunk"]
-                    completion = completion + chunk["bytes"].decode()
-                ####
-                #completion = invoke_agent(bedrock_agent_runtime_client, {
-                #    'agentId': query_correction_agent_id,
-                #    'agentAliasId': 'LRLCWPMGGF',
-                #    'sessionId': session_id,
-                #    'inputText': json.dumps(correctionInputText)
-                #})
-                logger.info("Agent completion: %s", completion)
-                corrected_sql = completion
-                
-                if not corrected_sql:
-                    logger.error("Agent did not return a corrected SQL query.")
-                    response_body = {
-                        'TEXT': {
-                            'body': json.dumps({"error": "Agent failed to provide a corrected SQL query."})
-                        }
+            # Authentication and host errors are not caused by the SQL, so the agent cannot fix them
+            if error_kind == ERROR_PERMANENT:
+                response_body = {
+                    'TEXT': {
+                        'body': json.dumps({"error": "Unable to connect to the database.", "last_error": str(e)})
                     }
-                    break  # Exit the loop since we cannot proceed without a valid query
-                
-                logger.info("Agent provided corrected SQL query: %s", corrected_sql)
-                sql_query = corrected_sql #.rstrip(';')  # Update sql_query with corrected version
+                }
+                break
+
+            if not corrector.can_correct():
+                logger.error("Correction budget exhausted. Unable to execute SQL query successfully.")
                 response_body = {
                     'TEXT': {
-                        'body': json.dumps({"corrected_sql": corrected_sql})
+                        'body': json.dumps({"error": "Unable to execute SQL query successfully.", "last_error": str(e)})
                     }
                 }
-            
+                corrector.record_outcome(succeeded=False)
+                break
+
+            try:
+                corrected_sql = corrector.correct(sql_query, e)
             except Exception as agent_error:
                 logger.error("Error invoking Bedrock Agent: %s", agent_error, exc_info=True)
                 response_body = {
@@ -192,19 +203,22 @@ def lambda_handler(event, context):
                         'body': json.dumps({"error": f"Failed to invoke agent: {str(agent_error)}"})
                     }
                 }
-                break  # Exit the loop since agent invocation failed
-            
-            retries += 1
-            logger.info("Retrying SQL execution (%d/%d)...", retries, MAX_RETRIES)
-    
-    else:
-        # If maximum retries reached without success
-        logger.error("Maximum retries reached. Unable to execute SQL query successfully.")
-        response_body = {
-            'TEXT': {
-                'body': json.dumps({"error": "Maximum retries reached. Unable to execute SQL query successfully."})
-            }
-        }
+                corrector.record_outcome(succeeded=False)
+                break
+
+            if not corrected_sql:
+                logger.error("Agent did not return a corrected SQL query.")
+                response_body = {
+                    'TEXT': {
+                        'body': json.dumps({"error": "Agent failed to provide a corrected SQL query."})
+                    }
+                }
+                corrector.record_outcome(succeeded=False)
+                break
+
+            logger.info("Agent provided corrected SQL query: %s", corrected_sql)
+            sql_query = corrected_sql
+            transient_retries = 0
     
     # Construct the function response
     function_response = {
@@ -229,64 +243,3 @@ def lambda_handler(event, context):
     logger.info("Response: %s", action_response)
     
     return action_response
-
-async def invoke_agent_async(bedrock_agent_runtime_client, input_params):
-    try:
-        response = await bedrock_agent_runtime_client.invoke_agent(
-            agentId=input_params['agentId'],
-            agentAliasId=input_params['agentAliasId'],
-            sessionId=input_params['sessionId'],
-            inputText=input_params['inputText']
-        )
-        
-        completion = ""
-        # Properly consume the streaming response
-        async for chunk_event in response['completion']:
-            if 'chunk' in chunk_event:
-                chunk = chunk_event['chunk']
-                if 'bytes' in chunk:
-                    decoded = chunk['bytes'].decode('utf-8')
-                    completion += decoded
-
-        return completion
-        
-    except Exception as e:
-        print(f"Error invoking agent: {str(e)}")
-        raise
-
-def invoke_agent(bedrock_agent_runtime_client, input_params):
-    try:
-        response = bedrock_agent_runtime_client.invoke_agent(
-            agentId=input_params['agentId'],
-            agentAliasId=input_params['agentAliasId'],
-            sessionId=input_params['sessionId'],
-            inputText=input_params['inputText']
-        )
-        
-        completion = ""
-        for event in response.get("completion"):
-            chunk = event["chunk"]
-            completion = completion + chunk["bytes"].decode()
-
-        return completion
-        
-    except Exception as e:
-        logger.error(f"Error invoking agent: {str(e)}")
-        raise
-
-def handle_sql_results(query_results):
-    try:
-        # Serialize with the custom encoder
-        serialized_results = json.dumps(query_results, cls=DateTimeEncoder)
-        return json.loads(serialized_results)  # Convert back to dict if needed
-    except Exception as e:
-        print(f"Error serializing results: {str(e)}")
-        raise
-
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        if isinstance(obj, Decimal):
-            return str(obj)  # Convert Decimal to string to preserve precision
-        return super().default(obj)
\ No newline at end of file
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+import boto3
+import psycopg2
+from botocore.config import Config
+from botocore.exceptions import ReadTimeoutError
+
+logger = logging.getLogger()
+
+ERROR_TRANSIENT = 'transient'
+ERROR_SEMANTIC = 'semantic'
+ERROR_PERMANENT = 'permanent'
+
+MAX_TRANSIENT_RETRIES = int(os.environ.get('MAX_TRANSIENT_RETRIES', '3'))
+MAX_CORRECTION_ATTEMPTS = int(os.environ.get('MAX_CORRECTION_ATTEMPTS', '3'))
+# Overall time budget for executing and correcting a single query
+CORRECTION_DEADLINE_SECONDS = float(os.environ.get('CORRECTION_DEADLINE_SECONDS', '120'))
+CORRECTION_CACHE_SIZE = int(os.environ.get('CORRECTION_CACHE_SIZE', '256'))
+# Time kept in reserve to build the response before Lambda times out
+DEADLINE_SAFETY_MARGIN_SECONDS = 5
+# A correction is not started with less time than this left
+MIN_CORRECTION_SECONDS = 10
+
+QUERY_CORRECTION_AGENT_ID = os.environ.get('QUERY_CORRECTION_AGENT_ID', 'ETR2JS9ZBI')
+QUERY_CORRECTION_AGENT_ALIAS_ID = os.environ.get('QUERY_CORRECTION_AGENT_ALIAS_ID', 'LRLCWPMGGF')
+
+# SQLSTATE classes and codes that a reconnect or plain retry can fix. Most of class 53 is
+# resource exhaustion (out of memory, disk full) and 57014 is a cancelled or timed-out
+# statement: retrying those just re-runs the expensive query, so they are not transient.
+TRANSIENT_SQLSTATE_CLASSES = ('08', '57')
+TRANSIENT_SQLSTATES = ('40001', '40P01', '53300')
+NON_TRANSIENT_SQLSTATES = ('57014',)
+# Connection errors raised before the server answers carry no SQLSTATE. Only these messages
+# mean the connection was dropped or refused; authentication failures and unknown hosts are
+# permanent and would fail the same way on every retry.
+TRANSIENT_CONNECTION_MESSAGES = (
+    'connection refused',
+    'connection reset',
+    'connection timed out',
+    'timeout expired',
+    'server closed the connection unexpectedly',
+    'could not receive data from server',
+    'could not send data to server',
+    'connection already closed',
+    'ssl syscall error',
+    'the database system is starting up',
+    'the database system is shutting down',
+    'terminating connection',
+)
+
+# Agent clients by read timeout, created once per container and reused across invocations
+_agent_clients = {}
+
+
+def agent_client(read_timeout):
+    """
+    Bedrock agent runtime client whose blocking reads time out within read_timeout.
+
+    Timeouts are rounded down to 10 second steps (minimum 1) so only a few clients are created.
+    """
+    timeout = max(1, int(read_timeout) // 10 * 10)
+    if timeout not in _agent_clients:
+        _agent_clients[timeout] = boto3.client(
+            service_name="bedrock-agent-runtime",
+            region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+            config=Config(read_timeout=timeout, retries={'max_attempts': 1, 'mode': 'standard'})
+        )
+    return _agent_clients[timeout]
+
+
+def classify_error(error):
+    """
+    Return ERROR_TRANSIENT for errors a retry can fix, ERROR_PERMANENT for connection
+    errors that neither a retry nor a rewritten query can fix, ERROR_SEMANTIC otherwise.
+    """
+    pgcode = getattr(error, 'pgcode', None)
+    if pgcode:
+        if pgcode in NON_TRANSIENT_SQLSTATES:
+            return ERROR_SEMANTIC
+        if pgcode in TRANSIENT_SQLSTATES or pgcode[:2] in TRANSIENT_SQLSTATE_CLASSES:
+            return ERROR_TRANSIENT
+        return ERROR_SEMANTIC
+    if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+        message = str(error).lower()
+        if any(fragment in message for fragment in TRANSIENT_CONNECTION_MESSAGES):
+            return ERROR_TRANSIENT
+        return ERROR_PERMANENT
+    return ERROR_SEMANTIC
+
+
+class Deadline:
+    """Tracks the time left for one invocation."""
+
+    def __init__(self, seconds, context=None):
+        budget = seconds
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            remaining = context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_SAFETY_MARGIN_SECONDS
+            budget = min(budget, remaining)
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class CorrectionCache:
+    """Size-bounded LRU of corrected SQL keyed by the failing SQL and error."""
+
+    def __init__(self, max_size=CORRECTION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(sql_query, error):
+        # Only the first line of the message is stable; the rest points at positions
+        message = str(error).strip().splitlines()[0] if str(error).strip() else ''
+        raw = f"{sql_query.strip()}\n{getattr(error, 'pgcode', '') or ''}\n{message}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, corrected_sql):
+        self._entries[key] = corrected_sql
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+
+class CorrectionStats:
+    """Per-container counters for the correction loop."""
+
+    def __init__(self):
+        self.counters = {
+            'transient_retries': 0,
+            'agent_invocations': 0,
+            'cache_hits': 0,
+            'corrections_succeeded': 0,
+            'corrections_failed': 0,
+        }
+
+    def incr(self, name, amount=1):
+        self.counters[name] += amount
+
+    def success_rate(self):
+        total = self.counters['corrections_succeeded'] + self.counters['corrections_failed']
+        return self.counters['corrections_succeeded'] / total if total else None
+
+    def log(self):
+        logger.info("Query correction stats: %s", json.dumps(dict(self.counters, success_rate=self.success_rate())))
+
+
+correction_cache = CorrectionCache()
+correction_stats = CorrectionStats()
+
+
+class QueryCorrector:
+    """Asks the query correction agent for fixed SQL, reusing one agent session per invocation."""
+
+    def __init__(self, user_question, deadline):
+        self.user_question = user_question
+        self.deadline = deadline
+        self.session_id = uuid.uuid4().hex
+        self.attempts = 0
+        self._pending_keys = []
+
+    def can_correct(self):
+        return self.attempts < MAX_CORRECTION_ATTEMPTS and self.deadline.remaining() >= MIN_CORRECTION_SECONDS
+
+    def correct(self, sql_query, error):
+        """Return corrected SQL for the failing query, or None if none was produced."""
+        self.attempts += 1
+        key = correction_cache.key(sql_query, error)
+        self._pending_keys.append(key)
+
+        cached = correction_cache.get(key)
+        if cached:
+            logger.info("Using cached correction for failing query")
+            correction_stats.incr('cache_hits')
+            return cached
+
+        correction_input = {
+            "SQL Statement": sql_query,
+            "User question": self.user_question,
+            "Error Message": str(error)
+        }
+        logger.info("Invoking query correction agent %s (attempt %d/%d)",
+                    QUERY_CORRECTION_AGENT_ID, self.attempts, MAX_CORRECTION_ATTEMPTS)
+        correction_stats.incr('agent_invocations')
+        # No single read may wait past the deadline, and reading stops once it has passed
+        client = agent_client(self.deadline.remaining())
+        chunks = []
+        try:
+            agent_response = client.invoke_agent(
+                sessionId=self.session_id,
+                inputText=json.dumps(correction_input),
+                agentId=QUERY_CORRECTION_AGENT_ID,
+                agentAliasId=QUERY_CORRECTION_AGENT_ALIAS_ID
+            )
+            for event in agent_response.get("completion"):
+                if 'chunk' in event:
+                    chunks.append(event["chunk"]["bytes"].decode())
+                if self.deadline.expired():
+                    logger.warning("Correction deadline reached while reading agent response")
+                    return None
+        except ReadTimeoutError:
+            logger.warning("Query correction agent did not answer before the deadline")
+            return None
+        corrected_sql = ''.join(chunks).strip().rstrip(';')
+
+        if corrected_sql and corrected_sql != sql_query.strip():
+            correction_cache.put(key, corrected_sql)
+            return corrected_sql
+        return None
+
+    def record_outcome(self, succeeded):
+        """Record whether the corrections made in this invocation led to a working query."""
+        if not self.attempts:
+            return
+        if succeeded:
+            correction_stats.incr('corrections_succeeded')
+        else:
+            correction_stats.incr('corrections_failed')
+            # Do not keep serving corrections that never produced a working query
+            for key in self._pending_keys:
+                correction_cache.discard(key)
+        correction_stats.log()
@@ -0,0 +1,216 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from sql_guard import normalize_sql
+
+logger = logging.getLogger()
+
+# 'memory' keeps results per container; 'dynamodb' and 'redis' add a shared tier; 'none' disables caching
+RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'memory').lower()
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', '300'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '256'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+RESULT_CACHE_TABLE = os.environ.get('RESULT_CACHE_TABLE', '')
+RESULT_CACHE_REDIS_URL = os.environ.get('RESULT_CACHE_REDIS_URL', '')
+# When disabled, cached results are only dropped by TTL or LRU eviction
+RESULT_CACHE_INVALIDATE_ON_WRITE = os.environ.get('RESULT_CACHE_INVALIDATE_ON_WRITE', 'true').lower() == 'true'
+
+# Results of these functions change between calls, so such queries are never cached
+_VOLATILE_RE = re.compile(r'\b(now|random|clock_timestamp|current_date|current_time|current_timestamp|'
+                          r'localtime|localtimestamp|statement_timestamp|timeofday|gen_random_uuid)\b')
+
+
+class MemoryBackend:
+    """Per-container LRU of result bodies with TTL and entry/byte bounds."""
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._versions = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, body = entry
+        if expires_at < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def put(self, key, body, ttl):
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + ttl, body)
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def get_versions(self, tables):
+        return {table: self._versions.get(table, 0) for table in tables}
+
+    def bump_versions(self, tables):
+        for table in tables:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+
+class DynamoDBBackend:
+    """
+    Shared result tier in a DynamoDB table with a string partition key "cache_key"
+    and TTL enabled on "expires_at". Table versions live in the same table.
+    """
+
+    def __init__(self, table_name):
+        import boto3
+        self.table_name = table_name
+        self.client = boto3.client('dynamodb')
+
+    def get(self, key):
+        item = self.client.get_item(TableName=self.table_name, Key={'cache_key': {'S': key}}).get('Item')
+        if not item or int(item['expires_at']['N']) < time.time():
+            return None
+        return item['body']['S']
+
+    def put(self, key, body, ttl):
+        self.client.put_item(TableName=self.table_name, Item={
+            'cache_key': {'S': key},
+            'body': {'S': body},
+            'expires_at': {'N': str(int(time.time() + ttl))},
+        })
+
+    def get_versions(self, tables):
+        versions = {table: 0 for table in tables}
+        if not tables:
+            return versions
+        response = self.client.batch_get_item(RequestItems={self.table_name: {
+            'Keys': [{'cache_key': {'S': f"version#{table}"}} for table in tables],
+            'ConsistentRead': True,
+        }})
+        for item in response['Responses'].get(self.table_name, []):
+            versions[item['cache_key']['S'].split('#', 1)[1]] = int(item['version']['N'])
+        return versions
+
+    def bump_versions(self, tables):
+        for table in tables:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={'cache_key': {'S': f"version#{table}"}},
+                UpdateExpression='ADD version :one',
+                ExpressionAttributeValues={':one': {'N': '1'}},
+            )
+
+
+class RedisBackend:
+    """Shared result tier in Redis/ElastiCache (requires the redis package)."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        body = self.client.get(f"result#{key}")
+        return body.decode('utf-8') if body is not None else None
+
+    def put(self, key, body, ttl):
+        self.client.setex(f"result#{key}", ttl, body)
+
+    def get_versions(self, tables):
+        tables = sorted(tables)
+        values = self.client.mget([f"version#{table}" for table in tables]) if tables else []
+        return {table: int(value or 0) for table, value in zip(tables, values)}
+
+    def bump_versions(self, tables):
+        for table in tables:
+            self.client.incr(f"version#{table}")
+
+
+class ResultCache:
+    """
+    Caches serialized read results keyed by normalized SQL, result mode and the
+    versions of the tables the statement touches. Writes bump the versions of
+    their tables, so dependent entries are never served again and age out.
+    """
+
+    def __init__(self, memory, shared=None, ttl=RESULT_CACHE_TTL_SECONDS):
+        self.memory = memory
+        self.shared = shared
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _shared_call(self, method, *args):
+        """Call the shared tier, treating its failures as cache misses."""
+        try:
+            return getattr(self.shared, method)(*args)
+        except Exception as e:
+            logger.warning("Shared result cache %s failed: %s", method, e)
+            return None
+
+    def _versions(self, tables):
+        # The shared tier owns versions so writes from any container invalidate everywhere
+        if self.shared is not None:
+            versions = self._shared_call('get_versions', tables)
+            if versions is not None:
+                return versions
+        return self.memory.get_versions(tables)
+
+    def key(self, sql_query, result_mode, tables):
+        normalized = normalize_sql(sql_query)
+        if _VOLATILE_RE.search(normalized):
+            return None
+        versions = self._versions(sorted(tables))
+        raw = '\n'.join([result_mode, normalized] + [f"{table}={version}" for table, version in sorted(versions.items())])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        body = self.memory.get(key)
+        if body is None and self.shared is not None:
+            body = self._shared_call('get', key)
+            if body is not None:
+                self.memory.put(key, body, self.ttl)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        logger.info("Result cache %s (hits=%d, misses=%d)", 'hit' if body is not None else 'miss', self.hits, self.misses)
+        return body
+
+    def put(self, key, body):
+        self.memory.put(key, body, self.ttl)
+        if self.shared is not None:
+            self._shared_call('put', key, body, self.ttl)
+
+    def invalidate(self, tables):
+        if not tables or not RESULT_CACHE_INVALIDATE_ON_WRITE:
+            return
+        logger.info("Invalidating cached results for tables: %s", sorted(tables))
+        self.memory.bump_versions(tables)
+        if self.shared is not None:
+            self._shared_call('bump_versions', tables)
+
+
+def _build_result_cache():
+    if RESULT_CACHE_BACKEND == 'none':
+        return None
+    shared = None
+    if RESULT_CACHE_BACKEND == 'dynamodb' and RESULT_CACHE_TABLE:
+        shared = DynamoDBBackend(RESULT_CACHE_TABLE)
+    elif RESULT_CACHE_BACKEND == 'redis' and RESULT_CACHE_REDIS_URL:
+        shared = RedisBackend(RESULT_CACHE_REDIS_URL)
+    return ResultCache(MemoryBackend(), shared)
+
+
+result_cache = _build_result_cache()
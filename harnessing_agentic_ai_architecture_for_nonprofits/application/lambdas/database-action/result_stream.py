@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+logger = logging.getLogger()
+
+# Limits applied to the result returned to the agent. Bedrock agents reject
+# action group responses larger than 25KB, so the default byte cap stays below it.
+MAX_RESULT_ROWS = int(os.environ.get('MAX_RESULT_ROWS', '500'))
+MAX_RESULT_BYTES = int(os.environ.get('MAX_RESULT_BYTES', '20000'))
+FETCH_BATCH_SIZE = int(os.environ.get('FETCH_BATCH_SIZE', '100'))
+# Upper bound on the rows scanned when building a summary
+MAX_SUMMARY_ROWS = int(os.environ.get('MAX_SUMMARY_ROWS', '100000'))
+MAX_DISTINCT_VALUES = 50
+
+RESULT_MODE_ROWS = 'rows'
+RESULT_MODE_SUMMARY = 'summary'
+
+
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        if isinstance(obj, Decimal):
+            return str(obj)  # Convert Decimal to string to preserve precision
+        return super().default(obj)
+
+
+_encoder = DateTimeEncoder(separators=(',', ':'))
+
+
+def open_server_side_cursor(connection):
+    """Open a named cursor so rows stay on the server until they are fetched."""
+    return connection.cursor(name=f"agent_query_{uuid.uuid4().hex}")
+
+
+def iter_batches(cursor, batch_size=None):
+    """Yield lists of rows from the cursor using fetchmany."""
+    batch_size = batch_size or FETCH_BATCH_SIZE
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def _column_names(cursor):
+    return [desc[0] for desc in cursor.description] if cursor.description else []
+
+
+def stream_columnar(cursor, max_rows=None, max_bytes=None, batch_size=None):
+    """
+    Serialize a result set as compact columnar JSON without materializing it.
+
+    The output is {"columns": [...], "rows": [[...], ...], "row_count": n,
+    "truncated": bool} and adds "truncated_reason" when a limit was hit.
+    Returns the JSON string.
+    """
+    max_rows = MAX_RESULT_ROWS if max_rows is None else max_rows
+    max_bytes = MAX_RESULT_BYTES if max_bytes is None else max_bytes
+
+    batches = iter_batches(cursor, batch_size)
+    # Named cursors only populate description after the first fetch
+    first_batch = next(batches, [])
+    columns = _column_names(cursor)
+
+    head = '{"columns":' + _encoder.encode(columns) + ',"rows":['
+    # Reserve room for the closing fields so the final document stays under max_bytes
+    reserved = len(head) + len('],"row_count":,"truncated":true,"truncated_reason":"byte_limit"}') + 20
+    parts = [head]
+    size = reserved
+    row_count = 0
+    truncated_reason = None
+
+    def _batches():
+        if first_batch:
+            yield first_batch
+        yield from batches
+
+    for batch in _batches():
+        for row in batch:
+            if row_count >= max_rows:
+                truncated_reason = 'row_limit'
+                break
+            encoded = _encoder.encode(list(row))
+            added = len(encoded.encode('utf-8')) + (1 if row_count else 0)
+            if size + added > max_bytes:
+                truncated_reason = 'byte_limit'
+                break
+            if row_count:
+                parts.append(',')
+            parts.append(encoded)
+            size += added
+            row_count += 1
+        if truncated_reason:
+            break
+
+    parts.append('],"row_count":' + str(row_count))
+    parts.append(',"truncated":' + ('true' if truncated_reason else 'false'))
+    if truncated_reason:
+        parts.append(',"truncated_reason":"' + truncated_reason + '"')
+        logger.info("Result truncated after %d rows (%s)", row_count, truncated_reason)
+    parts.append('}')
+    return ''.join(parts)
+
+
+class _ColumnSummary:
+    """Running aggregates for a single result column."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = None
+        self.distinct = set()
+        self.distinct_overflow = False
+
+    def add(self, value):
+        self.count += 1
+        if value is None:
+            self.nulls += 1
+            return
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            self.total = value if self.total is None else self.total + value
+        try:
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+        except TypeError:
+            pass
+        if not self.distinct_overflow:
+            if isinstance(value, (dict, list)):
+                # json/jsonb and array columns: count distinct by a stable encoding
+                value = json.dumps(value, sort_keys=True, default=str)
+            self.distinct.add(value)
+            if len(self.distinct) > MAX_DISTINCT_VALUES:
+                self.distinct_overflow = True
+                self.distinct = set()
+
+    def to_dict(self):
+        summary = {
+            'column': self.name,
+            'count': self.count,
+            'nulls': self.nulls,
+            'min': self.minimum,
+            'max': self.maximum,
+        }
+        if self.total is not None:
+            non_null = self.count - self.nulls
+            summary['sum'] = self.total
+            summary['avg'] = (self.total / non_null) if non_null else None
+        if self.distinct_overflow:
+            summary['distinct'] = f">{MAX_DISTINCT_VALUES}"
+        else:
+            summary['distinct'] = len(self.distinct)
+        return summary
+
+
+def stream_summary(cursor, max_rows=None, batch_size=None):
+    """
+    Aggregate a result set per column instead of returning raw rows.
+
+    Returns the JSON string {"columns": [...], "row_count": n,
+    "truncated": bool, "summary": [{column aggregates}, ...]}.
+    """
+    max_rows = MAX_SUMMARY_ROWS if max_rows is None else max_rows
+    summaries = None
+    row_count = 0
+    truncated = False
+
+    for batch in iter_batches(cursor, batch_size):
+        if summaries is None:
+            summaries = [_ColumnSummary(name) for name in _column_names(cursor)]
+        for row in batch:
+            if row_count >= max_rows:
+                truncated = True
+                break
+            for column, value in zip(summaries, row):
+                column.add(value)
+            row_count += 1
+        if truncated:
+            break
+
+    if summaries is None:
+        summaries = [_ColumnSummary(name) for name in _column_names(cursor)]
+
+    return _encoder.encode({
+        'columns': [column.name for column in summaries],
+        'row_count': row_count,
+        'truncated': truncated,
+        'summary': [column.to_dict() for column in summaries],
+    })
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import re
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # sqlglot is optional; fall back to a keyword classifier
+    sqlglot = None
+
+logger = logging.getLogger()
+
+STATEMENT_READ = 'read'
+STATEMENT_WRITE = 'write'
+STATEMENT_OTHER = 'other'
+
+# Planner estimates above these limits are rejected or limited before execution
+MAX_QUERY_COST = float(os.environ.get('MAX_QUERY_COST', '1000000'))
+MAX_PLAN_ROWS = int(os.environ.get('MAX_PLAN_ROWS', '10000'))
+ALLOW_WRITE_STATEMENTS = os.environ.get('ALLOW_WRITE_STATEMENTS', 'true').lower() == 'true'
+ALLOW_OTHER_STATEMENTS = os.environ.get('ALLOW_OTHER_STATEMENTS', 'false').lower() == 'true'
+
+_READ_KEYWORDS = ('SELECT', 'WITH', 'VALUES', 'TABLE')
+_WRITE_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'MERGE')
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+# String literals and double-quoted identifiers, whose case is significant
+_QUOTED_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+("?[\w.]+"?)', re.IGNORECASE)
+
+
+class QueryRejectedError(Exception):
+    """Raised when a statement is not allowed to run; it is reported back to the agent as-is."""
+
+
+class StatementInfo:
+    """Result of classifying a single SQL statement."""
+
+    def __init__(self, kind, statement_type, tables, has_limit):
+        self.kind = kind
+        self.statement_type = statement_type
+        self.tables = tables
+        self.has_limit = has_limit
+
+    @property
+    def is_read(self):
+        return self.kind == STATEMENT_READ
+
+    @property
+    def is_write(self):
+        return self.kind == STATEMENT_WRITE
+
+    def __repr__(self):
+        return (f"StatementInfo(kind={self.kind!r}, statement_type={self.statement_type!r}, "
+                f"tables={sorted(self.tables)!r}, has_limit={self.has_limit!r})")
+
+
+def _classify_with_sqlglot(sql_query):
+    try:
+        statements = [s for s in sqlglot.parse(sql_query, read='postgres') if s is not None]
+    except sqlglot.errors.SqlglotError as e:
+        # Tokenizer and parser errors alike (e.g. an unterminated string): let the database
+        # report the syntax error so the correction agent sees it
+        logger.info("sqlglot could not parse statement, using keyword classifier: %s", e)
+        return None
+    if len(statements) != 1:
+        raise QueryRejectedError("Exactly one SQL statement is allowed per request.")
+
+    statement = statements[0]
+    cte_names = {cte.alias_or_name for cte in statement.find_all(exp.CTE)}
+    tables = {table.name.lower() for table in statement.find_all(exp.Table)
+              if table.name and table.name not in cte_names}
+    writes = (exp.Insert, exp.Update, exp.Delete, exp.Merge)
+
+    if isinstance(statement, exp.Query):
+        # Postgres allows data-modifying statements inside WITH clauses
+        kind = STATEMENT_WRITE if statement.find(*writes) else STATEMENT_READ
+        has_limit = statement.args.get('limit') is not None
+    elif isinstance(statement, writes):
+        kind = STATEMENT_WRITE
+        has_limit = False
+    else:
+        kind = STATEMENT_OTHER
+        has_limit = False
+    return StatementInfo(kind, statement.key.upper(), tables, has_limit)
+
+
+def _classify_with_keywords(sql_query):
+    stripped = _STRING_RE.sub("''", _COMMENT_RE.sub(' ', sql_query))
+    if ';' in stripped.strip().rstrip(';'):
+        raise QueryRejectedError("Exactly one SQL statement is allowed per request.")
+    words = stripped.lstrip(' \t\n(').split(None, 1)
+    first = words[0].upper() if words else ''
+    upper = stripped.upper()
+    tables = {name.strip('"').lower() for name in _TABLE_RE.findall(stripped)}
+
+    if first in _READ_KEYWORDS:
+        has_write = any(re.search(rf'\b{keyword}\b', upper) for keyword in _WRITE_KEYWORDS)
+        kind = STATEMENT_WRITE if first == 'WITH' and has_write else STATEMENT_READ
+    elif first in _WRITE_KEYWORDS:
+        kind = STATEMENT_WRITE
+    else:
+        kind = STATEMENT_OTHER
+    has_limit = re.search(r'\bLIMIT\s+\d+\s*$', upper.strip()) is not None
+    return StatementInfo(kind, first, tables, has_limit)
+
+
+def normalize_sql(sql_query):
+    """
+    Canonical form of a statement for cache keys: no comments, collapsed whitespace,
+    lowercased outside string literals and double-quoted identifiers.
+    """
+    without_comments = _COMMENT_RE.sub(' ', sql_query)
+    parts = []
+    position = 0
+    for literal in _QUOTED_RE.finditer(without_comments):
+        parts.append(' '.join(without_comments[position:literal.start()].lower().split()))
+        parts.append(literal.group(0))
+        position = literal.end()
+    parts.append(' '.join(without_comments[position:].lower().split()))
+    return ' '.join(part for part in parts if part).rstrip(' ;')
+
+
+def classify_statement(sql_query):
+    """Classify a statement as read, write or other and collect the tables it touches."""
+    info = _classify_with_sqlglot(sql_query) if sqlglot is not None else None
+    if info is None:
+        info = _classify_with_keywords(sql_query)
+    logger.info("Classified statement: %s", info)
+
+    if info.is_write and not ALLOW_WRITE_STATEMENTS:
+        raise QueryRejectedError("Only read-only queries are allowed.")
+    if info.kind == STATEMENT_OTHER and not ALLOW_OTHER_STATEMENTS:
+        raise QueryRejectedError(f"{info.statement_type or 'This'} statements are not allowed.")
+    return info
+
+
+def explain_estimate(connection, sql_query):
+    """Return the planner's (total cost, estimated rows) for a statement."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql_query}")
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+    return root.get('Total Cost', 0.0), root.get('Plan Rows', 0)
+
+
+def apply_cost_gate(connection, sql_query, info):
+    """
+    Check a read statement's estimated cost before running it.
+
+    Raises QueryRejectedError when the estimated cost exceeds MAX_QUERY_COST and
+    wraps unbounded queries estimated to return more than MAX_PLAN_ROWS rows in a
+    LIMIT. Returns the SQL to execute.
+    """
+    cost, rows = explain_estimate(connection, sql_query)
+    logger.info("Planner estimate: cost=%s rows=%s", cost, rows)
+
+    if cost > MAX_QUERY_COST:
+        raise QueryRejectedError(
+            f"Query rejected: estimated cost {cost:.0f} exceeds the limit of {MAX_QUERY_COST:.0f}. "
+            "Add filters or aggregate the data in SQL."
+        )
+    if rows > MAX_PLAN_ROWS and not info.has_limit:
+        logger.info("Estimated %s rows, limiting query to %d rows", rows, MAX_PLAN_ROWS)
+        return f"SELECT * FROM ({sql_query}) AS limited_query LIMIT {MAX_PLAN_ROWS}"
+    return sql_query
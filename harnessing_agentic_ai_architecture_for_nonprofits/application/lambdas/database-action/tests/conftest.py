@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Lambda modules are imported from the function folder, as in the deployed zip
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import pytest
+
+import sql_guard
+from sql_guard import QueryRejectedError, classify_statement, normalize_sql
+
+
+@pytest.fixture(params=['sqlglot', 'keywords'])
+def classifier(request, monkeypatch):
+    """Run each test with sqlglot and with the keyword fallback used when it is not installed."""
+    if request.param == 'sqlglot':
+        pytest.importorskip('sqlglot')
+    else:
+        monkeypatch.setattr(sql_guard, 'sqlglot', None)
+    return request.param
+
+
+def test_read_statement(classifier):
+    info = classify_statement('SELECT d.name FROM donors d JOIN donations x ON x.donor_id = d.id LIMIT 5')
+
+    assert info.is_read
+    assert info.tables == {'donors', 'donations'}
+    assert info.has_limit
+
+
+def test_write_statement(classifier):
+    info = classify_statement("UPDATE donors SET name = 'A' WHERE id = 1")
+
+    assert info.is_write
+    assert info.tables == {'donors'}
+
+
+def test_multiple_statements_are_rejected(classifier):
+    with pytest.raises(QueryRejectedError):
+        classify_statement('SELECT 1; DROP TABLE donors')
+
+
+def test_other_statements_are_rejected(classifier):
+    with pytest.raises(QueryRejectedError):
+        classify_statement('DROP TABLE donors')
+
+
+def test_unterminated_string_falls_back_to_keywords():
+    pytest.importorskip('sqlglot')
+    # sqlglot raises a TokenError here, which is not a ParseError
+    info = classify_statement("SELECT * FROM donors WHERE name = 'abc")
+
+    assert info.is_read
+    assert info.tables == {'donors'}
+
+
+def test_unparseable_statement_falls_back_to_keywords():
+    pytest.importorskip('sqlglot')
+    info = classify_statement('SELECT FROM WHERE donors')
+
+    assert info.is_read
+
+
+def test_normalize_keeps_case_of_literals_and_quoted_identifiers():
+    assert normalize_sql('SELECT  *\nFROM "Donors" -- note\nWHERE Name = \'Ann\';') == \
+        'select * from "Donors" where name = \'Ann\''
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from botocore.exceptions import ClientError
+
+from agent_invoker import action_response, invoke_agent, sub_agent_session_id
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Sub-agents the orchestrator can fan out to, by the name used in the request list
+SUB_AGENTS = {
+    'kb': (os.environ.get('KB_AGENT_ID', 'KB_AGENTID'), os.environ.get('KB_AGENT_ALIAS_ID', 'TSTALIASID')),
+    'db': (os.environ.get('DB_AGENT_ID', 'QUERY_GENERATION_AGENT_ID'), os.environ.get('DB_AGENT_ALIAS_ID', 'TSTALIASID')),
+    'api': (os.environ.get('API_AGENT_ID', 'REST_API_AGENT_ID'), os.environ.get('API_AGENT_ALIAS_ID', 'TSTALIASID')),
+}
+MAX_FANOUT_REQUESTS = int(os.environ.get('MAX_FANOUT_REQUESTS', '5'))
+# Sub-agent calls running at once; the rest wait for a worker and are cancelled if the deadline passes first
+MAX_CONCURRENT_SUB_AGENTS = int(os.environ.get('MAX_CONCURRENT_SUB_AGENTS', '3'))
+# Seconds each sub-agent call may take before its result is reported as timed out
+SUB_AGENT_DEADLINE_SECONDS = float(os.environ.get('SUB_AGENT_DEADLINE_SECONDS', '150'))
+DEADLINE_SAFETY_MARGIN_SECONDS = 5
+
+
+def parse_requests(parameters):
+    """
+    Read the "requests" parameter: a JSON array of {"agent": "kb"|"db"|"api", "input_text": "..."}.
+
+    Returns (requests, errors) where errors describes entries that were skipped.
+    """
+    raw = next((param['value'] for param in parameters if param['name'] == 'requests'), None)
+    if not raw:
+        return [], ['Missing requests parameter']
+    try:
+        entries = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError as e:
+        return [], [f'requests is not valid JSON: {e}']
+    if not isinstance(entries, list):
+        return [], ['requests must be a JSON array']
+
+    requests, errors = [], []
+    for index, entry in enumerate(entries):
+        agent = str(entry.get('agent', '')).lower() if isinstance(entry, dict) else ''
+        input_text = entry.get('input_text') if isinstance(entry, dict) else None
+        if agent not in SUB_AGENTS or not input_text:
+            errors.append(f"Request {index} needs an agent ({', '.join(SUB_AGENTS)}) and input_text")
+            continue
+        requests.append({'agent': agent, 'input_text': input_text})
+    if len(requests) > MAX_FANOUT_REQUESTS:
+        errors.append(f"Only the first {MAX_FANOUT_REQUESTS} of {len(requests)} requests were run")
+        requests = requests[:MAX_FANOUT_REQUESTS]
+    return requests, errors
+
+
+def call_sub_agent(request, session_id):
+    agent_id, agent_alias_id = SUB_AGENTS[request['agent']]
+    completion, metrics = invoke_agent(agent_id, agent_alias_id, session_id, request['input_text'])
+    metrics.emit()
+    return completion, round(metrics.total_ms)
+
+
+def lambda_handler(event, context):
+    missing = [key for key in ('agent', 'actionGroup', 'function') if key not in event]
+    if missing:
+        logger.error("Missing key in event: %s", missing[0])
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": f"Missing key in event: '{missing[0]}'"})
+        }
+
+    started = time.monotonic()
+    requests, errors = parse_requests(event.get('parameters', []))
+    if not requests:
+        return action_response(event, json.dumps({'results': [], 'errors': errors}))
+
+    # One pool per invocation, so calls left over from an earlier invocation never hold its workers
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(requests), MAX_CONCURRENT_SUB_AGENTS)))
+    # Two requests to the same sub-agent must not share a session concurrently
+    futures = []
+    seen = {}
+    try:
+        for request in requests:
+            agent_id = SUB_AGENTS[request['agent']][0]
+            session_id = sub_agent_session_id(event, agent_id)
+            seen[agent_id] = seen.get(agent_id, 0) + 1
+            if seen[agent_id] > 1:
+                session_id = f"{session_id}-{seen[agent_id]}"
+            futures.append(executor.submit(call_sub_agent, request, session_id))
+
+        timeout = SUB_AGENT_DEADLINE_SECONDS
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            timeout = min(timeout, context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_SAFETY_MARGIN_SECONDS)
+        wait(futures, timeout=max(0.0, timeout))
+    finally:
+        # Calls that never started are cancelled; running ones cannot be interrupted and are abandoned
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for request, future in zip(requests, futures):
+        result = {'agent': request['agent'], 'input_text': request['input_text']}
+        if future.cancelled():
+            result.update(status='cancelled', error='The agent was not called before the deadline')
+        elif not future.done():
+            result.update(status='timeout', error='The agent did not answer before the deadline')
+        elif isinstance(future.exception(), ClientError):
+            logger.error(f"ClientError when invoking {request['agent']} agent: {future.exception()}")
+            result.update(status='error', error='Failed to invoke Bedrock Agent')
+        elif future.exception() is not None:
+            logger.error(f"Unexpected error from {request['agent']} agent: {future.exception()}")
+            result.update(status='error', error='An unexpected error occurred')
+        else:
+            completion, latency_ms = future.result()
+            result.update(status='success', completion=completion, latency_ms=latency_ms)
+        results.append(result)
+
+    elapsed_ms = round((time.monotonic() - started) * 1000)
+    logger.info("Fan-out of %d requests finished in %d ms (%d succeeded)", len(results), elapsed_ms,
+                sum(1 for result in results if result['status'] == 'success'))
+    return action_response(event, json.dumps({'results': results, 'errors': errors, 'elapsed_ms': elapsed_ms}))
@@ -0,0 +1,165 @@
+"""
+Shared Bedrock sub-agent invocation for the orchestrator-action Lambdas.
+
+package_lambda.sh copies this module into each orchestrator-action zip, so
+the three functions stay thin wrappers configured by AGENT_ID/AGENT_ALIAS_ID.
+"""
+import codecs
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import uuid
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger()
+
+# Keep sub-agent context across calls from the same orchestrator session
+SESSION_AFFINITY = os.environ.get('SUB_AGENT_SESSION_AFFINITY', 'true').lower() == 'true'
+# Token usage is only reported in trace events, which add some payload to the stream
+COLLECT_TOKEN_METRICS = os.environ.get('SUB_AGENT_TOKEN_METRICS', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('SUB_AGENT_METRICS_NAMESPACE', 'NonprofitAgents/SubAgents')
+CONNECT_TIMEOUT = float(os.environ.get('SUB_AGENT_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('SUB_AGENT_READ_TIMEOUT', '170'))
+MAX_POOL_CONNECTIONS = int(os.environ.get('SUB_AGENT_MAX_POOL_CONNECTIONS', '10'))
+
+# One client per container: its connection pool is reused by warm invocations
+bedrock_agent_runtime_client = boto3.client(
+    'bedrock-agent-runtime',
+    region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+    config=Config(
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retries={'max_attempts': 3, 'mode': 'adaptive'},
+    ),
+)
+
+
+def sub_agent_session_id(event, agent_id):
+    """
+    Session ID for the sub-agent call.
+
+    With affinity on, every call from one orchestrator session to the same
+    sub-agent shares a session, so the sub-agent keeps its conversation
+    context. Otherwise each call gets a fresh session.
+    """
+    orchestrator_session = event.get('sessionId')
+    if not SESSION_AFFINITY or not orchestrator_session:
+        return uuid.uuid4().hex
+    return hashlib.sha256(f"{orchestrator_session}:{agent_id}".encode('utf-8')).hexdigest()[:64]
+
+
+class InvocationMetrics:
+    """Latency and token counts for one sub-agent call."""
+
+    def __init__(self, agent_id):
+        self.agent_id = agent_id
+        self.started = time.monotonic()
+        self.first_chunk_ms = None
+        self.total_ms = None
+        self.chunks = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_chunk(self):
+        if self.first_chunk_ms is None:
+            self.first_chunk_ms = (time.monotonic() - self.started) * 1000
+        self.chunks += 1
+
+    def on_trace(self, trace):
+        # Each model call inside the agent reports its own usage
+        for step in trace.get('trace', {}).values():
+            if not isinstance(step, dict):
+                continue
+            usage = step.get('modelInvocationOutput', {}).get('metadata', {}).get('usage')
+            if usage:
+                self.input_tokens += usage.get('inputTokens', 0)
+                self.output_tokens += usage.get('outputTokens', 0)
+
+    def finish(self):
+        self.total_ms = (time.monotonic() - self.started) * 1000
+
+    def emit(self):
+        """Log the metrics in CloudWatch embedded metric format."""
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['AgentId']],
+                    'Metrics': [
+                        {'Name': 'SubAgentLatency', 'Unit': 'Milliseconds'},
+                        {'Name': 'SubAgentTimeToFirstChunk', 'Unit': 'Milliseconds'},
+                        {'Name': 'SubAgentInputTokens', 'Unit': 'Count'},
+                        {'Name': 'SubAgentOutputTokens', 'Unit': 'Count'},
+                    ],
+                }],
+            },
+            'AgentId': self.agent_id,
+            'SubAgentLatency': round(self.total_ms or 0, 1),
+            'SubAgentTimeToFirstChunk': round(self.first_chunk_ms or 0, 1),
+            'SubAgentInputTokens': self.input_tokens,
+            'SubAgentOutputTokens': self.output_tokens,
+            'Chunks': self.chunks,
+        }))
+
+
+def invoke_agent(agent_id, agent_alias_id, session_id, input_text):
+    """
+    Invoke a Bedrock agent and return (completion, metrics).
+
+    Chunks are decoded incrementally into a buffer, so multi-byte characters
+    split across chunks are handled and assembly stays linear in chunk count.
+    """
+    metrics = InvocationMetrics(agent_id)
+    agent_response = bedrock_agent_runtime_client.invoke_agent(
+        sessionId=session_id,
+        inputText=input_text,
+        agentId=agent_id,
+        agentAliasId=agent_alias_id,
+        enableTrace=COLLECT_TOKEN_METRICS,
+    )
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    completion = io.StringIO()
+    for stream_event in agent_response['completion']:
+        if 'chunk' in stream_event:
+            metrics.on_chunk()
+            completion.write(decoder.decode(stream_event['chunk'].get('bytes', b'')))
+        elif 'trace' in stream_event:
+            metrics.on_trace(stream_event['trace'])
+    completion.write(decoder.decode(b'', final=True))
+    metrics.finish()
+
+    logger.info(
+        "Agent %s session %s completed in %.0f ms (first chunk %.0f ms, %d chunks, %d input / %d output tokens)",
+        agent_id, session_id, metrics.total_ms, metrics.first_chunk_ms or 0, metrics.chunks,
+        metrics.input_tokens, metrics.output_tokens
+    )
+    return completion.getvalue(), metrics
+
+
+def action_response(event, body):
+    """Wrap a text body in the function-style action group response."""
+    return {
+        'messageVersion': '1.0',
+        'response': {
+            'actionGroup': event.get('actionGroup'),
+            'function': event.get('function'),
+            'functionResponse': {
+                'responseBody': {
+                    'TEXT': {
+                        'body': body
+                    }
+                }
+            }
+        },
+        'sessionAttributes': event.get('sessionAttributes', {}),
+        'promptSessionAttributes': event.get('promptSessionAttributes', {})
+    }
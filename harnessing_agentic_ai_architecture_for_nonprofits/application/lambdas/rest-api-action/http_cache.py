@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import http_pool
+
+logger = logging.getLogger()
+
+# 'memory' only, or add a second tier in 'tmp' (per container, survives handler reloads) or 'dynamodb' (shared)
+HTTP_CACHE_TIER = os.environ.get('HTTP_CACHE_TIER', 'tmp').lower()
+HTTP_CACHE_MAX_ENTRIES = int(os.environ.get('HTTP_CACHE_MAX_ENTRIES', '512'))
+HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', '/tmp/propublica-cache')
+HTTP_CACHE_TABLE = os.environ.get('HTTP_CACHE_TABLE', '')
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class CacheEntry:
+    """A cached 200 response with its validators and freshness lifetime."""
+
+    def __init__(self, body, etag=None, last_modified=None, expires_at=0.0):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        return self.expires_at > time.time()
+
+    def to_dict(self):
+        return {
+            'body': base64.b64encode(self.body).decode('ascii'),
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'expires_at': self.expires_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(base64.b64decode(data['body']), data.get('etag'), data.get('last_modified'), data['expires_at'])
+
+
+class MemoryTier:
+    def __init__(self, max_entries=HTTP_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class TmpTier:
+    """One JSON file per entry under /tmp, kept for the life of the execution environment."""
+
+    def __init__(self, directory=HTTP_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r') as cache_file:
+                return CacheEntry.from_dict(json.load(cache_file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, entry):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(entry.to_dict(), cache_file)
+        os.replace(tmp_path, path)
+
+
+class DynamoDBTier:
+    """Shared tier in a DynamoDB table keyed by the string attribute "cache_key"."""
+
+    def __init__(self, table_name):
+        import boto3
+        self.table_name = table_name
+        self.client = boto3.client('dynamodb')
+
+    def get(self, key):
+        item = self.client.get_item(TableName=self.table_name, Key={'cache_key': {'S': key}}).get('Item')
+        return CacheEntry.from_dict(json.loads(item['entry']['S'])) if item else None
+
+    def put(self, key, entry):
+        self.client.put_item(TableName=self.table_name, Item={
+            'cache_key': {'S': key},
+            'entry': {'S': json.dumps(entry.to_dict())},
+            # Keep stale entries around for revalidation for a day past expiry
+            'ttl': {'N': str(int(entry.expires_at) + 86400)},
+        })
+
+
+def _freshness_lifetime(response, default_ttl):
+    """Seconds a response may be served without revalidation, or None if it must not be stored."""
+    cache_control = (response.getheader('Cache-Control') or '').lower()
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    return default_ttl
+
+
+class HttpCache:
+    """Two-tier HTTP cache that honors Cache-Control and revalidates with ETag/Last-Modified."""
+
+    def __init__(self, memory, second_tier=None):
+        self.memory = memory
+        self.second_tier = second_tier
+
+    def _lookup(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.second_tier is not None:
+            try:
+                entry = self.second_tier.get(key)
+            except Exception as e:
+                logger.warning("HTTP cache tier read failed: %s", e)
+                entry = None
+            if entry is not None:
+                self.memory.put(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self.memory.put(key, entry)
+        if self.second_tier is not None:
+            try:
+                self.second_tier.put(key, entry)
+            except Exception as e:
+                logger.warning("HTTP cache tier write failed: %s", e)
+
+    def get(self, url, cache_key, default_ttl):
+        """Return (status, body) for a GET, served from cache when fresh."""
+        entry = self._lookup(cache_key)
+        if entry is not None and entry.is_fresh():
+            logger.info("HTTP cache hit for %s", cache_key)
+            return 200, entry.body
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        with http_pool.request(url, headers) as response:
+            status = response.getcode()
+            body = response.read()
+            if status == 304 and entry is not None:
+                logger.info("HTTP cache revalidated %s", cache_key)
+                lifetime = _freshness_lifetime(response, default_ttl)
+                entry.expires_at = time.time() + (lifetime or 0)
+                self._store(cache_key, entry)
+                return 200, entry.body
+            if status == 200:
+                lifetime = _freshness_lifetime(response, default_ttl)
+                if lifetime is not None:
+                    self._store(cache_key, CacheEntry(
+                        body,
+                        etag=response.getheader('ETag'),
+                        last_modified=response.getheader('Last-Modified'),
+                        expires_at=time.time() + lifetime,
+                    ))
+            logger.info("HTTP cache miss for %s (status %s)", cache_key, status)
+            return status, body
+
+
+def _build_http_cache():
+    second_tier = None
+    try:
+        if HTTP_CACHE_TIER == 'tmp':
+            second_tier = TmpTier()
+        elif HTTP_CACHE_TIER == 'dynamodb' and HTTP_CACHE_TABLE:
+            second_tier = DynamoDBTier(HTTP_CACHE_TABLE)
+    except Exception as e:
+        logger.warning("HTTP cache tier %s unavailable, using memory only: %s", HTTP_CACHE_TIER, e)
+    return HttpCache(MemoryTier(), second_tier)
+
+
+http_cache = _build_http_cache()
@@ -0,0 +1,148 @@
+import http.client
+import logging
+import os
+import queue
+import socket
+import ssl
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger()
+
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '10'))
+# Idle keep-alive connections kept per host
+MAX_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '8'))
+USER_AGENT = 'Mozilla/5.0'
+
+# Errors raised when the server closed an idle keep-alive connection
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                            BrokenPipeError, ConnectionResetError)
+
+_ssl_context = ssl.create_default_context()
+
+
+class PooledResponse:
+    """
+    A response whose connection goes back to the pool once the body is read.
+
+    Mimics the urllib response interface used by the handler (getcode/read/getheader).
+    """
+
+    def __init__(self, pool, conn, response):
+        self._pool = pool
+        self._conn = conn
+        self.response = response
+        self.status = response.status
+        self.data = None
+
+    def getcode(self):
+        return self.status
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def read(self, amt=None):
+        if amt is not None:
+            chunk = self.response.read(amt)
+            if not chunk:
+                self.close()
+            return chunk
+        if self.data is None:
+            self.data = self.response.read()
+            self.close()
+        return self.data
+
+    def close(self):
+        if self._conn is None:
+            return
+        # Only a fully consumed response leaves the connection reusable
+        reusable = self.response.isclosed() and not self.response.will_close
+        self._pool.release(self._conn, reusable)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class HostPool:
+    """Keep-alive connections to a single scheme://host."""
+
+    def __init__(self, scheme, netloc):
+        self.scheme = scheme
+        self.netloc = netloc
+        self._idle = queue.LifoQueue(maxsize=MAX_POOL_SIZE)
+
+    def _new_connection(self):
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.netloc, timeout=CONNECT_TIMEOUT, context=_ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.netloc, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+        # The connect timeout bounds the handshake; reads get their own timeout
+        conn.sock.settimeout(READ_TIMEOUT)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def release(self, conn, reusable):
+        if reusable:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+    def request(self, method, path, headers):
+        conn, reused = self.acquire()
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+        except _STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # The idle connection was closed by the server; retry once on a fresh one
+            logger.info("Reconnecting to %s after stale keep-alive connection", self.netloc)
+            conn = self._new_connection()
+            try:
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+            except Exception:
+                conn.close()
+                raise
+        except (socket.timeout, OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        return PooledResponse(self, conn, response)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_for(scheme, netloc):
+    with _pools_lock:
+        pool = _pools.get((scheme, netloc))
+        if pool is None:
+            pool = _pools[(scheme, netloc)] = HostPool(scheme, netloc)
+        return pool
+
+
+def request(url, headers=None, method='GET'):
+    """Send a request over a pooled keep-alive connection and return a PooledResponse."""
+    parsed_url = urlparse(url)
+    path = parsed_url.path or '/'
+    if parsed_url.query:
+        path += '?' + parsed_url.query
+    request_headers = {'User-Agent': USER_AGENT, 'Connection': 'keep-alive'}
+    request_headers.update(headers or {})
+    return _pool_for(parsed_url.scheme, parsed_url.netloc).request(method, path, request_headers)
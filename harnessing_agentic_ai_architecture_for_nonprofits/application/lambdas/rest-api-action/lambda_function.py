@@ -2,54 +2,55 @@ import json
 import urllib.parse
 import logging
 import os
-import http.client
-import ssl
+import re
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
+import http_pool
+from http_cache import http_cache
+from search_results import parse_search_results
+from local_mirror import nonprofit_mirror
+
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Freshness used when ProPublica sends no Cache-Control; organization records change rarely
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '3600'))
+ORGANIZATION_CACHE_TTL = int(os.environ.get('ORGANIZATION_CACHE_TTL', '86400'))
+# Batch lookups stay within the connection pool size so every worker reuses a keep-alive connection
+BATCH_MAX_WORKERS = min(int(os.environ.get('BATCH_MAX_WORKERS', '8')), http_pool.MAX_POOL_SIZE)
+BATCH_MAX_EINS = int(os.environ.get('BATCH_MAX_EINS', '25'))
+
 class SafeResponse:
     """Wrapper class to mimic urllib response interface"""
-    def __init__(self, response):
-        self.response = response
-        self.data = None
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
         
     def getcode(self):
-        return self.response.status
+        return self.status
         
     def read(self):
-        if self.data is None:
-            self.data = self.response.read()
         return self.data
         
     def __enter__(self):
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if hasattr(self.response, 'close'):
-            self.response.close()
+        pass
 
-def _make_http_request(url):
+def _make_http_request(url, cache_key=None, ttl=0):
     """
-    Make an HTTP request using http.client with scheme validation.
+    Make an HTTP GET over a pooled keep-alive connection, through the HTTP cache when a key is given.
     Internal function not exposed directly.
     """
-    parsed_url = urlparse(url)
-    if parsed_url.scheme == 'https':
-        conn = http.client.HTTPSConnection(parsed_url.netloc)
-    else:
-        conn = http.client.HTTPConnection(parsed_url.netloc)
-    
-    path = parsed_url.path
-    if parsed_url.query:
-        path += '?' + parsed_url.query
-        
-    conn.request('GET', path, headers={'User-Agent': 'Mozilla/5.0'})
-    return conn.getresponse()
+    if cache_key:
+        return http_cache.get(url, cache_key, ttl)
+    with http_pool.request(url) as response:
+        return response.getcode(), response.read()
 
-def safe_url_open(url):
+def safe_url_open(url, cache_key=None, ttl=0):
     """
     Safely open a URL with strict scheme validation.
     Only allows http and https schemes.
@@ -58,8 +59,8 @@ def safe_url_open(url):
     if parsed_url.scheme not in ['http', 'https']:
         raise ValueError(f"Unsupported URL scheme: {parsed_url.scheme}")
     
-    response = _make_http_request(url)
-    return SafeResponse(response)
+    status, data = _make_http_request(url, cache_key, ttl)
+    return SafeResponse(status, data)
 
 def extract_search_term(input_text):
     # Look for text between single or double quotes
@@ -73,6 +74,65 @@ def extract_search_term(input_text):
     
     return None
 
+def parse_eins(value):
+    """Split a comma/space separated EIN list, normalizing to digits and dropping duplicates in order."""
+    eins = []
+    for raw in re.split(r'[\s,]+', value or ''):
+        ein = raw.replace('-', '').strip()
+        if ein and ein not in eins:
+            eins.append(ein)
+    return eins
+
+def fetch_organization(ein):
+    """Look up one EIN and return a per-item result with either the organization or an error."""
+    ein = ein.replace('-', '').strip()
+    if not ein.isdigit():
+        return {"ein": ein, "status": "error", "error": "EIN must contain only digits"}
+    if nonprofit_mirror is not None:
+        try:
+            organization = nonprofit_mirror.get_organization(ein)
+            if organization:
+                return {"ein": ein, "status": "success", "organization": organization, "source": "local_mirror"}
+        except Exception as e:
+            logger.warning(f"Mirror lookup failed for EIN {ein}: {str(e)}")
+    url = f"https://projects.propublica.org/nonprofits/api/v2/organizations/{ein}.json"
+    try:
+        with safe_url_open(url, cache_key=f"org:{ein}", ttl=ORGANIZATION_CACHE_TTL) as response:
+            status_code = response.getcode()
+            if status_code == 200:
+                organization = json.loads(response.read().decode()).get("organization", {})
+                return {"ein": ein, "status": "success", "organization": organization}
+            if status_code == 404:
+                return {"ein": ein, "status": "not_found", "error": f"Organization with EIN {ein} not found"}
+            return {"ein": ein, "status": "error", "error": f"API returned status code {status_code}"}
+    except Exception as e:
+        logger.error(f"Lookup failed for EIN {ein}: {str(e)}")
+        return {"ein": ein, "status": "error", "error": str(e)}
+
+def search_organizations(url, query, page):
+    """Search the local mirror first and fall back to the live API on a miss; returns (status, organizations, page_info)."""
+    if nonprofit_mirror is not None and query != "*":
+        try:
+            local_result = nonprofit_mirror.search(query, page)
+            if local_result:
+                logger.info(f"Served search for {query} from the local mirror")
+                return (200,) + local_result
+        except Exception as e:
+            logger.warning(f"Mirror search failed for {query}: {str(e)}")
+    with safe_url_open(url, cache_key=f"search:{query.lower()}:{page}", ttl=SEARCH_CACHE_TTL) as response:
+        status_code = response.getcode()
+        if status_code != 200:
+            return status_code, [], {}
+        organizations, page_info = parse_search_results(response.read())
+        return status_code, organizations, page_info
+
+def fetch_organizations(eins):
+    """Fetch several EINs concurrently over the shared connection pool, preserving input order."""
+    if not eins:
+        return []
+    with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(eins))) as executor:
+        return list(executor.map(fetch_organization, eins))
+
 def lambda_handler(event, context):
     logger.info(f"Received event: {json.dumps(event)}")
     
@@ -94,67 +154,77 @@ def lambda_handler(event, context):
 
     if api_path == "/search" and http_method == "GET":
         try:
-            # Use the search term in the API URL, fallback to * if no term found
+            # Prefer the q parameter, then a quoted term in the input text, fallback to * if no term found
+            parameters = event.get("parameters", [])
+            q_param = next((param.get("value") for param in parameters if param.get("name") == "q"), None)
+            if q_param:
+                search_term = q_param
             query = search_term if search_term else "*"
+            page = next((param.get("value") for param in parameters if param.get("name") == "page"), None)
+            page = int(page) if page is not None and str(page).isdigit() else 0
             # URL encode the query parameter
             encoded_query = urllib.parse.quote(query)
             url = f"https://projects.propublica.org/nonprofits/api/v2/search.json?q={encoded_query}"
+            if page:
+                url += f"&page={page}"
             logger.info(f"Making API request to {url}")
             status_code = 200
             
-            # Use the safe URL opener function
-            with safe_url_open(url) as response:
-                status_code = response.getcode()
-                logger.info(f"API response status code: {status_code}")
+            status_code, organizations, page_info = search_organizations(url, query, page)
+            logger.info(f"Search status code: {status_code}")
+            
+            if status_code == 200:
+                num_pages = page_info.get("num_pages", 1)
                 
-                if status_code == 200:
-                    nonprofits_data = json.loads(response.read().decode())
-                    logger.info(f"API response data: {json.dumps(nonprofits_data)}")
-                    
-                    response_body = {
-                        "status": "success",
-                        "nonprofits": nonprofits_data.get("nonprofits", {}),
-                        "message": f"Retrieved {len(nonprofits_data['organizations'])} {search_term if search_term else ''} nonprofits."
-                    }
-                    
-                    action_response = {
-                        'actionGroup': action_group,
-                        'apiPath': api_path,
-                        'httpMethod': http_method,
-                        'httpStatusCode': 200,
-                        'responseBody': response_body
-                    }
-                elif status_code == 404 or status_code == 500:
-                    status_code = 200
-                    response_body = {
-                        "status": "not_found",
-                        "message": "The requested resource was not found by the nonprofit REST API."
-                    }
+                response_body = {
+                    "status": "success",
+                    "organizations": organizations,
+                    "total_results": page_info.get("total_results", len(organizations)),
+                    "page": page,
+                    "has_more": page + 1 < num_pages,
+                    "message": f"Retrieved {len(organizations)} {search_term if search_term else ''} nonprofits."
+                }
+                if response_body["has_more"]:
+                    response_body["message"] += f" Request page {page + 1} for more results."
+                
+                action_response = {
+                    'actionGroup': action_group,
+                    'apiPath': api_path,
+                    'httpMethod': http_method,
+                    'httpStatusCode': 200,
+                    'responseBody': response_body
+                }
+            elif status_code == 404 or status_code == 500:
+                status_code = 200
+                response_body = {
+                    "status": "not_found",
+                    "message": "The requested resource was not found by the nonprofit REST API."
+                }
 
-                    logger.error(f"API error: {json.dumps(response_body)}")
+                logger.error(f"API error: {json.dumps(response_body)}")
 
-                    action_response = {
-                        'actionGroup': action_group,
-                        'apiPath': api_path,
-                        'httpMethod': http_method,
-                        'httpStatusCode': status_code,
-                        'responseBody': response_body
-                    }
-                else:
-                    response_body = {
-                        "status": "error",
-                        "message": f"Failed to fetch nonprofits. Status code: {status_code}"
-                    }
-                    
-                    logger.error(f"API error: {json.dumps(response_body)}")
-                    
-                    action_response = {
-                        'actionGroup': action_group,
-                        'apiPath': api_path,
-                        'httpMethod': http_method,
-                        'httpStatusCode': status_code,
-                        'responseBody': response_body
-                    }
+                action_response = {
+                    'actionGroup': action_group,
+                    'apiPath': api_path,
+                    'httpMethod': http_method,
+                    'httpStatusCode': status_code,
+                    'responseBody': response_body
+                }
+            else:
+                response_body = {
+                    "status": "error",
+                    "message": f"Failed to fetch nonprofits. Status code: {status_code}"
+                }
+                
+                logger.error(f"API error: {json.dumps(response_body)}")
+                
+                action_response = {
+                    'actionGroup': action_group,
+                    'apiPath': api_path,
+                    'httpMethod': http_method,
+                    'httpStatusCode': status_code,
+                    'responseBody': response_body
+                }
 
         except Exception as e:
             #status_code = response.getcode()
@@ -206,48 +276,28 @@ def lambda_handler(event, context):
                 ein = "None"
                 #raise ValueError("EIN parameter is missing")
 
-            url = f"https://projects.propublica.org/nonprofits/api/v2/organizations/{ein}.json"
-            logger.info(f"Making API request to {url}")
+            result = fetch_organization(ein)
+            if result["status"] == "success":
+                response_body = {
+                    "status": "success",
+                    "nonprofits": result["organization"],
+                    "message": f"Retrieved nonprofit data for EIN: {ein}"
+                }
+            elif result["status"] == "not_found":
+                response_body = {
+                    "status": "not_found",
+                    "message": result["error"]
+                }
+            else:
+                raise Exception(result["error"])
             
-            try:
-                # Use the safe URL opener function
-                with safe_url_open(url) as response:
-                    status_code = response.getcode()
-                    logger.info(f"API response status code: {status_code}")
-                    
-                    if status_code == 200:
-                        nonprofits_data = json.loads(response.read().decode())
-                        logger.info(f"API response data: {json.dumps(nonprofits_data)}")
-                        
-                        response_body = {
-                            "status": "success",
-                            "nonprofits": nonprofits_data.get("organization", {}),
-                            "message": f"Retrieved nonprofit data for EIN: {ein}"
-                        }
-                        
-                        action_response = {
-                            'actionGroup': action_group,
-                            'apiPath': api_path,
-                            'httpMethod': http_method,
-                            'httpStatusCode': 200,
-                            'responseBody': response_body
-                        }
-            except Exception as e:
-                if hasattr(e, 'code') and e.code == 404:
-                    response_body = {
-                        "status": "not_found",
-                        "message": f"Organization with EIN {ein} not found"
-                    }
-                    
-                    action_response = {
-                        'actionGroup': action_group,
-                        'apiPath': api_path,
-                        'httpMethod': http_method,
-                        'httpStatusCode': 200,
-                        'responseBody': response_body
-                    }
-                else:
-                    raise  # Re-raise other HTTP errors
+            action_response = {
+                'actionGroup': action_group,
+                'apiPath': api_path,
+                'httpMethod': http_method,
+                'httpStatusCode': 200,
+                'responseBody': response_body
+            }
 
         except Exception as e:
             response_body = {
@@ -265,6 +315,35 @@ def lambda_handler(event, context):
                 'httpStatusCode': 500,
                 'responseBody': response_body
             }
+    elif api_path == "/organizations" and http_method == "GET":
+        parameters = event.get("parameters", [])
+        eins_value = next((param.get("value") for param in parameters if param.get("name") == "eins"), "")
+        eins = parse_eins(eins_value)
+
+        if not eins or len(eins) > BATCH_MAX_EINS:
+            response_body = {
+                "status": "error",
+                "message": f"Provide between 1 and {BATCH_MAX_EINS} comma-separated EINs in the eins parameter."
+            }
+            status_code = 400
+        else:
+            results = fetch_organizations(eins)
+            found = sum(1 for result in results if result["status"] == "success")
+            response_body = {
+                "status": "success" if found == len(results) else ("partial" if found else "error"),
+                "results": results,
+                "message": f"Retrieved {found} of {len(results)} nonprofits."
+            }
+            status_code = 200
+            logger.info(f"Batch lookup retrieved {found} of {len(results)} EINs")
+
+        action_response = {
+            'actionGroup': action_group,
+            'apiPath': api_path,
+            'httpMethod': http_method,
+            'httpStatusCode': status_code,
+            'responseBody': response_body
+        }
     else:
         response_body = {
             "status": "error",
@@ -288,5 +367,7 @@ def lambda_handler(event, context):
         'promptSessionAttributes': prompt_session_attributes
     }
 
-    logger.info(f"Final API response: {json.dumps(api_response)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Final API response: {json.dumps(api_response)}")
+    logger.info(f"Returning {api_path} response with status {action_response.get('httpStatusCode')}")
     return api_response
\ No newline at end of file
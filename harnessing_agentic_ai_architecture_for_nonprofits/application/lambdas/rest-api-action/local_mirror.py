@@ -0,0 +1,118 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from search_results import SEARCH_FIELDS, SEARCH_PAGE_SIZE
+
+logger = logging.getLogger()
+
+# S3 location of the SQLite index built by integration/build_nonprofit_mirror.py.
+# The mirror is disabled when NONPROFIT_MIRROR_BUCKET is not set.
+NONPROFIT_MIRROR_BUCKET = os.environ.get('NONPROFIT_MIRROR_BUCKET', '')
+NONPROFIT_MIRROR_KEY = os.environ.get('NONPROFIT_MIRROR_KEY', 'nonprofit-mirror/organizations.sqlite')
+NONPROFIT_MIRROR_DIR = os.environ.get('NONPROFIT_MIRROR_DIR', '/tmp')
+
+ORGANIZATION_COLUMNS = ('ein', 'name', 'city', 'state', 'ntee_code', 'subsection_code',
+                        'income_amount', 'revenue_amount', 'assets_amount')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class NonprofitMirror:
+    """Read-only SQLite/FTS5 mirror of IRS exempt organization data, downloaded to /tmp on first use."""
+
+    def __init__(self, bucket, key, directory):
+        self.bucket = bucket
+        self.key = key
+        self.directory = directory
+        self._path = None
+        self._load_lock = threading.Lock()
+        self._local = threading.local()
+        self._failed = False
+
+    def _ensure_downloaded(self):
+        if self._path or self._failed:
+            return self._path
+        with self._load_lock:
+            if self._path or self._failed:
+                return self._path
+            try:
+                import boto3
+                s3_client = boto3.client('s3')
+                etag = s3_client.head_object(Bucket=self.bucket, Key=self.key)['ETag'].strip('"')
+                path = os.path.join(self.directory, f"nonprofit-mirror-{etag}.sqlite")
+                if not os.path.exists(path):
+                    logger.info(f"Downloading nonprofit mirror s3://{self.bucket}/{self.key}")
+                    s3_client.download_file(self.bucket, self.key, path + '.part')
+                    os.replace(path + '.part', path)
+                self._path = path
+            except Exception as e:
+                # Without the mirror every lookup goes to the live API
+                logger.warning(f"Nonprofit mirror unavailable: {str(e)}")
+                self._failed = True
+        return self._path
+
+    def _connection(self):
+        path = self._ensure_downloaded()
+        if not path:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row, columns=ORGANIZATION_COLUMNS):
+        return {column: row[column] for column in columns if row[column] is not None}
+
+    def get_organization(self, ein):
+        """Return the organization for an EIN, or None when the mirror has no record."""
+        conn = self._connection()
+        if conn is None:
+            return None
+        row = conn.execute(
+            f"SELECT {', '.join(ORGANIZATION_COLUMNS)} FROM organizations WHERE ein = ?", (ein.zfill(9),)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def search(self, query, page, per_page=SEARCH_PAGE_SIZE):
+        """
+        Full-text search on name and city.
+
+        Returns (organizations, page_info) shaped like parse_search_results,
+        with the same page size and fields as the live API, or None when the
+        mirror is unavailable or has no matches.
+        """
+        words = _WORD_RE.findall(query or '')
+        conn = self._connection() if words else None
+        if conn is None:
+            return None
+        # Every word must match as a prefix, e.g. "red cross" -> "red"* "cross"*
+        match = ' '.join('"' + word.replace('"', '') + '"*' for word in words)
+        total = conn.execute(
+            "SELECT count(*) FROM organizations_fts WHERE organizations_fts MATCH ?", (match,)
+        ).fetchone()[0]
+        if not total:
+            return None
+        rows = conn.execute(
+            f"""SELECT {', '.join('o.' + column for column in SEARCH_FIELDS)}
+                FROM organizations_fts JOIN organizations o ON o.rowid = organizations_fts.rowid
+                WHERE organizations_fts MATCH ?
+                ORDER BY bm25(organizations_fts), o.revenue_amount DESC
+                LIMIT ? OFFSET ?""",
+            (match, per_page, page * per_page)
+        ).fetchall()
+        num_pages = (total + per_page - 1) // per_page
+        return [self._to_dict(row, SEARCH_FIELDS) for row in rows], {
+            'total_results': total,
+            'num_pages': num_pages,
+            'cur_page': page,
+            'per_page': per_page,
+        }
+
+
+nonprofit_mirror = NonprofitMirror(NONPROFIT_MIRROR_BUCKET, NONPROFIT_MIRROR_KEY, NONPROFIT_MIRROR_DIR) \
+    if NONPROFIT_MIRROR_BUCKET else None
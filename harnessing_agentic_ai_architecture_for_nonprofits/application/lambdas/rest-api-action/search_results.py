@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+from decimal import Decimal
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; fall back to json.loads and trim afterwards
+    ijson = None
+
+logger = logging.getLogger()
+
+# Only these organization fields are passed on to the agent
+SEARCH_FIELDS = ('ein', 'name', 'city', 'state', 'ntee_code', 'income_amount', 'revenue_amount')
+# ProPublica returns a fixed number of organizations per search page
+SEARCH_PAGE_SIZE = 25
+_PAGE_FIELDS = ('total_results', 'num_pages', 'cur_page', 'per_page')
+
+
+def _trim(organization):
+    return {field: organization[field] for field in SEARCH_FIELDS if organization.get(field) is not None}
+
+
+def _parse_incremental(body):
+    organizations = []
+    page_info = {}
+    # Walk parser events so only SEARCH_FIELDS are ever built, not the full API records
+    parser = ijson.parse(io.BytesIO(body))
+    for prefix, event, value in parser:
+        if prefix in _PAGE_FIELDS and event == 'number':
+            page_info[prefix] = int(value)
+        elif prefix == 'organizations.item' and event == 'start_map':
+            organization = {}
+            for item_prefix, item_event, item_value in parser:
+                if item_prefix == 'organizations.item' and item_event == 'end_map':
+                    break
+                field = item_prefix[len('organizations.item.'):]
+                if field in SEARCH_FIELDS and item_event in ('string', 'number', 'boolean'):
+                    # ijson yields Decimal for non-integral numbers
+                    organization[field] = float(item_value) if isinstance(item_value, Decimal) else item_value
+            organizations.append(organization)
+    return organizations, page_info
+
+
+def _parse_full(body):
+    data = json.loads(body)
+    page_info = {field: data[field] for field in _PAGE_FIELDS if isinstance(data.get(field), int)}
+    return [_trim(organization) for organization in data.get('organizations') or []], page_info
+
+
+def parse_search_results(body):
+    """
+    Extract the agent-facing fields from a ProPublica search response.
+
+    The body is already fully read (responses are cached as bytes), so this
+    only trims each record to SEARCH_FIELDS; every record on the page is kept.
+    Returns (organizations, page_info) where page_info carries the paging
+    fields reported by the API.
+    """
+    if ijson is not None:
+        organizations, page_info = _parse_incremental(body)
+    else:
+        organizations, page_info = _parse_full(body)
+    logger.info("Parsed %d organizations from %d byte search response", len(organizations), len(body))
+    return organizations, page_info
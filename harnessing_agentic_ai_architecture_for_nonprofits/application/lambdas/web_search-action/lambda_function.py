@@ -1,225 +1,398 @@
 import logging
 import json
 import zipfile
-from datetime import datetime, timedelta
+import hashlib
 import os
+import shutil
 import boto3
 import sys
 import time
-import tempfile
+import queue
+import threading
+from concurrent.futures import Future, wait
+from urllib.parse import urlparse
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def is_cache_valid(cache_path, max_age_hours=1):
-    """Check if cached dependencies are still valid"""
-    if not os.path.exists(cache_path):
+# S3 location of the zipped nova_act dependencies
+LAYER_BUCKET = os.environ.get('NOVA_ACT_LAYER_BUCKET', 'nova-act-vb')
+LAYER_KEY = os.environ.get('NOVA_ACT_LAYER_KEY', 'nova_act_layer.zip')
+# Extracted layers live under /tmp/nova_act_layer/<etag> and survive across warm invocations
+LAYER_CACHE_ROOT = '/tmp/nova_act_layer'
+COMPLETE_MARKER = '.complete'
+
+STARTING_PAGE = os.environ.get('NOVA_ACT_STARTING_PAGE', 'https://www.zoocasa.com/')
+MAX_START_ATTEMPTS = 3
+PAGE_READY_TIMEOUT = 15  # Seconds to wait for the starting page to load
+
+MAX_PARALLEL_SESSIONS = int(os.environ.get('MAX_PARALLEL_SESSIONS', '3'))
+MAX_QUERIES = int(os.environ.get('MAX_QUERIES', '5'))
+MAX_RESULTS_PER_QUERY = int(os.environ.get('MAX_RESULTS_PER_QUERY', '5'))
+# Overall time budget for one invocation, further capped by the Lambda's remaining time
+SEARCH_DEADLINE_SECONDS = float(os.environ.get('SEARCH_DEADLINE_SECONDS', '120'))
+DEADLINE_SAFETY_MARGIN_SECONDS = 5
+
+# Schema passed to NovaAct.act so search results come back as structured data
+RESULTS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "url": {"type": "string"},
+            "snippet": {"type": "string"}
+        },
+        "required": ["title"]
+    }
+}
+
+# Imported module and browser workers, kept for the life of the container
+_nova_act = None
+_workers = []
+_task_queue = queue.Queue()
+_workers_lock = threading.Lock()
+
+
+def _file_digests(path):
+    """Return (md5, sha256) hex digests of a file, read in 1MB chunks."""
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+class SearchCancelled(Exception):
+    """Raised inside a search once its invocation's deadline has passed."""
+
+
+def is_cache_valid(layer_dir):
+    """A layer directory is only used once its extraction finished and was verified"""
+    return os.path.exists(os.path.join(layer_dir, COMPLETE_MARKER))
+
+
+def ensure_layer(s3_client):
+    """
+    Download and extract the dependency zip into a directory named after its S3 ETag.
+
+    The archive is verified against the ETag (the MD5 of single-part uploads) before
+    extraction, and a marker with its SHA-256 is written when extraction completes.
+    Returns the site-packages path.
+    """
+    head = s3_client.head_object(Bucket=LAYER_BUCKET, Key=LAYER_KEY)
+    etag = head['ETag'].strip('"')
+    layer_dir = os.path.join(LAYER_CACHE_ROOT, etag)
+    site_packages = os.path.join(layer_dir, 'python', 'lib', 'python3.13', 'site-packages')
+
+    if is_cache_valid(layer_dir):
+        logger.info(f"Using cached dependencies in {layer_dir}")
+        return site_packages
+
+    os.makedirs(LAYER_CACHE_ROOT, exist_ok=True)
+    # Drop layers for older versions of the zip to keep /tmp usage bounded
+    for entry in os.listdir(LAYER_CACHE_ROOT):
+        if entry != etag:
+            shutil.rmtree(os.path.join(LAYER_CACHE_ROOT, entry), ignore_errors=True)
+
+    zip_path = os.path.join(LAYER_CACHE_ROOT, f"{etag}.zip")
+    staging_dir = f"{layer_dir}.staging"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    logger.info(f"Downloading s3://{LAYER_BUCKET}/{LAYER_KEY}")
+    s3_client.download_file(LAYER_BUCKET, LAYER_KEY, zip_path)
+    md5, sha256 = _file_digests(zip_path)
+    # Multipart ETags are not a plain MD5, so only single-part uploads can be checked this way
+    if '-' not in etag and md5 != etag:
+        os.remove(zip_path)
+        raise ValueError(f"Checksum mismatch for {LAYER_KEY}: expected {etag}, got {md5}")
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(staging_dir)
+    os.remove(zip_path)
+    with open(os.path.join(staging_dir, COMPLETE_MARKER), 'w') as marker:
+        marker.write(sha256)
+    os.replace(staging_dir, layer_dir)
+    logger.info(f"Extracted dependencies to {layer_dir} (sha256 {sha256})")
+    return site_packages
+
+
+def load_nova_act():
+    """Import nova_act once per container, fetching its dependencies if needed."""
+    global _nova_act
+    if _nova_act is not None:
+        return _nova_act
+
+    site_packages = ensure_layer(boto3.client('s3'))
+    if site_packages not in sys.path:
+        sys.path.insert(0, site_packages)
+
+    import nova_act
+    logger.info(f"Imported nova_act {getattr(nova_act, '__version__', 'unknown')}")
+    _nova_act = nova_act
+    return _nova_act
+
+
+def _page_ready(nova):
+    """Health check: the browser answers and the current page has loaded."""
+    try:
+        return nova.page.evaluate("() => document.readyState") in ('interactive', 'complete')
+    except Exception as e:
+        logger.info(f"Health check failed: {str(e)}")
         return False
-    
-    cache_time = datetime.fromtimestamp(os.path.getmtime(cache_path))
-    age = datetime.now() - cache_time
-    
-    return age < timedelta(hours=max_age_hours)
 
 
+def _wait_until_ready(nova, timeout=PAGE_READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while time.monotonic() < deadline:
+        if _page_ready(nova):
+            return True
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return False
+
+
+def _stop_quietly(nova):
+    try:
+        nova.stop()
+    except Exception as stop_error:
+        logger.info(f"Stop attempt result: {str(stop_error)}")
+
+
+def start_nova_session(nova_act, starting_page):
+    """Start a NovaAct session and wait until its starting page has loaded."""
+    last_error = None
+    for attempt in range(MAX_START_ATTEMPTS):
+        nova = nova_act.NovaAct(starting_page)
+        try:
+            logger.info(f"Starting client (attempt {attempt + 1}/{MAX_START_ATTEMPTS})...")
+            nova.start()
+            if _wait_until_ready(nova):
+                logger.info("Client successfully started")
+                return nova
+            last_error = Exception("Starting page did not finish loading")
+        except Exception as start_error:
+            last_error = start_error
+        logger.warning(f"Attempt {attempt + 1} failed: {str(last_error)}")
+        _stop_quietly(nova)
+        time.sleep(min(2 ** attempt, 5))
+
+    raise Exception(f"Failed to start client after {MAX_START_ATTEMPTS} attempts: {str(last_error)}")
+
+
+def reset_session(nova, starting_page):
+    """Return a warm session to the starting page before new work."""
+    try:
+        nova.go_to_url(starting_page)
+    except AttributeError:
+        nova.page.goto(starting_page)
+    _wait_until_ready(nova)
+
+
+class BrowserWorker(threading.Thread):
+    """
+    Owns one NovaAct browser session for the life of the container.
+
+    The browser is driven through Playwright's sync API, which is bound to the
+    thread that started it, so every task for this session runs on this thread.
+    """
+
+    def __init__(self, nova_act, index):
+        super().__init__(name=f"browser-worker-{index}", daemon=True)
+        self.nova_act = nova_act
+        self.nova = None
+
+    def session(self, starting_page):
+        if self.nova is not None and _page_ready(self.nova):
+            reset_session(self.nova, starting_page)
+            return self.nova
+        if self.nova is not None:
+            logger.info(f"{self.name}: warm session is unhealthy, restarting")
+            _stop_quietly(self.nova)
+        self.nova = start_nova_session(self.nova_act, starting_page)
+        return self.nova
+
+    def run(self):
+        while True:
+            future, task, args = _task_queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(task(self, *args))
+            except SearchCancelled as e:
+                # Cancelled between steps, so the session is still usable after a reset
+                logger.info(f"{self.name}: {str(e)}")
+                future.set_exception(e)
+            except Exception as e:
+                # A session that failed mid-task is not trusted for the next one
+                if self.nova is not None:
+                    _stop_quietly(self.nova)
+                    self.nova = None
+                future.set_exception(e)
+
+
+def ensure_workers(nova_act, wanted):
+    """Grow the browser worker pool to serve `wanted` queries in parallel, up to MAX_PARALLEL_SESSIONS."""
+    with _workers_lock:
+        while len(_workers) < min(wanted, MAX_PARALLEL_SESSIONS):
+            worker = BrowserWorker(nova_act, len(_workers))
+            worker.start()
+            _workers.append(worker)
+
+
+def submit(task, *args):
+    """Queue a task for the next free browser worker."""
+    future = Future()
+    _task_queue.put((future, task, args))
+    return future
+
+
+def run_search(worker, query, starting_page, max_results, expires_at):
+    """
+    Run one search in the worker's session and return its results with per-step timings.
+
+    Each step checks the invocation's deadline (a time.monotonic() value) first and
+    browser actions are capped at the time left, so a search the handler has given
+    up on stops instead of holding the browser into the next invocation.
+    """
+    timings = {}
+
+    def remaining():
+        left = expires_at - time.monotonic()
+        if left <= 0:
+            raise SearchCancelled(f"Search for {query} cancelled after the deadline")
+        return left
+
+    def step(name, fn):
+        remaining()
+        started = time.monotonic()
+        try:
+            return fn()
+        finally:
+            timings[name] = round(time.monotonic() - started, 2)
+
+    nova = step("session", lambda: worker.session(starting_page))
+    step("search", lambda: nova.act(f"Dismiss any cookie or consent banner, then search for: {query}",
+                                    timeout=max(1, int(remaining()))))
+    extraction = step("extract", lambda: nova.act(
+        f"Return the top {max_results} results on this page with their title, url and a short snippet",
+        schema=RESULTS_SCHEMA, timeout=max(1, int(remaining()))
+    ))
+
+    results = getattr(extraction, 'parsed_response', None)
+    if not getattr(extraction, 'matches_schema', False) or not isinstance(results, list):
+        raise Exception("Could not extract structured results from the page")
+    return {"results": results[:max_results], "timings": timings}
+
+
+def get_parameter(parameters, name, default=None):
+    return next((param['value'] for param in parameters if param.get('name') == name), default)
+
+
+def parse_max_results(value):
+    """Results per query requested by the agent, between 1 and MAX_RESULTS_PER_QUERY."""
+    try:
+        requested = int(value)
+    except (TypeError, ValueError):
+        logger.info(f"Ignoring non-numeric max_results {value!r}")
+        return MAX_RESULTS_PER_QUERY
+    return max(1, min(requested, MAX_RESULTS_PER_QUERY))
+
+
+def parse_starting_page(value):
+    """Starting page requested by the agent, or STARTING_PAGE unless it is an http(s) URL."""
+    if not value:
+        return STARTING_PAGE
+    parsed = urlparse(str(value).strip())
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        logger.info(f"Ignoring invalid starting_page {value!r}")
+        return STARTING_PAGE
+    return parsed.geturl()
+
+
+def parse_queries(value):
+    """Accept a JSON array of strings or a newline/semicolon separated list."""
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+        if isinstance(parsed, list):
+            return [str(item).strip() for item in parsed if str(item).strip()]
+    except ValueError:
+        pass
+    separators = '\n' if '\n' in value else ';'
+    return [item.strip() for item in value.split(separators) if item.strip()]
+
+
+def _action_response(event, body):
+    return {
+        'messageVersion': '1.0',
+        'response': {
+            'actionGroup': event.get('actionGroup', ''),
+            'function': event.get('function', ''),
+            'functionResponse': {
+                'responseBody': {
+                    'TEXT': {
+                        'body': json.dumps(body)
+                    }
+                }
+            }
+        },
+        'sessionAttributes': event.get('sessionAttributes', {}),
+        'promptSessionAttributes': event.get('promptSessionAttributes', {})
+    }
+
 
 def lambda_handler(event, context):
+    started = time.monotonic()
     logger.info(f"Received event: {json.dumps(event)}")
     # Get API key from environment variables
     api_key = os.environ.get('NOVA_ACT_API_KEY')
     if not api_key:
         logger.error("NOVA_ACT_API_KEY environment variable not set")
-        return {
-            'statusCode': 500,
-            'body': 'Missing NOVA_ACT_API_KEY environment variable'
-        }
-
-    # Create the full path structure that Python expects
-    # Use a secure temporary directory created by tempfile.mkdtemp()
-    tmp_dir = tempfile.mkdtemp(prefix="lambda_dependencies_")
-    site_packages = os.path.join(tmp_dir, 'python', 'lib', 'python3.13', 'site-packages')
-    zip_path = os.path.join(tmp_dir, f'package_{os.urandom(4).hex()}.zip')
-    
-    # Check if we already have valid cached dependencies
-    if not is_cache_valid(site_packages):
-        if not os.path.exists(site_packages):
-            logger.info(f"Creating directory structure: {site_packages}")
-            os.makedirs(site_packages, exist_ok=True)
-            
-        # Download and extract only if needed
-        s3_client = boto3.client('s3')
-        try:
-            logger.info("Downloading package from S3")
-            s3_client.download_file(
-                'nova-act-vb',
-                'nova_act_layer.zip',
-                zip_path
-            )
-            
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(tmp_dir)
-                
-            logger.info(f"Extracted package.zip to {tmp_dir}")
-            os.remove(zip_path)
-        except Exception as e:
-            logger.error(f"Failed to download and extract dependencies: {str(e)}")
-            return {
-                'statusCode': 500,
-                'body': f'Failed to download and extract dependencies: {str(e)}'
-            }
-    
-    # Add the site-packages directory to Python path
-    if site_packages not in sys.path:
-        sys.path.insert(0, site_packages)
-    logger.info(f"Python path: {sys.path}")
-    
+        return _action_response(event, {'error': 'Missing NOVA_ACT_API_KEY environment variable'})
+
+    parameters = event.get('parameters', [])
+    queries = list(dict.fromkeys(parse_queries(get_parameter(parameters, 'queries') or get_parameter(parameters, 'query'))))
+    if not queries:
+        return _action_response(event, {'error': 'Provide one or more search queries in the queries parameter'})
+    if len(queries) > MAX_QUERIES:
+        logger.info(f"Limiting {len(queries)} queries to {MAX_QUERIES}")
+        queries = queries[:MAX_QUERIES]
+    starting_page = parse_starting_page(get_parameter(parameters, 'starting_page'))
+    max_results = parse_max_results(get_parameter(parameters, 'max_results', MAX_RESULTS_PER_QUERY))
+
+    deadline = SEARCH_DEADLINE_SECONDS
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = min(deadline, context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_SAFETY_MARGIN_SECONDS)
+
     try:
-        # Clear all nova_act related modules
-        modules_to_remove = [m for m in sys.modules if m.startswith('nova_act')]
-        for m in modules_to_remove:
-            del sys.modules[m]
-        
-        # Import the module
-        import nova_act
-        logger.info("Successfully imported nova_act")
-
-        # Print nova_act version and configuration if available
-        logger.info(f"Nova Act Version: {getattr(nova_act, '__version__', 'unknown')}")
-        logger.info(f"Nova Act Config: {getattr(nova_act, 'config', 'unknown')}")
-
-        # Set API key in environment before creating instance
-        os.environ['NOVA_ACT_API_KEY'] = api_key
-        logger.info("Set API key in environment")
+        nova_act = load_nova_act()
+    except Exception as e:
+        logger.error(f"Failed to download and extract dependencies: {str(e)}")
+        return _action_response(event, {'error': f'Failed to download and extract dependencies: {str(e)}'})
 
-        try:
-            # Initialize NovaAct with required starting_page argument and debug mode if available
-            nova = nova_act.NovaAct(
-                "https://www.zoocasa.com/"
-            )
-            logger.info("Created NovaAct instance")
-
-            max_retries = 5  # Increased from 3 to 5
-            startup_delay = 5  # Seconds to wait before first start attempt
-
-            # Initial delay before first attempt
-            logger.info(f"Waiting {startup_delay} seconds before first start attempt...")
-            time.sleep(startup_delay)
-
-            for attempt in range(max_retries):
-                try:
-                    # Check if client exists and its state
-                    if hasattr(nova, '_state'):
-                        logger.info(f"Client state before stop attempt: {nova._state}")
-
-                    # Try to stop first if already running
-                    try:
-                        nova.stop()
-                        logger.info("Stopped existing client")
-                        time.sleep(3)  # Increased cool-down period
-                    except Exception as stop_error:
-                        logger.info(f"Stop attempt result: {str(stop_error)}")
-
-                    # Log attempt details
-                    logger.info(f"Starting client (attempt {attempt + 1}/{max_retries})...")
-                    
-                    # Start fresh with explicit error capture
-                    try:
-                        start_result = nova.start()
-                        logger.info(f"Start command result: {start_result}")
-                    except Exception as start_error:
-                        logger.error(f"Start command error: {str(start_error)}")
-                        raise start_error
-
-                    # Add longer stabilization period after start
-                    time.sleep(5)
-
-                    # Verify client state after start
-                    if hasattr(nova, '_state'):
-                        logger.info(f"Client state after start: {nova._state}")
-
-                    # Test if client is responsive with timeout
-                    logger.info("Testing client responsiveness...")
-                    test_start_time = time.time()
-                    test_timeout = 10  # 10 seconds timeout for test
-                    
-                    while time.time() - test_start_time < test_timeout:
-                        try:
-                            test_result = nova.act("test")
-                            if test_result:
-                                logger.info(f"Client is responsive. Test result: {test_result}")
-                                break
-                        except Exception as test_error:
-                            logger.warning(f"Test attempt failed: {str(test_error)}")
-                            time.sleep(1)
-                    else:
-                        raise Exception("Client responsiveness test timed out")
-
-                    # If we got here, client is working
-                    logger.info("Client successfully started and tested")
-                    break
-
-                except Exception as retry_error:
-                    logger.warning(f"Attempt {attempt + 1} failed: {str(retry_error)}")
-                    
-                    # On last attempt, gather diagnostic information
-                    if attempt == max_retries - 1:
-                        logger.error("All start attempts failed. Gathering diagnostics...")
-                        try:
-                            # Log system information if available
-                            import psutil
-                            logger.error(f"Memory usage: {psutil.Process().memory_info()}")
-                            logger.error(f"CPU usage: {psutil.cpu_percent()}")
-                        except ImportError:
-                            logger.error("psutil not available for diagnostics")
-                        
-                        raise Exception(f"Failed to start client after {max_retries} attempts: {str(retry_error)}")
-                    
-                    # Wait longer between retries
-                    retry_delay = (attempt + 1) * 5  # Progressive delay
-                    logger.info(f"Waiting {retry_delay} seconds before next attempt...")
-                    time.sleep(retry_delay)
-
-            # If we get here, client is ready for operations
-            logger.info("Proceeding with main operations...")
-
-            # Rest of your code with additional error handling
-            operations = [
-                ("accept cookies", "accept cookies"),
-                ("search", "search for houses in Toronto"),
-                ("filter", "Find houses that have at least 3 bedrooms")
-            ]
-
-            for op_name, op_command in operations:
-                try:
-                    logger.info(f"Executing {op_name}...")
-                    result = nova.act(op_command)
-                    logger.info(f"{op_name} result: {result}")
-                    if not result:
-                        raise Exception(f"Failed to {op_name}")
-                    time.sleep(2)
-                except Exception as op_error:
-                    logger.error(f"Operation {op_name} failed: {str(op_error)}")
-                    raise
-
-        except Exception as e:
-            logger.error(f"Error during execution: {str(e)}")
-            return {
-                'statusCode': 500,
-                'body': json.dumps({
-                    'error': str(e),
-                    'details': getattr(e, 'details', None)
-                })
-            }
-    finally:
-        try:
-            if hasattr(nova, 'stop'):
-                logger.info("Attempting to stop client...")
-                nova.stop()
-                logger.info("Successfully stopped NovaAct client")
-        except Exception as stop_error:
-            logger.error(f"Error stopping client: {stop_error}")
+    ensure_workers(nova_act, len(queries))
+    expires_at = started + deadline
+    futures = {query: submit(run_search, query, starting_page, max_results, expires_at) for query in queries}
+    wait(list(futures.values()), timeout=max(0.0, expires_at - time.monotonic()))
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'message': 'Operations completed successfully'})
-    }
\ No newline at end of file
+    results = []
+    for query, future in futures.items():
+        if not future.done():
+            # Queued searches are dropped; running ones stop at their next step or action timeout
+            future.cancel()
+            results.append({'query': query, 'status': 'timeout', 'error': 'Search did not finish before the deadline'})
+        elif future.exception() is not None:
+            logger.error(f"Search for {query} failed: {str(future.exception())}")
+            results.append({'query': query, 'status': 'error', 'error': str(future.exception())})
+        else:
+            results.append(dict({'query': query, 'status': 'success'}, **future.result()))
+
+    elapsed = round(time.monotonic() - started, 2)
+    succeeded = sum(1 for result in results if result['status'] == 'success')
+    logger.info(f"Completed {succeeded}/{len(results)} searches in {elapsed}s")
+    return _action_response(event, {'results': results, 'elapsed_seconds': elapsed})
@@ -2,6 +2,8 @@
 
 # Define paths with absolute path for OUTPUT_DIR
 LAMBDA_SRC_DIR="./lambdas"
+# Modules shared by the orchestrator-action functions, copied into each of their zips
+SHARED_ORCHESTRATOR_DIR="$(pwd)/lambdas/orchestrator-action/shared"
 OUTPUT_DIR="$(pwd)/lambda-output"
 
 # Recreate the output directory to ensure it's clean and has correct permissions
@@ -14,6 +16,7 @@ folder_paths=(
     "orchestrator-action/invoke-kb-agent-action"
     "orchestrator-action/invoke-api-agent-action"
     "orchestrator-action/invoke-db-agent-action"
+    "orchestrator-action/invoke-agents-parallel-action"
     "rest-api-action"
 )
 
@@ -22,6 +25,7 @@ zip_names=(
     "OrchestratorKBActionLambda.zip"
     "OrchestratorAPIActionLambda.zip"
     "OrchestratorDBActionLambda.zip"
+    "OrchestratorParallelActionLambda.zip"
     "RestAPIActionLambda.zip"
 )
 
@@ -33,8 +37,26 @@ for i in "${!folder_paths[@]}"; do
     # Go into the Lambda function directory
     cd "$LAMBDA_SRC_DIR/$lambda_dir" || { echo "Directory $LAMBDA_SRC_DIR/$lambda_dir not found"; exit 1; }
 
-    # Create the zip file in the output directory
-    zip -r "$zip_file" . -x "*.DS_Store"
+    if [ -f requirements.txt ]; then
+        # Bundle dependencies next to the function code in a scratch directory, using
+        # wheels for the Lambda runtime (python3.11, x86_64) whatever the build host is
+        build_dir="$(mktemp -d)"
+        cp -R . "$build_dir"
+        pip install -r requirements.txt -t "$build_dir" --quiet \
+            --platform manylinux2014_x86_64 --python-version 3.11 --implementation cp --only-binary=:all: \
+            || { echo "Failed to install requirements for $lambda_dir"; exit 1; }
+        (cd "$build_dir" && zip -r "$zip_file" . -x "*.DS_Store" -x "requirements.txt" -x "*__pycache__*" -x "tests/*")
+        rm -rf "$build_dir"
+    elif [[ "$lambda_dir" == orchestrator-action/* ]]; then
+        build_dir="$(mktemp -d)"
+        cp -R . "$build_dir"
+        cp "$SHARED_ORCHESTRATOR_DIR"/*.py "$build_dir"
+        (cd "$build_dir" && zip -r "$zip_file" . -x "*.DS_Store" -x "*__pycache__*")
+        rm -rf "$build_dir"
+    else
+        # Create the zip file in the output directory
+        zip -r "$zip_file" . -x "*.DS_Store"
+    fi
     
     echo "Created zip for $lambda_dir at $zip_file"
     
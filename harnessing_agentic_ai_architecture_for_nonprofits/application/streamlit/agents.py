@@ -1,11 +1,14 @@
 import streamlit as st
 import boto3
 from botocore.config import Config
-from botocore.exceptions import ReadTimeoutError
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
 import time
 import json
 import logging
-import pprint
+import random
+from contextlib import closing
+
+from trace_timeline import TraceTimeline, export_timeline
 from datetime import datetime
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -92,9 +95,22 @@ logger = logging.getLogger(__name__)
 
 # Set up AWS clients
 region = 'us-east-1'
-session = boto3.Session(region_name=region)
-lambda_client = session.client('lambda')
-bedrock_agent_runtime_client = session.client('bedrock-agent-runtime', config=config)
+AGENT_ID = 'XXXXXXXXXX'
+AGENT_ALIAS_ID = 'XXXXXXXXXX'
+
+# Retries only happen before any part of the answer was shown
+MAX_RETRIES = 4
+BASE_DELAY = 1  # Seconds
+MAX_DELAY = 8  # Seconds
+RETRYABLE_ERROR_CODES = ('throttlingException', 'ThrottlingException', 'serviceUnavailableException',
+                         'ServiceUnavailableException', 'internalServerException')
+
+
+@st.cache_resource
+def get_bedrock_agent_runtime_client():
+    """One client per Streamlit server process, shared by every session and rerun."""
+    session = boto3.Session(region_name=region)
+    return session.client('bedrock-agent-runtime', config=config)
 
 # Background Image and Styling
 st.markdown(
@@ -139,127 +155,175 @@ def extract_source_info(metadata):
         logger.error(f"Error extracting source info: {e}")
         return None
 
-# Define the invokeAgent function
-def invokeAgent(query, session_id, enable_trace=True, session_state=dict()):
-    max_retries = 10
-    base_delay = 1  # Base delay in seconds
-    end_session = False
-    for attempt in range(max_retries):
+def sources_from_trace(trace):
+    """Yield source information for knowledge base references found in a trace event."""
+    orchestration = trace.get('trace', {}).get('orchestrationTrace', {})
+    lookup = orchestration.get('observation', {}).get('knowledgeBaseLookupOutput', {})
+    for reference in lookup.get('retrievedReferences', []):
+        metadata = dict(reference.get('metadata') or {})
+        if 'location' in reference:
+            metadata['location'] = reference['location']
+        source_info = extract_source_info(metadata)
+        if source_info:
+            yield source_info
+
+
+def _is_retryable(error):
+    if isinstance(error, (ReadTimeoutError, EndpointConnectionError)):
+        return True
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES
+
+
+def _backoff_delay(attempt):
+    """Capped exponential backoff with full jitter."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+def invokeAgent(query, session_id, enable_trace=True, session_state=None):
+    """
+    Stream an agent response as ("chunk", text), ("source", info) and ("trace", trace) events.
+
+    A ("retry", attempt) event is sent before retrying an attempt that already
+    produced trace or source events, so the caller can discard them. The HTTP
+    stream is closed when the caller stops iterating, e.g. when the user cancels
+    and Streamlit stops the script run.
+    """
+    client = get_bedrock_agent_runtime_client()
+    for attempt in range(MAX_RETRIES):
+        streamed = False
+        traced = False
+        event_stream = None
         try:
-            agentResponse = bedrock_agent_runtime_client.invoke_agent(
+            agentResponse = client.invoke_agent(
                 inputText=query,
-                agentId='XXXXXXXXXX',
-                agentAliasId='XXXXXXXXXX',
+                agentId=AGENT_ID,
+                agentAliasId=AGENT_ALIAS_ID,
                 sessionId=session_id,
-                enableTrace=enable_trace, 
-                endSession=end_session,
-                sessionState=session_state
+                enableTrace=enable_trace,
+                endSession=False,
+                sessionState=session_state or {},
+                streamingConfigurations={'streamFinalResponse': True}
             )
-        
-            # if enable_trace:
-            #     logger.info(pprint.pformat(agentResponse))
-            
             event_stream = agentResponse['completion']
-            #print(f"event_stream: {event_stream}")
-            sources = []
-            agent_answer = ""
-            if event_stream:
-                try:
-                    for event in event_stream:        
-                        if 'chunk' in event:
-                            data = event['chunk']['bytes']
-                            if enable_trace:
-                                logger.info(f"Final answer ->\n{data.decode('utf8')}")
-                            agent_answer = data.decode('utf8')
-                            sources.append({"source": "none"})
-                            return { 'answer': agent_answer, 'sources': sources }
-                        elif 'trace' in event:
-                            if enable_trace:
-                                logger.info(json.dumps(event['trace'], indent=2, cls=DateTimeEncoder))
-                            # Extract source information from trace
-                            if 'knowledgeBaseSearchResults' in event['trace']:
-                                for result in event['trace']['knowledgeBaseSearchResults']:
-                                    if 'metadata' in result:
-                                        source_info = extract_source_info(result['metadata'])
-                                        if source_info:
-                                            sources.append(source_info)
-                        else:
-                            raise Exception("unexpected event.", event)
-                    return {
-                        'answer': agent_answer,
-                        'sources': sources
-                    }
-                except ReadTimeoutError as e:
-                    if attempt == max_retries - 1:
-                        raise Exception(f"Failed after {max_retries} attempts: {str(e)}")
-                
-                    # Calculate exponential backoff delay
-                    delay = (2 ** attempt) * base_delay
-                    logger.warning(f"Read timeout occurred. Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    continue
-            else:
-                agent_answer = "I apologize, but I do not have enough information to determine the answer to your question. If you are able to provide more details about the database schema or access to the actual donation data, I would be happy to try again to answer your question."
+            for event in event_stream:
+                if 'chunk' in event:
+                    streamed = True
+                    yield 'chunk', event['chunk']['bytes'].decode('utf8')
+                elif 'trace' in event:
+                    traced = True
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(json.dumps(event['trace'], cls=DateTimeEncoder))
+                    yield 'trace', event['trace']
+                    for source_info in sources_from_trace(event['trace']):
+                        yield 'source', source_info
+                else:
+                    # Error events carry their exception name and message
+                    logger.warning(f"Unhandled event in agent stream: {list(event)}")
+            return
         except Exception as e:
-            raise Exception("unexpected event.", e)
+            if streamed or not _is_retryable(e) or attempt == MAX_RETRIES - 1:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(f"{type(e).__name__} invoking agent. Retrying in {delay:.1f} seconds...")
+            if traced:
+                yield 'retry', attempt + 1
+            time.sleep(delay)
+        finally:
+            if event_stream is not None:
+                event_stream.close()
 
-def main():
-    # Centered Title
-    #st.markdown("<h1 style='text-align: center;'>OCCRRA</h1>", unsafe_allow_html=True)
-    
-    # Centered Header
-    #st.markdown("<h3 style='text-align: center;'>by Amazon Bedrock Agents</h3>", unsafe_allow_html=True)
 
-    # Supervisor Text
-    #st.markdown('<div class="supervisor-text">Orchestrator Agent:</div>', unsafe_allow_html=True)
+def render_sources(sources):
+    with st.expander("View Sources"):
+        for source in sources:
+            st.write("Source Information:")
+            for key, value in source.items():
+                if value:
+                    st.write(f"{key}: {value}")
+            st.write("---")
 
-    # Chat Input Container
-    with st.container():
-        if prompt := st.chat_input(key="supervisor", placeholder="How can I help you today?"):
-            # Append user input only if it's new
-            if not st.session_state.messages or st.session_state.messages[-1]['content'] != prompt:
-                st.session_state.messages.append({"role": "user", "content": prompt})
-
-            # Get agent response and append it only if it's new
-            sessionId = st.session_state.get('sessionId', "None")
-            result = invokeAgent(prompt, sessionId)
-            print(f"Type of result: {type(result)}")
-            print(f"Result value: {result}")
-            # Display the answer
-            if st.session_state.messages[-1]['content'] != result['answer']:
-                st.session_state.messages.append({"role": "assistant", "content": result['answer']})
-            
-            # Display sources if available
-            if result['sources']:
-                with st.expander("View Sources"):
-                    for source in result['sources']:
-                        st.write("Source Information:")
-                        for key, value in source.items():
-                            if value:
-                                st.write(f"{key}: {value}")
-                        st.write("---")
-
-    # Display previous chat messages
+
+def render_timeline(timeline):
+    with st.expander(f"Latency breakdown ({timeline['total_ms'] / 1000:.1f}s)"):
+        if not timeline['steps']:
+            st.write("No trace steps were recorded.")
+            return
+        st.caption("Time and tokens per model, action group and knowledge base, slowest first")
+        st.dataframe(timeline['totals'], hide_index=True)
+        st.caption("Steps in order (milliseconds from the start of the run)")
+        st.dataframe(timeline['steps'], hide_index=True)
+
+
+def stream_answer(prompt, session_id):
+    """Write the answer into the chat as it arrives; a Stop click keeps what was received so far."""
+    pending = st.session_state['pending'] = {"role": "assistant", "content": "", "sources": []}
+    timeline = TraceTimeline(session_id, prompt)
+    st.button("Stop", key="stop_streaming")
+    placeholder = st.empty()
+    status = st.status("Waiting for the agent...", expanded=False)
+    try:
+        with closing(invokeAgent(prompt, session_id)) as events:
+            for kind, value in events:
+                if kind == 'chunk':
+                    pending['content'] += value
+                    placeholder.markdown(pending['content'] + "▌")
+                elif kind == 'trace':
+                    timeline.add(value)
+                    # Keep the partial timeline with the partial answer if the run is stopped
+                    pending['timeline'] = {'steps': timeline.steps, 'totals': [],
+                                           'total_ms': round((time.time() - timeline.started) * 1000)}
+                elif kind == 'retry':
+                    # The failed attempt's steps and sources would otherwise be counted twice
+                    timeline.discard_steps()
+                    pending['sources'] = []
+                    pending.pop('timeline', None)
+                    status.update(label=f"Retrying (attempt {value + 1})...")
+                elif kind == 'source' and value not in pending['sources']:
+                    pending['sources'].append(value)
+                    status.update(label=f"Found {len(pending['sources'])} source(s)...")
+        status.update(label="Done", state="complete")
+    except Exception as e:
+        logger.error(f"Error invoking agent: {e}")
+        status.update(label="Failed", state="error")
+        pending['content'] += f"\n\nSorry, something went wrong: {e}"
+    placeholder.markdown(pending['content'])
+    export_timeline(timeline)
+    pending['timeline'] = {'steps': timeline.steps, 'totals': timeline.totals(),
+                           'total_ms': round((time.time() - timeline.started) * 1000)}
+    st.session_state.messages.append(st.session_state.pop('pending'))
+
+
+def main():
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    
+
     if 'sessionId' not in st.session_state:
         st.session_state['sessionId'] = "None"
 
-    #for message in reversed(st.session_state.messages):
+    # A run interrupted by Stop leaves its partial answer behind
+    if 'pending' in st.session_state:
+        partial = st.session_state.pop('pending')
+        partial['content'] += "\n\n*(stopped)*"
+        st.session_state.messages.append(partial)
+
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
-    
-    # Footer
-    #st.markdown(
-    #    """
-    #    <div class="footer">
-    #        For inquiries, contact <a href="mailto:wchemz@amazon.com">wchemz@amazon.com</a>
-    #    </div>
-    #    """,
-    #    unsafe_allow_html=True
-    #)
+            if message.get("sources"):
+                render_sources(message["sources"])
+            if message.get("timeline"):
+                render_timeline(message["timeline"])
+
+    # Chat Input Container
+    with st.container():
+        if prompt := st.chat_input(key="supervisor", placeholder="How can I help you today?"):
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            with st.chat_message("user"):
+                st.markdown(prompt)
+            with st.chat_message("assistant"):
+                stream_answer(prompt, st.session_state['sessionId'])
+            st.rerun()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Where finished timelines are written as JSON lines: 'file', 'cloudwatch' or 'none'
+TRACE_SINK = os.environ.get('TRACE_SINK', 'file').lower()
+TRACE_LOG_FILE = os.environ.get('TRACE_LOG_FILE', 'agent_traces.jsonl')
+TRACE_LOG_GROUP = os.environ.get('TRACE_LOG_GROUP', '/nonprofit-agents/streamlit-traces')
+
+# Trace parts that describe the start of a step, and the parts that end it
+_STEP_STARTS = ('modelInvocationInput', 'invocationInput')
+_STEP_ENDS = ('modelInvocationOutput', 'observation')
+_PHASES = {
+    'preProcessingTrace': 'pre-processing',
+    'orchestrationTrace': 'orchestration',
+    'postProcessingTrace': 'post-processing',
+    'routingClassifierTrace': 'routing',
+    'guardrailTrace': 'guardrail',
+    'failureTrace': 'failure',
+}
+
+
+def _timestamp(trace, received_at):
+    event_time = trace.get('eventTime')
+    if isinstance(event_time, datetime):
+        return event_time.timestamp()
+    return received_at
+
+
+def _describe_invocation(invocation):
+    """Return (kind, name) for an orchestration invocationInput."""
+    invocation_type = invocation.get('invocationType', 'UNKNOWN')
+    if 'actionGroupInvocationInput' in invocation:
+        action = invocation['actionGroupInvocationInput']
+        name = action.get('function') or action.get('apiPath') or ''
+        return 'action_group', f"{action.get('actionGroupName', '')}:{name}".strip(':')
+    if 'knowledgeBaseLookupInput' in invocation:
+        return 'knowledge_base', invocation['knowledgeBaseLookupInput'].get('knowledgeBaseId', '')
+    if 'agentCollaboratorInvocationInput' in invocation:
+        return 'agent', invocation['agentCollaboratorInvocationInput'].get('agentCollaboratorName', '')
+    return invocation_type.lower(), invocation_type
+
+
+class TraceTimeline:
+    """
+    Collects the trace events of one agent run into timed steps.
+
+    Each step pairs a start part (model or tool invocation input) with its end
+    part (model output or observation) by traceId. Durations come from the
+    events' eventTime when present, otherwise from when they were received.
+    """
+
+    def __init__(self, session_id=None, query=None):
+        self.run_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.query = query
+        self.started = time.time()
+        self.steps = []
+        self._open = {}
+
+    def add(self, trace, received_at=None):
+        received_at = received_at or time.time()
+        at = _timestamp(trace, received_at)
+        for trace_type, body in (trace.get('trace') or {}).items():
+            phase = _PHASES.get(trace_type, trace_type)
+            if trace_type == 'failureTrace':
+                self._record(phase, 'failure', body.get('failureReason', ''), at, at, trace)
+                continue
+            for part in _STEP_STARTS:
+                if part in body:
+                    self._start(phase, part, body[part], at, trace)
+            for part in _STEP_ENDS:
+                if part in body:
+                    self._end(phase, part, body[part], at, trace)
+
+    def discard_steps(self):
+        """Drop the steps of a failed attempt before a retry; the run keeps its start time."""
+        self.steps = []
+        self._open = {}
+
+    def _start(self, phase, part, body, at, trace):
+        if part == 'modelInvocationInput':
+            kind, name = 'model', body.get('type', 'ORCHESTRATION').lower()
+        else:
+            kind, name = _describe_invocation(body)
+        self._open[(phase, part, body.get('traceId'))] = (kind, name, at, trace)
+
+    def _end(self, phase, part, body, at, trace):
+        start_part = _STEP_STARTS[_STEP_ENDS.index(part)]
+        opened = self._open.pop((phase, start_part, body.get('traceId')), None)
+        if opened is None:
+            if part == 'modelInvocationOutput':
+                # Pre/post-processing only report the output
+                opened = ('model', phase, at, trace)
+            else:
+                return
+        kind, name, started_at, start_trace = opened
+        usage = (body.get('metadata') or {}).get('usage') or {}
+        self._record(phase, kind, name, started_at, at, start_trace,
+                     usage.get('inputTokens', 0), usage.get('outputTokens', 0))
+
+    def _record(self, phase, kind, name, started_at, ended_at, trace, input_tokens=0, output_tokens=0):
+        self.steps.append({
+            'phase': phase,
+            'kind': kind,
+            'name': name,
+            'agent_id': trace.get('agentId'),
+            'start_ms': round((started_at - self.started) * 1000),
+            'duration_ms': round((ended_at - started_at) * 1000),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+        })
+
+    def totals(self):
+        """Duration and tokens per (kind, name), slowest first."""
+        totals = {}
+        for step in self.steps:
+            key = (step['kind'], step['name'])
+            total = totals.setdefault(key, {'kind': step['kind'], 'name': step['name'], 'calls': 0,
+                                            'duration_ms': 0, 'input_tokens': 0, 'output_tokens': 0})
+            total['calls'] += 1
+            total['duration_ms'] += step['duration_ms']
+            total['input_tokens'] += step['input_tokens']
+            total['output_tokens'] += step['output_tokens']
+        return sorted(totals.values(), key=lambda total: total['duration_ms'], reverse=True)
+
+    def to_json_lines(self):
+        base = {'run_id': self.run_id, 'session_id': self.session_id}
+        lines = [json.dumps(dict(base, record='step', **step)) for step in self.steps]
+        lines.append(json.dumps(dict(base, record='summary', query=self.query,
+                                     total_ms=round((time.time() - self.started) * 1000),
+                                     totals=self.totals())))
+        return lines
+
+
+class _CloudWatchSink:
+    def __init__(self, log_group):
+        import boto3
+        self.client = boto3.client('logs')
+        self.log_group = log_group
+        self.log_stream = f"streamlit-{uuid.uuid4().hex}"
+        try:
+            self.client.create_log_group(logGroupName=log_group)
+        except self.client.exceptions.ResourceAlreadyExistsException:
+            pass
+        self.client.create_log_stream(logGroupName=log_group, logStreamName=self.log_stream)
+
+    def write(self, lines):
+        now = int(time.time() * 1000)
+        self.client.put_log_events(logGroupName=self.log_group, logStreamName=self.log_stream,
+                                   logEvents=[{'timestamp': now, 'message': line} for line in lines])
+
+
+class _FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, lines):
+        with open(self.path, 'a') as trace_file:
+            trace_file.write('\n'.join(lines) + '\n')
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def _get_sink():
+    global _sink
+    with _sink_lock:
+        if _sink is None and TRACE_SINK != 'none':
+            try:
+                _sink = _CloudWatchSink(TRACE_LOG_GROUP) if TRACE_SINK == 'cloudwatch' else _FileSink(TRACE_LOG_FILE)
+            except Exception as e:
+                logger.warning(f"Trace sink {TRACE_SINK} unavailable: {e}")
+    return _sink
+
+
+def export_timeline(timeline):
+    """Write a finished timeline to the configured sink. Failures are logged, never raised."""
+    sink = _get_sink()
+    if sink is None:
+        return
+    try:
+        sink.write(timeline.to_json_lines())
+    except Exception as e:
+        logger.warning(f"Failed to export trace timeline: {e}")
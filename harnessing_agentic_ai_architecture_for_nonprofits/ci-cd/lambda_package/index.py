@@ -1,35 +1,228 @@
+import csv
+import io
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 import psycopg2
 
-def lambda_handler(event, context):
-    rds_host = os.environ['DB_ENDPOINT']
-    db_name = os.environ['DB_NAME']
-    username = os.environ['DB_USERNAME']
-    password = os.environ['DB_PASSWORD']
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
 
-    # Connect to the PostgreSQL database
-    conn = psycopg2.connect(
-        host=rds_host,
-        database=db_name,
-        user=username,
-        password=password
+# Optional S3 location of per-table seed files named <table>.csv with a header row.
+# Opt-in: no seed files ship with the sample, so when SEED_BUCKET is not set the
+# bundled data.sql is executed instead.
+SEED_BUCKET = os.environ.get('SEED_BUCKET')
+SEED_PREFIX = os.environ.get('SEED_PREFIX', 'seed/')
+LOAD_WORKERS = int(os.environ.get('LOAD_WORKERS', '4'))
+COPY_BUFFER_SIZE = int(os.environ.get('COPY_BUFFER_SIZE', str(1024 * 1024)))
+
+s3_client = boto3.client('s3')
+
+
+def _connect():
+    return psycopg2.connect(
+        host=os.environ['DB_ENDPOINT'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USERNAME'],
+        password=os.environ['DB_PASSWORD']
     )
+
+
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, consumed by COPY FROM STDIN."""
+
+    def __init__(self, chunks, prefix=b''):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray(prefix)
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) - self._offset < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        end = len(self._buffer) if size < 0 else min(len(self._buffer), self._offset + size)
+        data = bytes(self._buffer[self._offset:end])
+        self._offset = end
+        # Drop consumed bytes once they make up most of the buffer, keeping appends and reads linear
+        if self._offset > len(self._buffer) // 2:
+            del self._buffer[:self._offset]
+            self._offset = 0
+        return data
+
+
+def _split_header(body):
+    """Read the CSV header line from an S3 body and return (columns, stream of the remaining bytes)."""
+    chunks = body.iter_chunks(chunk_size=COPY_BUFFER_SIZE)
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if b'\n' in head:
+            break
+    header, _, rest = bytes(head).partition(b'\n')
+    # csv.reader handles quoted column names, including ones containing commas
+    columns = [name.strip() for name in next(csv.reader([header.decode('utf-8-sig').strip()]))]
+    return columns, ChunkStream(chunks, rest)
+
+
+def _quote_columns(columns):
+    return ', '.join('"' + name.replace('"', '""') + '"' for name in columns)
+
+
+def load_table(table, key):
+    """COPY one seed file into its table on a dedicated connection and return load statistics."""
+    started = time.monotonic()
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        body = s3_client.get_object(Bucket=SEED_BUCKET, Key=key)['Body']
+        columns, stream = _split_header(body)
+        cursor.copy_expert(
+            f'COPY "{table}" ({_quote_columns(columns)}) FROM STDIN WITH (FORMAT csv)',
+            stream, size=COPY_BUFFER_SIZE
+        )
+        rows = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    logger.info("Loaded %s: %d rows in %.2fs (%.0f rows/s)", table, rows, elapsed, rate)
+    return {'table': table, 'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_second': round(rate)}
+
+
+def list_seed_files():
+    """Map table names to the S3 keys of their seed files under SEED_PREFIX."""
+    seed_files = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=SEED_BUCKET, Prefix=SEED_PREFIX):
+        for item in page.get('Contents', []):
+            name = os.path.basename(item['Key'])
+            table, ext = os.path.splitext(name)
+            if ext == '.csv' and table:
+                seed_files[table.lower()] = item['Key']
+    return seed_files
+
+
+def drop_deferred_constraints(cursor, tables):
+    """
+    Drop indexes and constraints on the target tables so COPY does not maintain them.
+
+    Foreign keys referencing the target tables from any other table are dropped
+    too, since they would block both the load and dropping the keys they use.
+    Returns the statements that recreate them, primary and unique keys first so
+    foreign keys can reference them.
+    """
+    cursor.execute("""
+        SELECT c.conrelid::regclass::text, c.conname, c.contype, pg_get_constraintdef(c.oid)
+        FROM pg_constraint c
+        WHERE (c.conrelid = ANY (%s::regclass[]) AND c.contype IN ('p', 'u', 'f'))
+           OR (c.confrelid = ANY (%s::regclass[]) AND c.contype = 'f')
+    """, ([f'"{table}"' for table in tables],) * 2)
+    constraints = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = ANY (%s::regclass[])
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, ([f'"{table}"' for table in tables],))
+    indexes = cursor.fetchall()
+
+    order = {'p': 0, 'u': 1, 'f': 2}
+    constraints.sort(key=lambda row: order[row[2]])
+    # Foreign keys must go before the keys they reference
+    for relation, name, _, _ in reversed(constraints):
+        cursor.execute(f'ALTER TABLE {relation} DROP CONSTRAINT "{name}"')
+    for index_name, _ in indexes:
+        cursor.execute(f'DROP INDEX {index_name}')
+
+    restore = [f'ALTER TABLE {relation} ADD CONSTRAINT "{name}" {definition}'
+               for relation, name, _, definition in constraints]
+    restore.extend(definition for _, definition in indexes)
+    return restore
+
+
+def reset_identity_sequences(cursor, tables):
+    """Move identity sequences past the explicitly loaded ids."""
+    cursor.execute("""
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE is_identity = 'YES' AND table_name = ANY (%s)
+    """, (list(tables),))
+    for table, column in cursor.fetchall():
+        cursor.execute(
+            f'SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX("{column}"), 0) + 1, false) FROM "{table}"',
+            (f'"{table}"', column)
+        )
+
+
+def load_from_s3(conn):
+    """Bulk load every seed file in parallel, deferring constraints and indexes until the end."""
+    seed_files = list_seed_files()
+    if not seed_files:
+        raise ValueError(f"No seed files found under s3://{SEED_BUCKET}/{SEED_PREFIX}")
+    logger.info("Loading %d tables from s3://%s/%s", len(seed_files), SEED_BUCKET, SEED_PREFIX)
+
+    cursor = conn.cursor()
+    restore = drop_deferred_constraints(cursor, seed_files)
+    conn.commit()
+
+    try:
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            stats = list(executor.map(lambda item: load_table(*item), seed_files.items()))
+    finally:
+        # The drops are already committed, so put the schema back even when a load failed
+        started = time.monotonic()
+        try:
+            for statement in restore:
+                cursor.execute(statement)
+            reset_identity_sequences(cursor, seed_files)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(
+                f"Schema left without constraints and indexes on {', '.join(sorted(seed_files))}; "
+                f"rerun ddl.sql before loading again: {e}"
+            ) from e
+        finally:
+            cursor.close()
+        logger.info("Recreated %d constraints and indexes in %.2fs", len(restore), time.monotonic() - started)
+    return stats
+
+
+def lambda_handler(event, context):
+    # Connect to the PostgreSQL database
+    conn = _connect()
     cursor = conn.cursor()
 
     # Execute DDL commands
     with open('ddl.sql', 'r') as ddl_file:
         ddl_script = ddl_file.read()
         cursor.execute(ddl_script)
+    conn.commit()
 
-    # Execute data loading commands
-    with open('data.sql', 'r') as data_file:
-        data_script = data_file.read()
-        cursor.execute(data_script)
+    if SEED_BUCKET:
+        stats = load_from_s3(conn)
+        body = {"message": "Data loaded successfully", "tables": stats}
+    else:
+        # Execute data loading commands
+        with open('data.sql', 'r') as data_file:
+            data_script = data_file.read()
+            cursor.execute(data_script)
+        conn.commit()
+        body = "Data loaded successfully"
 
-    # Commit and close
-    conn.commit()
+    # Close
     cursor.close()
     conn.close()
 
-    return {"statusCode": 200, "body": "Data loaded successfully"}
+    return {"statusCode": 200, "body": body}
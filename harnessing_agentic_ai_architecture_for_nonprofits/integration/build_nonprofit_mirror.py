@@ -0,0 +1,124 @@
+"""
+Build the local nonprofit mirror used by the rest-api-action Lambda.
+
+Downloads the IRS Exempt Organizations Business Master File extracts (the
+same registry ProPublica's Nonprofit Explorer is built on), loads them into
+a SQLite database with an FTS5 index on name and city, and uploads it to S3.
+
+Usage:
+    python3 build_nonprofit_mirror.py --bucket <bucket> [--key nonprofit-mirror/organizations.sqlite]
+
+Then set NONPROFIT_MIRROR_BUCKET (and NONPROFIT_MIRROR_KEY if changed) on the
+rest-api-action Lambda. Re-run periodically to refresh the data.
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import urllib.request
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+# Regional extracts of the IRS EO BMF; together they cover every state and territory
+BMF_URLS = [
+    "https://www.irs.gov/pub/irs-soi/eo1.csv",
+    "https://www.irs.gov/pub/irs-soi/eo2.csv",
+    "https://www.irs.gov/pub/irs-soi/eo3.csv",
+    "https://www.irs.gov/pub/irs-soi/eo4.csv",
+]
+BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE organizations (
+    ein TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    city TEXT,
+    state TEXT,
+    ntee_code TEXT,
+    subsection_code TEXT,
+    income_amount INTEGER,
+    revenue_amount INTEGER,
+    assets_amount INTEGER
+);
+CREATE VIRTUAL TABLE organizations_fts USING fts5(
+    name, city, content='organizations', content_rowid='rowid', tokenize='unicode61'
+);
+"""
+
+
+def _amount(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _rows(url):
+    """Stream one BMF extract and yield organization tuples."""
+    logger.info("Downloading %s", url)
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        reader = csv.DictReader(io.TextIOWrapper(response, encoding='latin-1', newline=''))
+        for record in reader:
+            yield (
+                record['EIN'].zfill(9),
+                record['NAME'].strip(),
+                record.get('CITY', '').strip() or None,
+                record.get('STATE', '').strip() or None,
+                record.get('NTEE_CD', '').strip() or None,
+                record.get('SUBSECTION', '').strip() or None,
+                _amount(record.get('INCOME_AMT')),
+                _amount(record.get('REVENUE_AMT')),
+                _amount(record.get('ASSET_AMT')),
+            )
+
+
+def build(path, urls=BMF_URLS):
+    started = time.monotonic()
+    conn = sqlite3.connect(path)
+    conn.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + SCHEMA)
+    total = 0
+    for url in urls:
+        batch = []
+        for row in _rows(url):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                conn.executemany("INSERT OR REPLACE INTO organizations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                total += len(batch)
+                batch = []
+        conn.executemany("INSERT OR REPLACE INTO organizations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        total += len(batch)
+        conn.commit()
+    logger.info("Loaded %d organizations, building full-text index", total)
+    conn.execute("INSERT INTO organizations_fts(organizations_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO organizations_fts(organizations_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    logger.info("Built %s (%.1f MB) in %.0fs", path, os.path.getsize(path) / 1e6, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', required=True, help='S3 bucket to upload the mirror to')
+    parser.add_argument('--key', default='nonprofit-mirror/organizations.sqlite', help='S3 key of the mirror')
+    parser.add_argument('--output', help='Keep the built database at this path instead of a temporary file')
+    args = parser.parse_args()
+
+    path = args.output or os.path.join(tempfile.mkdtemp(), 'organizations.sqlite')
+    if os.path.exists(path):
+        os.remove(path)
+    build(path)
+
+    import boto3
+    boto3.client('s3').upload_file(path, args.bucket, args.key)
+    logger.info("Uploaded mirror to s3://%s/%s", args.bucket, args.key)
+
+
+if __name__ == '__main__':
+    main()